@@ -0,0 +1,194 @@
+"""Throughput of a whole batch run (BatchRenamer.run: list -> scan -> parse -> filter -> hash -> render -> plan -> file) on synthetic replays
+
+    python -m benchmarks.bench_pipeline [--sizes 1000 10000 100000] [--operation copy] [--output results.json]
+
+Every corpus is written to a temporary folder, and a fake sc2reader hands the renamer the
+fake replay object of each file (see benchmarks/corpus.py), so no SC2 data or sc2reader is
+needed. The fake replays only live in this process, so they are parsed in the renamer's
+thread (a single parse worker); every other stage runs with the default workers. Each
+corpus is renamed once to time it and once more under tracemalloc for the peak memory of
+the run and of every stage, each time from scratch (a new corpus, destination, cache and
+manifest). The results are written as JSON (to stdout by default, the table goes to
+stderr), so two commits can be compared with a plain diff.
+"""
+import argparse
+import copy
+import threading
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from collections import Counter
+
+import src.structures.defaults as defaults
+import src.batch.fileops as fileops
+from src.batch.BatchRenamer import BatchRenamer
+from benchmarks.corpus import my_id, write_corpus
+
+
+def fake_sc2reader(replays):
+    """a stand-in for the sc2reader module that loads the fake replays instead of parsing files"""
+    module = types.ModuleType('sc2reader')
+    module.load_replay = lambda path, load_level=2, load_maps=False: replays[path]
+    return module
+
+
+class TracedRenamer(BatchRenamer):
+    """The real BatchRenamer, keeping the tracemalloc peak of every stage in peaks.
+
+    tracemalloc has a single peak for the whole process, so the stages take turns, one
+    replay in one stage at a time, and the peak is reset before and read after each turn.
+    The peak of a stage is the most memory one turn took on top of what was allocated
+    when it started, and run_peak keeps the peak of the whole run across the resets.
+    Taking turns slows the run down, so its times are not used.
+    """
+
+    def __init__(self, settings, metrics_hook=None, pool=None):
+        super().__init__(settings, metrics_hook, pool)
+        self.peaks = Counter()
+        self.run_peak = 0
+        self.turn = threading.Lock()
+
+
+    def timed(self, name, stage):
+        return super().timed(name, self.traced(name, stage))
+
+
+    def list_replays(self):
+        replays = super().list_replays()
+        listing = self.traced('list', lambda _: next(replays, None))
+        return iter(lambda: listing(None), None)
+
+
+    def traced(self, name, stage):
+        def traced_stage(item):
+            with self.turn:
+                allocated, peak = tracemalloc.get_traced_memory()
+                self.run_peak = max(self.run_peak, peak)
+                tracemalloc.reset_peak()
+
+                try:
+                    return stage(item)
+                finally:
+                    self.peaks[name] = max(self.peaks[name], tracemalloc.get_traced_memory()[1] - allocated)
+
+        return traced_stage
+
+
+def run_batch(root, size, settings, replay_size, traced):
+    """renames a new corpus of size replays in root, returning (seconds, peak bytes, peak bytes per stage, metrics summary, renamer summary)"""
+    source = os.path.join(root, 'replays')
+    target = os.path.join(root, 'renamed')
+    os.mkdir(target)
+
+    replays = write_corpus(source, size, replay_size=replay_size)
+    sys.modules['sc2reader'] = fake_sc2reader(replays)
+
+    settings = {**settings, defaults._source_dir: source, defaults._target_dir: target}
+    summaries = []
+
+    def metrics_hook(event):
+        if event['event'] == 'summary':
+            summaries.append(event)
+
+    renamer = (TracedRenamer if traced else BatchRenamer)(settings, metrics_hook=metrics_hook)
+
+    # the cache, manifest, dedup index, library and journal are kept in the working directory
+    cwd = os.getcwd()
+    os.chdir(root)
+
+    try:
+        if traced:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        renamer.run()
+        seconds = time.perf_counter() - start
+
+        peak = 0
+        if traced:
+            peak = max(renamer.run_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    finally:
+        os.chdir(cwd)
+
+    return seconds, peak, dict(renamer.peaks) if traced else {}, summaries[-1], renamer.summary()
+
+
+def bench(size, operation, replay_size):
+    settings = copy.deepcopy(defaults.settings)
+    settings[defaults._player_id] = str(my_id)
+    settings[defaults._operation] = operation
+    settings[defaults._performance] = {**settings[defaults._performance], defaults._parse_workers: 1}
+
+    # the fake replays come in every kind, so nothing is filtered out
+    settings[defaults._excludes] = {**settings[defaults._excludes], defaults._ai: False}
+    settings[defaults._includes] = {**settings[defaults._includes], defaults._min_players: '1', defaults._max_players: '8', defaults._wol: True, defaults._hots: True}
+
+    runs = {}
+    for traced in (False, True):
+        with tempfile.TemporaryDirectory() as root:
+            runs[traced] = run_batch(root, size, settings, replay_size, traced)
+
+    seconds, _, _, metrics, summary = runs[False]
+    peaks = runs[True][2]
+
+    stages = {}
+    for name, stage in metrics['stages'].items():
+        stages[name] = {
+            'replays': stage['items'],
+            'seconds': round(stage['seconds'], 4),
+            'replays_per_second': round(stage['items'] / stage['seconds']) if stage['seconds'] else None,
+            'peak_memory_bytes': peaks.get(name)
+        }
+
+    return {
+        'seconds': round(seconds, 4),
+        'replays_per_second': round(size / seconds) if seconds else None,
+        'peak_memory_bytes': runs[True][1],
+        'renamed': summary['renamed'],
+        'stages': stages
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--operation', choices=sorted(fileops.operations), default=defaults._copy)
+    parser.add_argument('--replay-size', type=int, default=4096, help='bytes in every placeholder replay')
+    parser.add_argument('--output', default='-', help='file to write the JSON results to, - for stdout')
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'operation': args.operation,
+        'replay_size': args.replay_size,
+        'corpora': {}
+    }
+
+    print(f'{"replays":>8} {"stage":<8}{"replays/s":>12}{"seconds":>10}{"peak memory (KB)":>18}', file=sys.stderr)
+    for size in args.sizes:
+        run = bench(size, args.operation, args.replay_size)
+        results['corpora'][str(size)] = run
+
+        # stage seconds add up the time of every worker of the stage, the run is wall clock time
+        for name, stage in run['stages'].items():
+            print(f'{size:>8} {name:<8}{stage["replays_per_second"] or 0:>12}{stage["seconds"]:>10.3f}{(stage["peak_memory_bytes"] or 0) / 1024:>18.1f}', file=sys.stderr)
+        print(f'{size:>8} {"run":<8}{run["replays_per_second"] or 0:>12}{run["seconds"]:>10.3f}{run["peak_memory_bytes"] / 1024:>18.1f}', file=sys.stderr)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
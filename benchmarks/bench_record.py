@@ -0,0 +1,77 @@
+"""Memory and serialization cost of replay records, as the dicts they used to be and as ReplayRecords
+
+    python -m benchmarks.bench_record [--replays 10000]
+
+Records are extracted from synthetic replays (see benchmarks/corpus.py). For both layouts
+it measures the peak memory of holding every record of the batch (under tracemalloc), the
+bytes a record takes when it is pickled to or from a parse process, and how long the
+cache takes to write and read every record back (JSON for the dicts, marshal for the
+ReplayRecords).
+"""
+import argparse
+import json
+import pickle
+import random
+import time
+import tracemalloc
+
+from src.structures.record import ReplayRecord, extract_record
+from benchmarks.corpus import make_replay
+
+
+def as_dict(record):
+    """the record in the dict layout that ReplayRecord replaced"""
+    fields = dict(zip(ReplayRecord.__slots__, record.fields()))
+    fields['teams'] = [(lineup, list(players)) for lineup, players in record.teams]
+    return fields
+
+
+def peak_memory(make):
+    """peak bytes allocated while make() builds a batch of records and holds on to it"""
+    tracemalloc.start()
+    records = make()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    del records
+    return peak
+
+
+def round_trip(dumps, loads, records):
+    """seconds to serialize and load every record, and the bytes they take serialized"""
+    start = time.perf_counter()
+    data = [dumps(record) for record in records]
+    for blob in data:
+        loads(blob)
+
+    return time.perf_counter() - start, sum(len(blob) for blob in data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--replays', type=int, default=10000)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    replays = [make_replay(rnd, f'replays/replay {index}.SC2Replay') for index in range(args.replays)]
+
+    # the strings come from the replays in both layouts, so only the containers are measured
+    layouts = {
+        'dict': (lambda: [as_dict(extract_record(replay)) for replay in replays], json.dumps, json.loads),
+        'ReplayRecord': (lambda: [extract_record(replay) for replay in replays], lambda record: record.dumps(), lambda data: ReplayRecord.loads(data, ''))
+    }
+
+    print(f'{args.replays} records')
+    print(f'{"layout":<14}{"peak memory (KB)":>18}{"pickled (B/record)":>20}{"cache (B/record)":>18}{"cache round trip (ms)":>23}')
+
+    for name, (make, dumps, loads) in layouts.items():
+        peak = peak_memory(make)
+        records = make()
+        pickled = sum(len(pickle.dumps(record)) for record in records) / len(records)
+        seconds, size = round_trip(dumps, loads, records)
+
+        print(f'{name:<14}{peak / 1024:>18.1f}{pickled:>20.1f}{size / len(records):>18.1f}{seconds * 1000:>23.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark of listing a replay folder with the old os.walk scan and the os.scandir scanner
+
+    python -m benchmarks.bench_scan [--files N] [--folders N]
+
+A synthetic tree of empty replays (plus some other files) is created in a temporary folder.
+The old scan is the os.walk + os.stat that the batch renamer did before. It only goes one
+folder deep, so on the deep tree it is timed both as it was and walking every folder, to
+compare the same amount of work. The old scan hands over its replays once the whole tree
+is listed; the new one streams them, so the time until the first replay comes out (which
+is when a run starts parsing) is shown too, as is the newest first order that the
+scheduled and catch-up paths sort the stream into.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from src.batch.scanner import newest_first, scan_replays
+
+
+def make_tree(root, files, folders, max_depth, rnd):
+    directories = [root]
+    for index in range(folders):
+        parent = rnd.choice([directory for directory in directories if directory.count(os.sep) - root.count(os.sep) < max_depth])
+        directory = os.path.join(parent, f'folder {index}')
+        os.mkdir(directory)
+        directories.append(directory)
+
+    for index in range(files):
+        name = f'replay {index}.SC2Replay' if index % 10 else f'notes {index}.txt'
+        path = os.path.join(rnd.choice(directories), name)
+        open(path, 'wb').close()
+
+        # replays are saved one after the other, a few minutes apart
+        modified = (1500000000 + index * 600) * 10**9
+        os.utime(path, ns=(modified, modified))
+
+
+def legacy_scan(source_path, excludes, depth=1):
+    """the os.walk of sc2reader.utils.get_files, with the os.stat of the old scan stage, a negative depth has no limit"""
+    replays = []
+    for root, directories, filenames in os.walk(source_path, followlinks=True):
+        for directory in list(directories):
+            if directory in excludes or depth == 0:
+                directories.remove(directory)
+
+        for filename in filenames:
+            if filename.lower().endswith('.sc2replay'):
+                path = os.path.join(root, filename)
+                replays.append((path, os.stat(path)))
+
+        depth -= 1
+
+    return replays
+
+
+def best_of(repeat, scan):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(scan())
+        times.append(time.perf_counter() - start)
+    return min(times), count
+
+
+def first_of(repeat, scan):
+    """the time until the scan hands over its first replay"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        replays = iter(scan())
+        next(replays)
+        times.append(time.perf_counter() - start)
+
+        # a stream that is left half way keeps its folder open
+        for _ in replays:
+            pass
+
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--folders', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"tree":<22}{"found before":>14}{"found after":>13}{"before (s)":>12}{"after (s)":>11}{"speedup":>9}'
+          f'{"first before (s)":>18}{"first after (s)":>17}{"newest first (s)":>18}')
+
+    for name, max_depth, depths in (('flat', 1, [1]), ('deep', 6, [1, -1])):
+        with tempfile.TemporaryDirectory() as root:
+            make_tree(root, args.files, args.folders, max_depth, random.Random(0))
+            after, found_after = best_of(args.repeat, lambda: list(scan_replays(root)))
+            first_after = first_of(args.repeat, lambda: scan_replays(root))
+            sorted_after, _ = best_of(args.repeat, lambda: newest_first(scan_replays(root)))
+
+            for depth in depths:
+                before, found_before = best_of(args.repeat, lambda: legacy_scan(root, [], depth))
+                first_before = first_of(args.repeat, lambda: legacy_scan(root, [], depth))
+                label = f'{name} (old: {"any depth" if depth < 0 else "depth 1"})'
+                print(f'{label:<22}{found_before:>14}{found_after:>13}{before:>12.3f}{after:>11.3f}{before / after:>8.1f}x'
+                      f'{first_before:>18.3f}{first_after:>17.4f}{sorted_after:>18.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Micro-benchmark of rendering one replay name with the old and the compiled template
+
+    python -m benchmarks.bench_template [--replays N]
+"""
+import argparse
+import ntpath
+import random
+import time
+from datetime import datetime
+
+import src.structures.stringmatch as stringmatch
+from src.structures.stringmatch import add_leading_zero
+from src.structures.record import ReplayRecord
+from src.structures.template import CompiledTemplate
+import src.structures.defaults as defaults
+
+
+templates = {
+    'default': defaults.settings[defaults._template],
+    'short': '$map $uniqueID',
+    'everything': ' '.join('$' + var for var in stringmatch.all_variables)
+}
+
+
+def make_record(rnd, my_id):
+    teams = []
+    for team in range(2):
+        players = ((f'Player{rnd.randint(0, 999)}', my_id if team == 0 else rnd.randint(1, 10**7), rnd.randint(2000, 6000)),)
+        teams.append((rnd.choice('PTZ'), players))
+
+    rnd.shuffle(teams)
+    return ReplayRecord(
+        filename=f'C:\\Replays\\Replay {rnd.randint(0, 10**6)}.SC2Replay',
+        load_level=2,
+        player_count=2,
+        has_computers=False,
+        is_ladder=True,
+        expansion='LotV',
+        teams=tuple(teams),
+        winner=rnd.randint(0, 1),
+        map='Ephemeron LE',
+        game_length=rnd.randint(60, 3600),
+        unix_timestamp=rnd.randint(1.4e9, 1.6e9),
+        real_type='1v1'
+    )
+
+
+def legacy_render(template, my_id, record):
+    """the str.replace based renderer that CompiledTemplate replaced"""
+    has_id = stringmatch.template_contains_id_vars(template)
+    newname = template
+
+    # teams are referred to by their index in record.teams
+    all_teams = record.teams
+    teams = list(range(len(all_teams)))
+
+    if has_id:
+        my_team_list = [index for index in teams if my_id in [player[1] for player in all_teams[index][1]]]
+
+        # make the first team the team you were on
+        if len(my_team_list) > 0:
+            my_team_index = my_team_list[0]
+            teams[0], teams[my_team_index] = teams[my_team_index], teams[0]
+
+        # "forward" everything to be non-ID based
+        newname = newname.replace('$myteamwithmmr', '$t1withmmr')
+        newname = newname.replace('$myteam', '$team1')
+        newname = newname.replace('$oppteams', '$team2')
+        newname = newname.replace('$myraces', '$t1races')
+        newname = newname.replace('$oppraces', '$t2races')
+        newname = newname.replace('$mymmr', '$t1mmr')
+        newname = newname.replace('$oppmmr', '$t2mmr')
+        newname = newname.replace('$oppwithmmr', '$t2withmmr')
+
+    # good luck trying to maintain this
+    first_index = teams.pop(0)
+    first_lineup, first_players = all_teams[first_index]
+    others = [all_teams[index] for index in teams]
+    is_ladder = record.is_ladder
+
+    team2_player_list = ['+'.join([player[0] for player in players]) for _, players in others]
+    team2_with_mmr = ['+'.join([player[0] for player in players]) + '(' + (str(max(0, players[0][2])) if is_ladder else "0") + ')' for _, players in others]
+    opp_races_list = [lineup for lineup, _ in others]
+
+    # variables to fill
+    team1 = '+'.join([player[0] for player in first_players])
+    t1races = first_lineup
+    t1mmr = str(max(0, first_players[0][2])) if is_ladder else '0'
+    WL = 'W' if record.winner == first_index else 'L'
+    wl = WL.lower()
+    team2 = 'v'.join(team2_player_list)
+    t2withmmr = 'v'.join(team2_with_mmr)
+    t2races = 'v'.join(opp_races_list)
+    t2mmr = 'v'.join([str(players[0][2]) if not record.has_computers else '0' for _, players in others])
+    game_length = record.game_length
+    durationhours = str(int(game_length / 3600))
+    durationmins = str(int((game_length / 60) % 60))
+    durationsecs = str(int(game_length % 60))
+    date = datetime.fromtimestamp(record.unix_timestamp)
+    month = add_leading_zero(date.month)
+    year = add_leading_zero(date.year)
+    day = add_leading_zero(date.day)
+    hour = add_leading_zero(date.hour)
+    minute = add_leading_zero(date.minute)
+    sec = add_leading_zero(date.second)
+    currentname = ntpath.split(record.filename)[1].replace('.SC2Replay', '')
+    uniqueID = str(day) + str(month) + str(year) + str(hour) + str(minute) + str(sec)
+
+    template_vars = {
+        'team1': team1,
+        't1races': t1races,
+        't1mmr': t1mmr,
+        't1withmmr': f'{team1}({t1mmr})',
+        'wl': wl,
+        'WL': WL,
+        'team2': team2,
+        't2withmmr': t2withmmr,
+        't2races': t2races,
+        't2mmr': t2mmr,
+        'map': record.map,
+        'durationhours': durationhours,
+        'durationmins': durationmins,
+        'durationsecs': durationsecs,
+        'month': month,
+        'year': year,
+        'day': day,
+        'hour': hour,
+        'min': minute,
+        'sec': sec,
+        'gametype': record.real_type,
+        'expansion': record.expansion,
+        'currentname': currentname,
+        'uniqueID': uniqueID
+    }
+
+    # fill in everything in the template
+    for var in stringmatch.non_id_variables:
+        newname = newname.replace(f'${var}', template_vars[var])
+
+    return newname
+
+
+def per_replay(render, records):
+    start = time.perf_counter()
+    for record in records:
+        render(record)
+    return (time.perf_counter() - start) / len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--replays', type=int, default=20000)
+    args = parser.parse_args()
+
+    my_id = 1234567
+    rnd = random.Random(0)
+    records = [make_record(rnd, my_id) for _ in range(args.replays)]
+
+    print(f'{"template":<12}{"before (us)":>14}{"after (us)":>14}{"speedup":>10}')
+    for name, template in templates.items():
+        compiled = CompiledTemplate(template, my_id)
+        assert all(compiled.render(record) == legacy_render(template, my_id, record) for record in records[:100])
+
+        before = per_replay(lambda record: legacy_render(template, my_id, record), records)
+        after = per_replay(compiled.render, records)
+        print(f'{name:<12}{before * 1e6:>14.2f}{after * 1e6:>14.2f}{before / after:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
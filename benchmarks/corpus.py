@@ -0,0 +1,111 @@
+"""Synthetic replays for the benchmarks, without any real SC2 data
+
+make_replay builds an object with the attributes the renamer reads from an sc2reader
+replay (teams, players, toon_id, init_data, lineup, game_length, unix_timestamp,
+expansion, ...), and write_corpus puts a placeholder file for each of them on disk so
+the scan and the file operations have something to work on.
+"""
+import os
+import random
+from datetime import timedelta
+
+
+# toon_id of the player whose replays these are
+my_id = 1234567
+
+_races = ('Protoss', 'Terran', 'Zerg')
+
+
+class FakePlayer:
+
+    def __init__(self, name, toon_id, race, rating, is_human=True):
+        self.name = name
+        self.toon_id = toon_id
+        self.play_race = race
+        self.is_human = is_human
+
+        # computers have no init_data, like in sc2reader
+        if is_human:
+            self.init_data = {'scaled_rating': rating}
+
+
+class FakeTeam:
+
+    def __init__(self, number, players):
+        self.number = number
+        self.players = players
+        self.lineup = ''.join(sorted(player.play_race[0] for player in players))
+
+
+class FakeReplay:
+
+    def __init__(self, filename, teams, winner, is_ladder, map_name, game_length, unix_timestamp, expansion, real_type):
+        self.filename = filename
+        self.teams = teams
+        self.players = [player for team in teams for player in team.players]
+        self.computers = [player for player in self.players if not player.is_human]
+        self.winner = winner
+        self.is_ladder = is_ladder
+        self.map_name = map_name
+        self.game_length = game_length
+        self.unix_timestamp = unix_timestamp
+        self.expansion = expansion
+        self.real_type = real_type
+
+        # what load_level=1 exposes, for extract_header
+        self.raw_data = {'replay.details': {'players': [
+            {'name': player.name, 'bnet': {'uid': player.toon_id}, 'control': 2 if player.is_human else 3} for player in self.players
+        ]}}
+
+
+def make_replay(rnd, filename):
+    """a random replay, mostly 1v1 ladder games of my_id like a real replay folder"""
+    is_ladder = rnd.random() < 0.8
+    team_count = rnd.choice((2, 2, 2, 2, 3, 4))
+    team_size = rnd.choice((1, 1, 1, 2))
+
+    teams = []
+    for number in range(team_count):
+        players = []
+        for slot in range(team_size):
+            me = number == 0 and slot == 0 and rnd.random() < 0.95
+            computer = not me and not is_ladder and rnd.random() < 0.2
+            name = 'Me' if me else f'Player{rnd.randint(0, 5000)}'
+            toon_id = my_id if me else rnd.randint(1, 10**7)
+            players.append(FakePlayer(name, toon_id, rnd.choice(_races), rnd.randint(1500, 6500), is_human=not computer))
+        teams.append(FakeTeam(number + 1, players))
+
+    rnd.shuffle(teams)
+    return FakeReplay(
+        filename=filename,
+        teams=teams,
+        winner=rnd.choice(teams),
+        is_ladder=is_ladder,
+        map_name=f'Map {rnd.randint(1, 30)} LE',
+        game_length=timedelta(seconds=rnd.randint(30, 3600)),
+        unix_timestamp=rnd.randint(1400000000, 1700000000),
+        expansion=rnd.choice(('WoL', 'HotS', 'LotV', 'LotV', 'LotV', 'LotV')),
+        real_type=f'{team_size}v{team_size}' if team_count == 2 else 'FFA'
+    )
+
+
+def write_corpus(directory, count, replay_size=4096, folders=10, seed=0):
+    """writes count placeholder replays into directory (spread over a few subfolders), returns {path: FakeReplay}"""
+    rnd = random.Random(seed)
+    payload = bytes(rnd.getrandbits(8) for _ in range(replay_size))
+    replays = {}
+
+    for index in range(count):
+        folder = os.path.join(directory, f'folder {index % folders}')
+        os.makedirs(folder, exist_ok=True)
+
+        path = os.path.join(folder, f'replay {index}.SC2Replay')
+        with open(path, 'wb') as file:
+            # a different first few bytes for every replay, so no two of them hash the same
+            file.write(index.to_bytes(8, 'little') + payload[8:])
+
+        replay = make_replay(rnd, path)
+        os.utime(path, (replay.unix_timestamp, replay.unix_timestamp))
+        replays[path] = replay
+
+    return replays
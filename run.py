@@ -1,11 +1,23 @@
-from src.ReplayRenamer import ReplayRenamer
 import json
-import sc2reader
+import logging
+import multiprocessing
 import os.path
+import sys
 from src.structures.defaults import settings
 
 if __name__ == '__main__':
 
+    # replays are parsed in worker processes, which need this in the frozen executable
+    multiprocessing.freeze_support()
+
+    # the renamer and the tray watcher log what they do instead of printing it
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    # any argument runs the renamer from the command line, which never imports the GUI
+    if len(sys.argv) > 1:
+        from src.cli import main
+        sys.exit(main(sys.argv[1:]))
+
     # Load settings from file, if it exists, otherwise, uses the default settings    
     settings_file = "settings.json"
     
@@ -16,6 +28,7 @@ if __name__ == '__main__':
         with open(settings_file, 'w') as file:
             json.dump(settings, file, indent=4)
 
-    # initializing and running the GUI
+    # initializing and running the GUI, wx takes a while to import so it is only loaded here
+    from src.ReplayRenamer import ReplayRenamer
     gui = ReplayRenamer(settings)
     gui.run()
\ No newline at end of file
@@ -1,20 +1,20 @@
 import json
-import ntpath
+import logging
 import os
 import os.path
-import shutil
 import sys
 from os.path import isfile, join
-from datetime import datetime
 import time
 
 import PySimpleGUIWx as sg
-import sc2reader
-from sc2reader.factories import SC2Factory
 
-from src.tray.AutoRenamerThread import AutoRenamerThread as AutoRenamer
+from src.batch.BatchRenamer import BatchRenamer
 import src.structures.defaults as defaults
 import src.structures.stringmatch as stringmatch
+from src.structures.stringmatch import split_string, format_size
+
+
+logger = logging.getLogger(__name__)
 
 
 class ReplayRenamer:
@@ -28,12 +28,12 @@ class ReplayRenamer:
         self.tray = None
         self.has_tray_running = False
         self.has_window_running = False
+        self.rename_backlog = False
     
 
     def run(self):
         if self.settings[defaults._tray]:
-            op = shutil.move if self.settings[defaults._operation] == defaults._move else shutil.copy
-            self.run_renamer(op, in_tray=True, question=False)
+            self.run_renamer(in_tray=True, question=False)
             self.run_tray()
         else:
             self.run_window()
@@ -61,15 +61,14 @@ class ReplayRenamer:
                 
                 elif event == 'Rename':
                     self.save_settings()
-                    op = shutil.copy if self.values[defaults._copy] else shutil.move
 
                     if self.values[defaults._tray]:
                         self.window.Hide()
-                        self.run_renamer(op=op, in_tray=True)
+                        self.run_renamer(in_tray=True)
                         self.run_tray()
                     
                     else:
-                        self.run_renamer(op=op, in_tray=False, question=True)
+                        self.run_renamer(in_tray=False, question=True)
 
                 elif event == 'Save':
                     self.save_settings()
@@ -93,11 +92,14 @@ class ReplayRenamer:
 
         # runs only a single instance of the tray application
         if not self.has_tray_running:
+            from src.tray.AutoRenamerThread import AutoRenamerThread as AutoRenamer
+
             self.has_tray_running = True
             self.tray.show_message('SC2 Replay Renamer', 'SC2 Auto-Renamer is now running', messageicon=sg.SYSTEM_TRAY_MESSAGE_ICON_INFORMATION)
 
-            auto_renamer = AutoRenamer(self.settings)
+            auto_renamer = AutoRenamer(self.settings, backlog=self.rename_backlog)
             auto_renamer.start()
+            self.rename_backlog = False
 
             while True:
                 menu_item = self.tray.read()
@@ -136,27 +138,14 @@ class ReplayRenamer:
 
         # if source path is valid, initialize the sc2reader and load replays
         if source_path and os.path.isdir(source_path):
-            sc2 = SC2Factory(directory=source_path, exclude=excludes, depth=1, followlinks=True)
-            replays = sc2.load_replays(source_path, load_level=2, load_maps=False, exclude=excludes)
-            
-            possible_players = []
-            number_of_replay_files = len([name for name in os.listdir(source_path) if '.SC2Replay' in name])            
-            number_of_replays_to_test = min(150, number_of_replay_files)
-            
-            # populates possible_players with the list of players detected
-            for _ in range(number_of_replays_to_test):
-                replay = next(replays)
-                possible_players.extend([(player.name, player.toon_id) for player in replay.players if player.is_human])
-
-            # generator to get the next highest player name
-            def get_highest(lst):
-                while lst:
-                    largest = max(lst, key=lambda x: lst.count(x)) if lst else ''
-                    lst = list(filter(lambda x: x != largest, lst)) if largest else []
-                    yield tuple(largest)
+            from src.batch.detection import detect_players
+            from src.daemon.client import is_running, request
 
-
-            highest = get_highest(possible_players)
+            # the most frequent players come first, found by the renamer daemon if one is running
+            if is_running():
+                highest = iter(request({'job': 'detect', 'source': source_path, 'excludes': excludes, 'wait': True}).get('result', []))
+            else:
+                highest = iter(detect_players(source_path, excludes))
             p = next(highest, None)
             
             # Check if folder is valid and contains replays
@@ -179,7 +168,7 @@ class ReplayRenamer:
             sg.popup_error('Cannot resolve source path (Replay folder)!')
     
 
-    def run_renamer(self, op, in_tray=False, question=True):
+    def run_renamer(self, in_tray=False, question=True):
         """renames all of the files that passed through the filters"""
         
         # asks user if they would like to rename all of their replays, or just new ones if they run in tray for the first time
@@ -187,11 +176,9 @@ class ReplayRenamer:
         my_id = int(self.settings[defaults._player_id]) if self.settings[defaults._player_id] else ''
         
         if in_tray and question:
-            rename_all = sg.popup_yes_no("Do you want to rename all replays?\n(If you select no, the tool will only rename newly created replay files)")
+            rename_all = sg.popup_yes_no("Do you want to rename all replays?\n(If you select no, the tool will only rename newly created replay files, and the ones saved since it last ran in the tray)")
 
         
-        source_path = self.settings[defaults._source_dir]
-        dest = self.settings[defaults._target_dir]
         template = self.settings[defaults._template]
 
         # check if template is valid, requires player ID
@@ -216,223 +203,59 @@ class ReplayRenamer:
 
         # check if there will be duplicate names
         if self.may_contain_duplicates(template):
-            check = sg.popup_yes_no('Your template string may cause different replays to contain the same name. This WILL result in some replays being lost. Are you sure you want to proceed?')
+            check = sg.popup_yes_no('Your template string may cause different replays to contain the same name. Those replays will be numbered, like "name (2)". Are you sure you want to proceed?')
             if check == 'No':
                 sg.popup_ok('Your files have not been changed. Please change your template to include the $uniqueID variable')
                 return None
         
+        # the tray renames them in the background, behind the replays it sees being saved
+        elif rename_all == 'Yes' and in_tray:
+            self.rename_backlog = True
+
         # renames all replays detected
         elif rename_all == 'Yes':
-            excluded_directories = split_string(self.settings[defaults._excludes][defaults._exclude_dirs])
-
-            # load replays
-            sc2 = SC2Factory(directory=source_path, exclude=excluded_directories, depth=1, followlinks=True)
-            replays = sc2.load_replays(source_path, load_level=2, load_maps=False, exclude=excluded_directories)
-            
-            renamed_count = 0
             start_time = time.time()
+            summary = self.rename_all()
+            end_time = time.time()
 
-            for replay in replays:
-                
-                # exclude AI
-                if self.settings[defaults._excludes][defaults._ai] and replay.computers:
-                    continue
-                
-                # exclude customs
-                if self.settings[defaults._excludes][defaults._custom] and not replay.is_ladder:
-                    continue
-
-                # exclude all replays that are not within the bounds of number of players
-                min_players = int(self.settings[defaults._includes][defaults._min_players])
-                max_players = int(self.settings[defaults._includes][defaults._max_players])
-                if not min_players <= len(replay.players) <= max_players:
-                    continue
-
-                # exclude WoL
-                if replay.expansion == defaults._wol and not self.settings[defaults._includes][defaults._wol]:
-                    continue
-
-                # exclude HotS
-                if replay.expansion == defaults._hots and not self.settings[defaults._includes][defaults._hots]:
-                    continue
-
-                # exclude LotV
-                if replay.expansion == defaults._lotv and not self.settings[defaults._includes][defaults._lotv]:
-                    continue
-
-                # check to remove by matchups
-                exclude_matchups = split_string(self.settings[defaults._excludes][defaults._exclude_matchups])
-                include_matchups = split_string(self.settings[defaults._includes][defaults._include_matchups])
-
-                should_exclude = self.has_matching(replay, exclude_matchups, has_id=self.template_contains_id_vars(template))
-                should_include = self.has_matching(replay, include_matchups, has_id=self.template_contains_id_vars(template))
-                
-                if should_exclude:
-                    continue
-                
-                # if include_matchups actually contains a string and it does not pass the include filter
-                if include_matchups and not should_include:
-                    continue
-                
-
-                # actually doing the renaming, after the filtering
-                newname = template
+            if summary:
+                failed = f'Could not read {summary["failed"]} replays, they were left where they are\n' if summary['failed'] else ''
+                sg.popup_ok(f'Job Done!\nRenamed {summary["renamed"]} replays in {str(end_time - start_time)[:3]} seconds\n'
+                            f'{summary["collisions"]} of them got a numbered name, because theirs was already taken\n\n'
+                            f'Skipped {summary["skipped"]} replays that were already done, {summary["duplicates"]} of them copies of replays renamed before\n'
+                            f'Filtered out {summary["rejected"]["header"]} replays before parsing their players, and {summary["rejected"]["full"]} after\n'
+                            f'{failed}'
+                            f'{", ".join(f"{rule}: {count}" for rule, count in summary["rules"])}\n'
+                            f'Copied {format_size(summary["bytes_copied"])}, avoided copying {format_size(summary["bytes_avoided"])}')
+        
+        if in_tray:
+            logger.info('the tray renames the replays saved since it last ran%s, then every new one', ', then all the others' if self.rename_backlog else '')
 
-                teams = replay.teams[:]
-                if self.template_contains_id_vars(template):
-                    my_team_list = list(filter(lambda team: my_id in [player.toon_id for player in team.players], teams))
-                    
-                    # make the first team the team you were on
-                    if len(my_team_list) > 0:
-                        my_team = my_team_list[0]
-                        if teams[0] != my_team:
-                            my_team_index = teams.index(my_team)
-                            teams[0], teams[my_team_index] = teams[my_team_index], teams[0]
-
-                    # "forward" everything to be non-ID based
-                    newname = newname.replace('$myteamwithmmr', '$t1withmmr')
-                    newname = newname.replace('$myteam', '$team1')
-                    newname = newname.replace('$oppteams', '$team2')
-                    newname = newname.replace('$myraces', '$t1races')
-                    newname = newname.replace('$oppraces', '$t2races')
-                    newname = newname.replace('$mymmr', '$t1mmr')
-                    newname = newname.replace('$oppmmr', '$t2mmr')
-                    newname = newname.replace('$oppwithmmr', '$t2withmmr')
 
-                    
-                # good luck trying to maintain this
-                first_team = teams[0]
-                teams.remove(first_team)
-                team1player = first_team.players[0]
-                team1_player_list = [player.name for player in first_team]
-                team2_player_list = ['+'.join([player.name for player in team.players]) for team in teams]
-                team2_with_mmr = ['+'.join([player.name for player in team.players]) +'('+ (str(max(0, team.players[0].init_data['scaled_rating'])) if replay.is_ladder else "0") + ')' for team in teams]
-                opp_races_list = [team.lineup for team in teams]
-                
-                # variables to fill
-                team1 = '+'.join(team1_player_list)
-                t1races = first_team.lineup
-                t1mmr = str(max(0, team1player.init_data['scaled_rating'])) if replay.is_ladder else '0'
-                WL = 'W' if replay.winner == first_team else 'L'
-                wl = WL.lower()
-                team2 = 'v'.join(team2_player_list)
-                t2withmmr = 'v'.join(team2_with_mmr)
-                t2races = 'v'.join(opp_races_list)
-                t2mmr = 'v'.join([str(team.players[0].init_data['scaled_rating']) if not replay.computers else '0' for team in teams])
-                sc2map = replay.map_name
-                durationhours = str(replay.game_length.hours)
-                durationmins = str(replay.game_length.mins)
-                durationsecs = str(replay.game_length.secs)
-                date = datetime.fromtimestamp(replay.unix_timestamp)
-                month = add_leading_zero(date.month)
-                year = add_leading_zero(date.year)
-                day = add_leading_zero(date.day)
-                hour = add_leading_zero(date.hour)
-                minute = add_leading_zero(date.minute)
-                sec = add_leading_zero(date.second)
-                currentname = ntpath.split(replay.filename)[1].replace('.SC2Replay', '')
-                uniqueID = str(day) + str(month) + str(year) + str(hour) + str(minute) + str(sec)
-
-                template_vars = {
-                    'team1': team1,
-                    't1races': t1races,
-                    't1mmr': t1mmr,
-                    't1withmmr': f'{team1}({t1mmr})',
-                    'wl': wl,
-                    'WL': WL,
-                    'team2': team2,
-                    't2withmmr': t2withmmr,
-                    't2races': t2races,
-                    't2mmr': t2mmr,
-                    'map': sc2map,
-                    'durationhours': durationhours,
-                    'durationmins': durationmins,
-                    'durationsecs': durationsecs,
-                    'month': month,
-                    'year': year,
-                    'day': day,
-                    'hour': hour,
-                    'min': minute,
-                    'sec': sec,
-                    'gametype': replay.real_type,
-                    'expansion': replay.expansion,
-                    'currentname': currentname,
-                    'uniqueID': uniqueID
-                }
-
-                # fill in everything in the template
-                for var in stringmatch.non_id_variables:
-                    newname = newname.replace(f'${var}', template_vars[var])
-                
-                newname += '.SC2Replay'
+    def rename_all(self):
+        """renames every replay, in the renamer daemon if one is running, returning the summary of the run"""
+        from src.daemon.client import is_running, request
 
-                # do the renaming operation
-                orig_location = replay.filename
-                new_location = join(dest, newname)
-                op(orig_location, new_location)
-                renamed_count += 1
-            
-            end_time = time.time()
-            sg.popup_ok(f'Job Done!\nRenamed {renamed_count} replays in {str(end_time - start_time)[:3]} seconds')
-        
-        if in_tray:
-            print('going to implement')
+        if not is_running():
+            renamer = BatchRenamer(self.settings)
+            renamer.run()
+            return renamer.summary()
 
+        answer = request({'job': 'batch', 'settings': self.settings, 'wait': True})
+        if 'error' in answer:
+            sg.popup_error(f'The renamer daemon could not rename your replays:\n\n{answer["error"]}')
+            return None
 
-    def has_matching(self, replay, lst, has_id=False):
-        teams = replay.teams[:]
-        lineups = []
+        return answer['result']
 
-        if has_id:
-            my_id = int(self.settings[defaults._player_id])
-            get_my_team = filter(lambda team: my_id in [player.toon_id for player in team.players], teams)
-            
-            # the team you are on
-            my_team = list(get_my_team)
-            my_team_races = ""
-
-            if my_team:
-                my_team_races = my_team[0].lineup
-                teams.remove(my_team[0])
-
-            # the other teams that you face (this is a list)
-            other_teams = teams
-
-            # remove by matchups
-            vs_string = my_team_races
-            for team in other_teams:
-                vs_string += 'v' + team.lineup
-            lineups = vs_string.lower().split('v')
-        
-        else:
-            for team in teams:
-                lineups.append(team.lineup.lower())
-            
-        for matchup in lst:
-            matchup = matchup.lower().split('v')
-            if matchup == lineups:
-                return True
-        
-        return False
 
     def may_contain_duplicates(self, template):
-        template = str(template)
-        if '$unique' in template or '$currentname' in template:
-            return False
-        
-        hour = '$hour' in template
-        minute = '$min' in template
-        sec = '$sec' in template
-
-        return not (hour and minute and sec)
+        return stringmatch.may_contain_duplicates(template)
 
 
     def template_contains_id_vars(self, template):
         """returns whether the user included a id_variable when he did not fill in player id"""
-        for var in stringmatch.id_variables:
-            if var in template:
-                return True
-        return False
+        return stringmatch.template_contains_id_vars(template)
 
 
     def set_to_default(self):
@@ -448,7 +271,7 @@ class ReplayRenamer:
             defaults._source_dir: self.values[defaults._source_dir],
             defaults._target_dir: self.values[defaults._target_dir],
             defaults._player_id: self.values[defaults._player_id],
-            defaults._operation: defaults._move if self.values[defaults._move] else defaults._copy,
+            defaults._operation: next((operation for operation in (defaults._move, defaults._hardlink, defaults._reflink) if self.values[operation]), defaults._copy),
             defaults._excludes: {
                 defaults._ai: self.values[defaults._ai],
                 defaults._custom: self.values[defaults._custom],
@@ -463,7 +286,10 @@ class ReplayRenamer:
                 defaults._hots: self.values[defaults._hots],
                 defaults._lotv: self.values[defaults._lotv]
             },
-            defaults._tray: self.values[defaults._tray]
+            defaults._tray: self.values[defaults._tray],
+
+            # not part of the GUI, so whatever is in the settings file is kept
+            defaults._performance: defaults.performance_settings(self.settings)
         }
 
         with open(defaults.settings_file, 'w') as file:
@@ -492,10 +318,9 @@ class ReplayRenamer:
         inner_space = 0.6
 
         radio_copy = sg.Radio('Copy', 'operation_group', key=defaults._copy)
-        radio_move = sg.Radio('Move', 'operation_group', key=defaults._move)
-
-        if operation == defaults._move:
-            radio_move = sg.Radio('Move', 'operation_group', key=defaults._move, default=True)
+        radio_move = sg.Radio('Move', 'operation_group', key=defaults._move, default=operation == defaults._move)
+        radio_hardlink = sg.Radio('Hardlink', 'operation_group', key=defaults._hardlink, default=operation == defaults._hardlink)
+        radio_reflink = sg.Radio('Reflink', 'operation_group', key=defaults._reflink, default=operation == defaults._reflink)
 
         self.layout = [
 
@@ -508,7 +333,7 @@ class ReplayRenamer:
             
             
             # File Operation
-            [sg.Text('File Operation', size=(first_column_width, 1)), radio_copy, radio_move],
+            [sg.Text('File Operation', size=(first_column_width, 1)), radio_copy, radio_move, radio_hardlink, radio_reflink],
 
             # divider
             [sg.Text(' ')],
@@ -550,12 +375,3 @@ class ReplayRenamer:
             # Final Buttons
             [sg.Button('Rename', key='Rename'), sg.Save(), sg.Button('Default', key='Default'), sg.Exit()]
         ]
-
-
-def split_string(s):
-    return [elem.strip() for elem in s.split(',')] if s else []
-
-
-def add_leading_zero(s):
-    s = str(s)
-    return '0' + s if len(s) == 1 else s
\ No newline at end of file
@@ -0,0 +1,636 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from os.path import join
+
+import src.structures.defaults as defaults
+from src.structures.stringmatch import split_string
+from src.structures.template import CompiledTemplate
+import src.batch.fileops as fileops
+from src.batch.FilterEngine import FilterEngine
+from src.batch.DedupIndex import DedupIndex
+from src.batch.hashing import file_digest
+from src.batch.Journal import JournalStat, abandoned_journals, run_journal
+from src.batch.Library import Library
+from src.batch.Manifest import Manifest
+from src.batch.Metrics import Metrics
+from src.batch.parsing import is_complete, load_staged
+from src.batch.Pipeline import Pipeline
+from src.batch.ReplayCache import ReplayCache, cache_key
+from src.batch.scanner import scan_replays
+from src.batch.TargetIndex import TargetIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRenamer:
+    """Renames every replay in the source directory that passes through the filters.
+
+    A run plans first: the replays stream through a Pipeline (scan, parse, filter, hash,
+    render, plan) while their folders are still listed, claiming a free name for each of
+    them, and a dry run stops there. It then carries out the plan, journaled so an
+    interrupted run can be finished.
+    The cache, the manifest, the dedup index and the library next to the settings file
+    keep later runs from parsing, hashing or renaming a replay again. A parse pool that
+    outlives the renamer (like the daemon's) can be passed in.
+    """
+
+    def __init__(self, settings, metrics_hook=None, pool=None):
+        self.settings = settings
+        self.metrics_hook = metrics_hook
+        self.shared_pool = pool
+        self.performance = defaults.performance_settings(settings)
+
+        my_id = int(settings[defaults._player_id]) if settings[defaults._player_id] else ''
+        self.template = CompiledTemplate(settings[defaults._template], my_id)
+        self.filters = FilterEngine(settings)
+        self.rejected = {'header': 0, 'full': 0}
+        self.stage_stats = {}
+        self.bytes_copied = 0
+        self.bytes_avoided = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.resumed = 0
+        self.failed = []
+        self.lock = threading.Lock()
+
+
+    def run(self, op=None, incremental=True, dry_run=False):
+        """applies the file operation to every replay that passes the filters, returns how many were renamed
+
+        op(orig_location, new_location) replaces the file operation from the settings, and
+        may return (bytes copied, bytes avoided) like the ones in fileops do. A run that is
+        not incremental goes through every replay again, whatever earlier runs did. A dry
+        run only makes the plan, returning how many replays would be renamed.
+        """
+        self.open(op, incremental, dry_run)
+
+        try:
+            self.open_journal()
+
+            self.process(self.listed(self.list_replays()))
+            self.complete = True
+
+        finally:
+            self.close()
+
+        return len(self.plan) if dry_run else self.renamed_count
+
+
+    def rename_files(self, paths, op=None, incremental=True, dry_run=False):
+        """renames some of the replays (a burst from the watcher, a chunk of a run) as one job, returns how many were renamed"""
+        return self.rename_items([{'path': path} for path in paths], op, incremental, dry_run)
+
+
+    def rename_items(self, items, op=None, incremental=True, dry_run=False, leaving=()):
+        """renames the replays of the items like rename_files, items that come with their 'digest' and 'record' are not hashed or parsed
+
+        leaving names the replays in the destination folder that are sure to move away, so
+        their names are free for the others (see TargetIndex).
+        """
+        self.open(op, incremental, dry_run)
+        self.leaving = leaving
+
+        try:
+            self.open_journal()
+            self.process(items)
+            self.complete = True
+
+        finally:
+            self.close()
+
+        return len(self.plan) if dry_run else self.renamed_count
+
+
+    def list_replays(self):
+        """yields (path, stat) of every replay in the source folder that a run goes through, as the folders are listed"""
+        excluded_directories = split_string(self.settings[defaults._excludes][defaults._exclude_dirs])
+        return scan_replays(self.settings[defaults._source_dir], excluded_directories, skip=[self.settings[defaults._target_dir]])
+
+
+    def listed(self, replays):
+        """yields the items of the replays while they are listed, the time spent listing them (not waiting on the pipeline) going into the metrics"""
+        seconds = 0
+        count = 0
+        start = time.perf_counter()
+
+        for path, stat in replays:
+            seconds += time.perf_counter() - start
+            count += 1
+            yield {'path': path, 'stat': stat}
+            start = time.perf_counter()
+
+        self.metrics.add_time('list', seconds + time.perf_counter() - start, items=count)
+
+
+    def process(self, items):
+        """plans the items in the pipeline, then carries out the plan unless this is a dry run"""
+        self.targets = TargetIndex(self.settings[defaults._target_dir], leaving=self.leaving)
+
+        pipeline = Pipeline(queue_size=int(self.performance[defaults._queue_size]))
+        pipeline.add_stage('scan', self.timed('scan', self.scan), workers=self.get_workers(defaults._scan_workers))
+        pipeline.add_stage('parse', self.timed('parse', self.parse), workers=self.get_workers(defaults._parse_workers))
+        pipeline.add_stage('filter', self.timed('filter', self.filter), workers=self.get_workers(defaults._filter_workers))
+        pipeline.add_stage('hash', self.timed('hash', self.hash_item), workers=self.get_workers(defaults._scan_workers))
+        pipeline.add_stage('render', self.timed('render', self.render_item), workers=self.get_workers(defaults._render_workers))
+        pipeline.add_stage('plan', self.timed('plan', self.plan_item), ordered=True)
+
+        # with a single parse worker, replays are parsed in its thread instead of in another process
+        if self.shared_pool:
+            self.pool = self.shared_pool
+        elif self.get_workers(defaults._parse_workers) > 1:
+            self.pool = ProcessPoolExecutor(max_workers=self.get_workers(defaults._parse_workers))
+
+        try:
+            pipeline.run(items)
+
+            if self.dry_run:
+                for item in self.plan:
+                    self.finish(item, item['newname'])
+            else:
+                self.execute()
+
+        finally:
+            self.stage_stats = pipeline.stats()
+
+
+    def rename_file(self, path, op=None, incremental=True):
+        """runs a single replay through every stage in this thread, returns whether it was renamed"""
+        self.open(op, incremental)
+
+        # a single name is cheaper to check on disk than listing the whole destination folder
+        self.targets = TargetIndex(self.settings[defaults._target_dir], list_existing=False)
+
+        try:
+            item = {'path': path}
+            for name, stage in (('scan', self.scan), ('parse', self.parse), ('filter', self.filter), ('hash', self.hash_item), ('render', self.render_item), ('plan', self.plan_item)):
+                item = self.timed(name, stage)(item)
+
+            self.execute()
+            self.complete = True
+
+        finally:
+            self.close()
+
+        return self.renamed_count > 0
+
+
+    def open(self, op, incremental, dry_run=False):
+        """resets the counts and opens the cache, the manifest and the dedup index
+
+        A single replay from the watcher is not journaled: its copy lands in the destination
+        folder in one piece (see fileops), and the manifest does not have it until it did.
+        """
+        self.op = op or fileops.operations[self.settings[defaults._operation]]
+        # what the journal redoes after a crash, an op that is not one of fileops stands in for the operation of the settings
+        self.operation = next((name for name, operation in fileops.operations.items() if operation is self.op), self.settings[defaults._operation])
+        # a move out of the replay folder leaves no replay behind there, not even one that was already in the destination
+        self.moves_away = self.op is fileops.move_file and cache_key(self.settings[defaults._source_dir]) != cache_key(self.settings[defaults._target_dir])
+        self.dry_run = dry_run
+        self.leaving = ()
+        self.plan = []
+        self.renamed_count = 0
+        self.bytes_copied = 0
+        self.bytes_avoided = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.resumed = 0
+        self.failed = []
+        self.complete = False
+        self.filters = FilterEngine(self.settings)
+        self.rejected = {'header': 0, 'full': 0}
+        self.incremental = incremental
+        self.cache = self.open_cache()
+        self.manifest = Manifest(defaults.manifest_file, self.settings)
+        self.dedup = self.open_dedup()
+        self.library = Library(defaults.library_file, self.settings[defaults._target_dir])
+        self.metrics = Metrics(self.performance[defaults._metrics_file], self.metrics_hook)
+        self.journal = None
+        self.pool = None
+
+
+    def open_journal(self):
+        """starts journaling the file operations, after finishing what an interrupted run left in the journal"""
+
+        # a dry run does not touch any file, so it leaves the journal of an interrupted run alone
+        if not self.dry_run:
+            self.resume()
+            self.journal = run_journal(defaults.journal_file, int(self.performance[defaults._journal_sync]))
+
+
+    def close(self):
+        if self.pool and self.pool is not self.shared_pool:
+            self.pool.shutdown()
+
+        if self.cache:
+            self.cache.close()
+
+        if self.dedup:
+            self.dedup.close()
+
+        self.library.close()
+        self.manifest.close()
+        self.metrics.close()
+
+        # only dropped once the manifest has everything the journal knows
+        if self.journal:
+            self.journal.close(self.complete)
+
+
+    def summary(self):
+        """what the last run did, as plain values that can be shown or sent to another process"""
+        return {
+            'dry_run': self.dry_run,
+            'renamed': len(self.plan) if self.dry_run else self.renamed_count,
+            'collisions': self.targets.collisions,
+            'skipped': self.skipped,
+            'duplicates': self.duplicates,
+            'resumed': self.resumed,
+            'failed': len(self.failed),
+            'rejected': dict(self.rejected),
+            'rules': self.filters.rejected.most_common(),
+            'bytes_copied': self.bytes_copied,
+            'bytes_avoided': self.bytes_avoided,
+            'stages': self.stage_stats,
+            'plan': [(item['path'], item['newname'], item['copy']) for item in self.plan] if self.dry_run else []
+        }
+
+
+    def timed(self, name, stage):
+        """the stage, timing how long each replay spends in it"""
+        def timed_stage(item):
+            start = time.perf_counter()
+            item = stage(item)
+            seconds = time.perf_counter() - start
+
+            item.setdefault('timings', {})[name] = seconds
+            self.metrics.add_time(name, seconds)
+            return item
+
+        return timed_stage
+
+
+    def scan(self, item):
+        """skips the replays that earlier runs already handled, and looks the others up in the cache (see hash_item for the replays handled under another path)"""
+        if 'stat' not in item:
+            try:
+                item['stat'] = os.stat(item['path'])
+
+            # the watcher hands over replays that may have been moved or deleted since
+            except FileNotFoundError:
+                item['done'] = True
+                return item
+
+        item['done'] = self.incremental and self.manifest.is_done(item['path'], item['stat'])
+
+        if item['done']:
+            with self.lock:
+                self.skipped += 1
+            return item
+
+        if 'record' in item:
+            return item
+
+        record = self.cache.get(item['path'], item['stat']) if self.cache else None
+
+        # a cached header record is only good for as long as the current filters still reject it
+        if record is not None and is_complete(record, self.filters):
+            item['record'] = record
+            item['cached'] = True
+
+        return item
+
+
+    def parse(self, item):
+        """parses the replays that were not in the cache"""
+        if not item['done'] and 'record' not in item:
+            try:
+                if self.pool:
+                    item['record'] = self.pool.submit(load_staged, item['path'], self.filters).result()
+                else:
+                    item['record'] = load_staged(item['path'], self.filters)
+
+            # sc2reader raises all sorts of errors on corrupt or truncated replays
+            except Exception as e:
+                return self.fail(item, e)
+
+            item['parsed'] = True
+
+            if self.cache:
+                self.cache.put(item['path'], item['stat'], item['record'])
+
+        return item
+
+
+    def fail(self, item, error):
+        """leaves a replay that cannot be read where it is, so the rest of the run goes on without it"""
+        logger.warning('could not read %s: %s', item['path'], error, extra={'replay': item['path']})
+        item['done'] = True
+        item['failed'] = True
+
+        with self.lock:
+            self.failed.append(item['path'])
+
+        return item
+
+
+    def filter(self, item):
+        item['rejected_by'] = None if item['done'] else self.rejection(item['record'])
+        item['passed'] = not item['done'] and item['rejected_by'] is None
+        return item
+
+
+    def hash_item(self, item):
+        """hashes the replays that passed the filters, skipping the ones whose contents were already renamed"""
+        if not item['passed']:
+            return item
+
+        # hashed before the file operation, since a move takes the replay away
+        if 'digest' not in item:
+            try:
+                item['digest'] = file_digest(item['path'])
+            except OSError as e:
+                item['passed'] = False
+                return self.fail(item, e)
+
+        renamed_to = self.dedup.renamed_to(item['digest']) if self.incremental and self.dedup is not None else None
+
+        if renamed_to is not None:
+            item['done'] = True
+            item['passed'] = False
+
+            with self.lock:
+                self.skipped += 1
+                self.duplicates += 1
+
+            # moved away, a copy of a replay that is already in the destination does not stay behind in the replay folder either (see plan_item)
+            if renamed_to and self.moves_away:
+                item['duplicate_of'] = renamed_to
+
+        return item
+
+
+    def render_item(self, item):
+        if item['passed']:
+            item['newname'] = self.render(item['record'])
+
+        return item
+
+
+    def plan_item(self, item):
+        """claims a free name in the destination folder for the replay, or finishes it if it is not renamed"""
+        if not item['passed']:
+            # only deleted, like a replay whose contents are already under its name (see execute)
+            if 'duplicate_of' in item:
+                item.update(newname=item['duplicate_of'], copy=False)
+                self.plan.append(item)
+            else:
+                self.finish(item, '')
+
+            return item
+
+        newname = self.targets.claim(item['newname'], item['path'], item['digest'])
+
+        # a replay with the same contents already has the name, so there is nothing to copy
+        item['copy'] = newname is not None
+        if item['copy']:
+            item['newname'] = newname
+        else:
+            with self.lock:
+                self.skipped += 1
+                self.duplicates += 1
+
+        # the plan can hold a lot of replays, so the library gets their records now rather than once they are renamed (see Library.prune)
+        if not self.dry_run:
+            self.library.put(item['newname'], item['record'].filename, item['digest'], item['record'].to_json())
+
+        del item['record']
+        self.plan.append(item)
+        return item
+
+
+    def execute(self):
+        """carries out the plan, grouped by destination and source folder so that the disk does not jump around"""
+        target_dir = self.settings[defaults._target_dir]
+        number_rounds(self.plan, target_dir)
+        self.plan.sort(key=lambda item: (item['round'], os.path.dirname(join(target_dir, item['newname'])), os.path.dirname(item['path'])))
+
+        file_operation = self.timed('file', self.file_operation)
+        workers = self.get_workers(defaults._file_workers)
+
+        # every folder of a sharded template is made once per run, instead of being checked for every replay
+        for folder in {os.path.dirname(item['newname']) for item in self.plan if item['copy']} - {''}:
+            os.makedirs(join(target_dir, folder), exist_ok=True)
+
+        # a replay that is not copied is deleted when it is moved away, unless it is the file under its name itself
+        for item in self.plan:
+            item['delete'] = not item['copy'] and self.moves_away and not os.path.samefile(item['path'], join(target_dir, item['newname']))
+
+        if self.journal:
+            self.journal.begin({'fingerprint': self.manifest.fingerprint}, self.plan, target_dir, self.operation)
+
+        # the replays that break a circle of names step aside before any other one is moved (see number_rounds)
+        for item in self.plan:
+            if 'via' in item:
+                fileops.move_file(item['path'], item['via'])
+
+        def execute_item(item):
+            self.finish(file_operation(item), item['newname'])
+
+            if self.journal:
+                self.journal.done(item)
+
+        # a round only starts once the replays of the one before it made room
+        for _, items in itertools.groupby(self.plan, key=lambda item: item['round']):
+            items = list(items)
+
+            if workers > 1 and len(items) > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(execute_item, items))
+            else:
+                for item in items:
+                    execute_item(item)
+
+
+    def file_operation(self, item):
+        """do the renaming operation"""
+        if item['copy']:
+            new_location = join(self.settings[defaults._target_dir], item['newname'])
+            copied, avoided = self.op(item.get('via', item['path']), new_location) or (0, 0)
+
+            with self.lock:
+                self.renamed_count += 1
+                self.bytes_copied += copied
+                self.bytes_avoided += avoided
+
+        # its contents are already under its name (copied there before the operation was switched to move, say), so only the delete is left
+        elif item['delete']:
+            os.remove(item['path'])
+
+        return item
+
+
+    def resume(self):
+        """finishes the file operations of the runs that were interrupted, redoing the ones that did not complete"""
+        for journal in abandoned_journals(defaults.journal_file):
+            self.resume_journal(journal)
+
+
+    def resume_journal(self, journal):
+        """finishes the file operations in the journal of an interrupted run"""
+        header, entries = journal.read()
+
+        # its run did not get to write the plan (or is just about to lock its new journal), so there is nothing to finish
+        if header is None:
+            journal.close(complete=False)
+            return
+
+        redone = 0
+
+        # what the interrupted run did is only remembered if it used the same settings as this one
+        same_settings = header is not None and header['fingerprint'] == self.manifest.fingerprint
+
+        # the replays that break a circle of names step aside again, if they did not get to, before any other one is moved (see number_rounds)
+        for entry, done in entries:
+            if entry.get('via') and not done and os.path.isfile(entry['path']) and file_digest(entry['path']) == entry['digest']:
+                fileops.move_file(entry['path'], entry['via'])
+
+        for entry, done in entries:
+            target = join(entry['target_dir'], entry['target'])
+            source = entry.get('via') or entry['path']
+
+            if entry['copy'] and not done and not self.is_written(entry, target, source):
+                # a replay that was deleted or moved away since cannot be renamed anymore
+                if not os.path.isfile(source):
+                    logger.warning('%s is gone, its interrupted rename to %s is dropped', entry['path'], entry['target'])
+                    continue
+
+                try:
+                    fileops.operations[entry['operation']](source, target)
+                except OSError:
+                    logger.exception('could not redo the interrupted rename of %s to %s', entry['path'], entry['target'])
+                    continue
+
+                redone += 1
+
+            # the delete of a replay whose contents were already in the destination, which is_written finishes once it found them there
+            elif entry.get('delete') and not done and os.path.isfile(entry['path']) and self.is_written(entry, target, entry['path']):
+                redone += 1
+
+            if same_settings:
+                self.manifest.put(entry['path'], JournalStat(entry['size'], entry['mtime']), entry['digest'], entry['target'])
+
+                if self.dedup:
+                    self.dedup.put(entry['digest'], entry['target'])
+
+        # the scan has to see them
+        self.manifest.flush()
+        if self.dedup:
+            self.dedup.flush()
+
+        self.resumed += redone
+
+        logger.info('Finished %d interrupted renames of %s, %d of them had to be redone', len(entries), journal.path, redone)
+
+        # everything in it was finished or dropped, so a run that fails later does not go through it again
+        journal.close(complete=True)
+
+
+    def is_written(self, entry, target, source):
+        """whether the file operation of a journal entry (from source) completed, cleaning up after it if it did not"""
+        if os.path.exists(target + '.renaming'):
+            os.remove(target + '.renaming')
+
+        if not os.path.isfile(target) or os.path.getsize(target) != entry['size'] or file_digest(target) != entry['digest']:
+            return False
+
+        # a move between volumes that was interrupted after the copy only has the delete left, unless another replay moved to its name since
+        if entry['operation'] == defaults._move and os.path.isfile(source) and not os.path.samefile(source, target) and file_digest(source) == entry['digest']:
+            os.remove(source)
+
+        return True
+
+
+    def finish(self, item, target):
+        """remembers what was done with the replay in the manifest and the dedup index (the library got it when it was planned)"""
+        if not item['done'] and not self.dry_run:
+            # a replay the filters rejected was not hashed, the manifest only needs its digest once it is touched (see Manifest.is_done)
+            self.manifest.put(item['path'], item['stat'], item.get('digest'), target)
+
+            if target:
+                self.manifest.put_target(target, item['digest'])
+
+                if self.dedup:
+                    self.dedup.put(item['digest'], target)
+
+        self.metrics.replay_done(item)
+
+
+    def open_cache(self):
+        """the on-disk cache of parsed replays, None if it is turned off"""
+        cache_size = int(self.performance[defaults._cache_size])
+        return ReplayCache(defaults.cache_file, cache_size) if cache_size > 0 else None
+
+
+    def open_dedup(self):
+        """the on-disk index of the contents of renamed replays, None if it is turned off"""
+        dedup_size = int(self.performance[defaults._dedup_size])
+        return DedupIndex(defaults.dedup_file, dedup_size, self.manifest.fingerprint, self.settings[defaults._target_dir]) if dedup_size > 0 else None
+
+
+    def get_workers(self, stage):
+        """number of threads working on a stage, 0 means one per core"""
+        workers = int(self.performance[stage])
+        return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+    def rejection(self, record):
+        """the filter that rejects the replay, None if it passes, counting the stage that rejected it"""
+        rule = self.filters.check(record)
+
+        if rule is not None:
+            with self.lock:
+                self.rejected['full' if rule in FilterEngine.matchup_rules else 'header'] += 1
+
+        return rule
+
+
+    def render(self, record):
+        """fills in the template with the values of the replay, returning the new file name (under the folders of the template)"""
+        *folders, name = self.template.render(record).split('/')
+
+        # a variable that came out empty must not leave an empty folder name, which would point outside the destination
+        return '/'.join([folder.strip(' .') or '_' for folder in folders] + [name + '.SC2Replay'])
+
+
+def number_rounds(plan, target_dir):
+    """puts every replay of the plan in a round after the replay whose name it takes, when that one moves away in the same plan (see TargetIndex)
+
+    Replays that trade names in a circle cannot wait for each other, so one of them steps
+    aside to a temporary name 'via' first, and takes its own new name in the last round of
+    the circle.
+    """
+    sources = {cache_key(item['path']): item for item in plan if item['copy']}
+
+    for item in plan:
+        chain = [item]
+
+        while 'round' not in chain[-1]:
+            blocker = sources.get(cache_key(join(target_dir, chain[-1]['newname']))) if chain[-1]['copy'] else None
+
+            if blocker is None:
+                chain[-1]['round'] = 0
+
+            elif any(blocker is earlier for earlier in chain):
+                blocker['via'] = join(os.path.dirname(blocker['path']), blocker['digest'] + '.moving')
+                del sources[cache_key(blocker['path'])]
+
+            else:
+                chain.append(blocker)
+
+        for later, earlier in reversed(list(zip(chain, chain[1:]))):
+            later['round'] = earlier['round'] + 1
@@ -0,0 +1,48 @@
+import os
+import time
+
+from src.batch.SqliteStore import SqliteStore
+
+
+class DedupIndex(SqliteStore):
+    """Remembers the contents of every replay that was renamed, by the blake2b hash of the file.
+
+    A replay whose contents were already handled with the same settings fingerprint is a
+    duplicate, wherever it shows up: under another name, in another folder or in a watch
+    event after a batch run, as long as the renamed copy is still there. Batch runs and
+    the watcher share the same index on disk. Hashes are kept for max_entries replays,
+    the least recently seen ones are evicted first.
+    """
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS hashes (hash TEXT PRIMARY KEY, target TEXT, fingerprint TEXT, last_used REAL)',
+        'CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)'
+    )
+    insert = 'INSERT OR REPLACE INTO hashes (hash, target, fingerprint, last_used) VALUES (?, ?, ?, ?)'
+    touch = 'UPDATE hashes SET last_used = ? WHERE hash = ?'
+    evict = 'DELETE FROM hashes WHERE hash IN (SELECT hash FROM hashes ORDER BY last_used DESC LIMIT -1 OFFSET ?)'
+
+    def __init__(self, path, max_entries, fingerprint, target_dir):
+        super().__init__(path, max_entries)
+        self.fingerprint = fingerprint
+        self.target_dir = target_dir
+
+
+    def renamed_to(self, digest):
+        """the name a replay with these contents was renamed to with the same settings ('' if it was filtered out), None if it was not handled"""
+        with self.lock:
+            row = self.connection.execute('SELECT target, fingerprint FROM hashes WHERE hash = ?', (digest,)).fetchone()
+
+        if row is None or row[1] != self.fingerprint:
+            return None
+
+        if row[0] and not os.path.exists(os.path.join(self.target_dir, row[0])):
+            return None
+
+        self.use(digest)
+        return row[0]
+
+
+    def put(self, digest, target):
+        """stores the name the contents were renamed to"""
+        self.add((digest, target, self.fingerprint, time.time()))
@@ -0,0 +1,125 @@
+import threading
+from collections import Counter
+
+import src.structures.defaults as defaults
+from src.structures.stringmatch import split_string, template_contains_id_vars
+
+
+class FilterEngine:
+    """The exclusion and inclusion settings, worked out once per run instead of once per replay.
+
+    Player counts are parsed once, and matchups are normalized into tuples of lowercase
+    lineups ('PvZ' becomes ('p', 'z')), so matching a replay is a single set lookup.
+    The cheap checks on the replay details come first, in the order of header_rules,
+    and self.rejected counts how many replays each rule threw out. It can be shared
+    between threads and sent to other processes.
+    """
+
+    header_rules = (defaults._ai, defaults._custom, defaults._min_players, defaults._max_players, 'Expansion')
+    matchup_rules = (defaults._exclude_matchups, defaults._include_matchups)
+
+    def __init__(self, settings):
+        excludes = settings[defaults._excludes]
+        includes = settings[defaults._includes]
+
+        self.exclude_ai = excludes[defaults._ai]
+        self.exclude_custom = excludes[defaults._custom]
+        self.min_players = int(includes[defaults._min_players])
+        self.max_players = int(includes[defaults._max_players])
+        self.excluded_expansions = {expansion for expansion in (defaults._wol, defaults._hots, defaults._lotv) if not includes[expansion]}
+
+        self.has_id = template_contains_id_vars(settings[defaults._template])
+        self.my_id = int(settings[defaults._player_id]) if self.has_id else None
+        self.exclude_matchups = {normalize_matchup(matchup) for matchup in split_string(excludes[defaults._exclude_matchups])}
+        self.include_matchups = {normalize_matchup(matchup) for matchup in split_string(includes[defaults._include_matchups])}
+
+        self.rejected = Counter()
+        self.lock = threading.Lock()
+
+
+    def __getstate__(self):
+        # the lock stays behind when the engine is sent to a parsing process
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+    def check(self, record):
+        """returns the rule that rejects the replay (counting it), None if the replay passes"""
+        rule = self.header_rejection(record)
+
+        if rule is None and record.load_level >= 2:
+            rule = self.matchup_rejection(record)
+
+        if rule is not None:
+            with self.lock:
+                self.rejected[rule] += 1
+
+        return rule
+
+
+    def passes_header(self, record):
+        """checks the filters that only need the replay details (load_level=1)"""
+        return self.header_rejection(record) is None
+
+
+    def header_rejection(self, record):
+        """the first filter on the replay details that rejects the replay, None if they all pass"""
+        if self.exclude_ai and record.has_computers:
+            return defaults._ai
+
+        if self.exclude_custom and not record.is_ladder:
+            return defaults._custom
+
+        if record.player_count < self.min_players:
+            return defaults._min_players
+
+        if record.player_count > self.max_players:
+            return defaults._max_players
+
+        if record.expansion in self.excluded_expansions:
+            return 'Expansion'
+
+        return None
+
+
+    def matchup_rejection(self, record):
+        """the matchup filter that rejects a fully parsed replay, None if it passes"""
+        if not self.exclude_matchups and not self.include_matchups:
+            return None
+
+        lineups = self.lineups(record)
+
+        if lineups in self.exclude_matchups:
+            return defaults._exclude_matchups
+
+        if self.include_matchups and lineups not in self.include_matchups:
+            return defaults._include_matchups
+
+        return None
+
+
+    def lineups(self, record):
+        """the lineups of the replay as a matchup tuple, your team first if there is an id"""
+        teams = record.teams
+
+        if not self.has_id:
+            return tuple(lineup.lower() for lineup, _ in teams)
+
+        my_team = next((index for index, (_, players) in enumerate(teams) if any(player[1] == self.my_id for player in players)), None)
+
+        # without your team in the replay, the matchup starts with an empty lineup
+        my_races = teams[my_team][0] if my_team is not None else ''
+        others = [lineup for index, (lineup, _) in enumerate(teams) if index != my_team]
+
+        return tuple(lineup.lower() for lineup in [my_races] + others)
+
+
+def normalize_matchup(matchup):
+    """'PTvZZ' -> ('pt', 'zz')"""
+    return tuple(matchup.lower().split('v'))
@@ -0,0 +1,183 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+
+# the size and modification time of a replay when it was planned, standing in for its os.stat
+JournalStat = namedtuple('JournalStat', ['st_size', 'st_mtime_ns'])
+
+
+class Journal:
+    """Write-ahead log of the file operations of a run, so that an interrupted run can be finished.
+
+    Before the execute phase starts, every planned operation is written down (with the
+    size, modification time and hash of the replay, and the name it is renamed to) and
+    synced to disk in one go, along with the operation that carries them out and the
+    replays that are only deleted (see BatchRenamer.file_operation). Every operation that
+    finishes is marked done, and those marks are synced in groups of sync_every, so the
+    journal does not cost an fsync per replay. A lost mark only means the operation is
+    checked again when resuming.
+
+    Every run writes a journal of its own (see run_journal), locked for as long as the run
+    goes, so runs of the tray and of the command line do not write into each other's
+    journal. The journal is removed once a run completes, so a journal that is still there
+    and not locked belongs to a run that was interrupted (see abandoned_journals).
+    """
+
+    def __init__(self, path, sync_every=256):
+        self.path = path
+        self.sync_every = sync_every
+        self.unsynced = 0
+        self.file = None
+        self.lock = threading.Lock()
+
+
+    def take(self):
+        """locks the journal of an interrupted run for this one, False if it is gone or its run is still going"""
+        try:
+            self.file = open(self.path, 'r+', encoding='utf-8')
+        except FileNotFoundError:
+            return False
+
+        if not lock(self.file, wait=False):
+            self.file.close()
+            self.file = None
+            return False
+
+        return True
+
+
+    def read(self):
+        """the header of the interrupted run (None if it had not written one yet) and its operations as (entry, done)"""
+        header = None
+        entries = {}
+        done = set()
+
+        self.file.seek(0)
+        for line in self.file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line may have been cut off by the crash
+                continue
+
+            if 'header' in record:
+                header = record['header']
+            elif 'done' in record:
+                done.add(record['done'])
+            else:
+                entries[record['id']] = record
+
+        return header, [(entry, entry['id'] in done) for entry in entries.values()]
+
+
+    def begin(self, header, items, target_dir, operation):
+        """writes down every operation of the plan before any of them runs, numbering the items"""
+        self.file = open(self.path, 'w', encoding='utf-8')
+        lock(self.file, wait=True)
+        self.file.write(json.dumps({'header': header}) + '\n')
+
+        for number, item in enumerate(items):
+            item['journal_id'] = number
+            self.file.write(json.dumps({
+                'id': number,
+                'path': item['path'],
+                'size': item['stat'].st_size,
+                'mtime': item['stat'].st_mtime_ns,
+                'digest': item['digest'],
+                'target_dir': target_dir,
+                'target': item['newname'],
+                'operation': operation,
+                'copy': item['copy'],
+                'delete': item['delete'],
+                'via': item.get('via')
+            }) + '\n')
+
+        self.sync()
+
+
+    def done(self, item):
+        with self.lock:
+            self.file.write(json.dumps({'done': item['journal_id']}) + '\n')
+            self.unsynced += 1
+
+            if self.unsynced >= self.sync_every:
+                self.sync()
+
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+
+    def close(self, complete):
+        """removes the journal if the run completed, keeps it (synced) for the next run otherwise"""
+        if self.file:
+            with self.lock:
+                self.sync()
+                unlock(self.file)
+                self.file.close()
+                self.file = None
+
+        if complete and os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+def run_journal(path, sync_every=256):
+    """a journal for a new run, named after path so that abandoned_journals finds it"""
+    stem, extension = os.path.splitext(path)
+    return Journal(f'{stem}.{os.getpid()}.{time.time_ns()}{extension}', sync_every)
+
+
+def abandoned_journals(path):
+    """the journals named after path whose runs were interrupted, each one taken (locked) by this run"""
+    stem, extension = os.path.splitext(path)
+
+    # the journal of a single run before every run had its own matches too
+    for name in sorted(glob.glob(glob.escape(stem) + '*' + extension)):
+        journal = Journal(name)
+        if journal.take():
+            yield journal
+
+
+def lock(file, wait):
+    """locks the file against the other runs until it is unlocked or closed, False if wait is not set and another run has it"""
+    if sys.platform == 'win32':
+        import msvcrt
+
+        file.seek(0)
+        try:
+            # LK_LOCK gives up after 10 seconds
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            if wait:
+                raise
+            return False
+
+    else:
+        import fcntl
+
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+
+    return True
+
+
+def unlock(file):
+    if sys.platform == 'win32':
+        import msvcrt
+
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    else:
+        import fcntl
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
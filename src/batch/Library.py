@@ -0,0 +1,52 @@
+import os
+
+from src.batch.ReplayCache import cache_key
+from src.batch.SqliteStore import SqliteStore
+from src.structures.record import ReplayRecord
+
+
+class Library(SqliteStore):
+    """The record of every replay in a destination folder, by the name it was renamed to.
+
+    Whenever a replay is renamed (or found there already under its new name), its record
+    is stored under that name with the hash of the file and the path it was renamed from
+    (for $currentname). That is all a new template needs, so the whole destination can be
+    renamed again without parsing a single replay (see retemplate_destination). Unlike the
+    cache, the library is never evicted, and records are stored as JSON.
+    """
+
+    schema = ('CREATE TABLE IF NOT EXISTS library (folder TEXT, name TEXT, filename TEXT, hash TEXT, record TEXT, PRIMARY KEY (folder, name))',)
+    insert = 'INSERT OR REPLACE INTO library (folder, name, filename, hash, record) VALUES (?, ?, ?, ?, ?)'
+
+    def __init__(self, path, target_dir):
+        super().__init__(path)
+        self.target_dir = target_dir
+        self.folder = cache_key(target_dir)
+
+
+    def put(self, name, filename, digest, record):
+        """stores the record (as JSON) of the replay that is now under name"""
+        self.add((self.folder, name, filename, digest, record))
+
+
+    def records(self):
+        """(name, hash, record) of every replay in the library of the destination folder"""
+        with self.lock:
+            rows = self.connection.execute('SELECT name, filename, hash, record FROM library WHERE folder = ?', (self.folder,)).fetchall()
+
+        return [(name, digest, ReplayRecord.from_json(record, filename)) for name, filename, digest, record in rows]
+
+
+    def prune(self):
+        """forgets the names that no replay is under anymore, returns how many"""
+        self.flush()
+
+        with self.lock:
+            names = [name for (name,) in self.connection.execute('SELECT name FROM library WHERE folder = ?', (self.folder,))]
+
+        gone = [(self.folder, name) for name in names if not os.path.isfile(os.path.join(self.target_dir, name))]
+
+        with self.lock, self.connection:
+            self.connection.executemany('DELETE FROM library WHERE folder = ? AND name = ?', gone)
+
+        return len(gone)
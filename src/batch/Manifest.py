@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+import src.structures.defaults as defaults
+from src.batch.hashing import file_digest
+from src.batch.ReplayCache import cache_key
+from src.batch.SqliteStore import SqliteStore
+
+
+# bump this whenever what a run does with a replay changes, so every replay is done again
+_manifest_format = '1'
+
+
+class Manifest(SqliteStore):
+    """Remembers what was done with every replay, so a later run only has to look at new or changed ones.
+
+    Every replay that went through a run is stored with its size, modification time and
+    content hash, the name it was renamed to ('' if the filters rejected it) and the
+    fingerprint of the settings that were used. A replay is done when none of that
+    changed: same fingerprint, same file (a new modification time with the same hash is
+    still the same file) and, if it was renamed, its renamed copy is still there.
+    """
+
+    schema = ('CREATE TABLE IF NOT EXISTS replays (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT, target TEXT, fingerprint TEXT)',)
+    insert = 'INSERT OR REPLACE INTO replays (path, size, mtime, hash, target, fingerprint) VALUES (?, ?, ?, ?, ?, ?)'
+
+    def __init__(self, path, settings):
+        super().__init__(path)
+        self.fingerprint = settings_fingerprint(settings)
+        self.target_dir = settings[defaults._target_dir]
+
+
+    def is_done(self, path, stat):
+        """whether the replay was handled by an earlier run with the same settings, and has not changed since"""
+        with self.lock:
+            row = self.connection.execute('SELECT size, mtime, hash, target, fingerprint FROM replays WHERE path = ?', (cache_key(path),)).fetchone()
+
+        if row is None:
+            return False
+
+        size, mtime, digest, target, fingerprint = row
+        if fingerprint != self.fingerprint or size != stat.st_size:
+            return False
+
+        if target and not os.path.exists(os.path.join(self.target_dir, target)):
+            return False
+
+        if mtime != stat.st_mtime_ns:
+            # touched, copied over or restored from a backup: only the contents tell whether it changed
+            if file_digest(path) != digest:
+                return False
+
+            self.put(path, stat, digest, target)
+
+        return True
+
+
+    def put(self, path, stat, digest, target):
+        """stores what was done with the replay"""
+        self.add((cache_key(path), stat.st_size, stat.st_mtime_ns, digest, target, self.fingerprint))
+
+
+    def put_target(self, target, digest):
+        """stores the renamed copy under its own path too, so a run over the destination folder (an in-place move) does not hash it again"""
+        path = os.path.join(self.target_dir, target)
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+
+        self.put(path, stat, digest, target)
+
+
+    def retarget(self, renames):
+        """moves the renamed copies of replays to their new names, as (path, old target, new target), marking them done with these settings"""
+        self.flush()
+
+        with self.lock, self.connection:
+            self.connection.executemany('UPDATE replays SET target = ?, fingerprint = ? WHERE path = ? AND target = ?',
+                                        [(new, self.fingerprint, cache_key(path), old) for path, old, new in renames])
+
+
+def settings_fingerprint(settings):
+    """hash of every setting that changes which replays are renamed, what they are renamed to, or how"""
+    used = {
+        'format': _manifest_format,
+        defaults._template: settings[defaults._template],
+        defaults._target_dir: os.path.normcase(os.path.abspath(settings[defaults._target_dir])),
+        defaults._player_id: settings[defaults._player_id],
+        defaults._operation: settings[defaults._operation],
+        defaults._excludes: settings[defaults._excludes],
+        defaults._includes: settings[defaults._includes]
+    }
+
+    return hashlib.blake2b(json.dumps(used, sort_keys=True).encode('utf-8'), digest_size=20).hexdigest()
@@ -0,0 +1,133 @@
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+
+logger = logging.getLogger(__name__)
+
+# upper bounds (in milliseconds) of the buckets of the parse latency histogram, the last bucket has no bound
+_latency_buckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Metrics:
+    """Collects where the time of a run went, per stage and per replay.
+
+    Every replay that makes it through the pipeline becomes an event with the time it
+    spent in each stage, whether it was skipped or could not be read, which filter
+    rejected it and what it was renamed to. close() adds a summary with the total time
+    of every stage, a histogram of parse latencies, the rejections per filter, how many
+    replays could not be read and the slowest replays.
+    Events are appended as JSON lines to path (if there is one) and handed to hook
+    (if there is one), so a batch or the tray watcher can be profiled from the outside.
+    The threads of every stage report to the same Metrics, behind one lock.
+    """
+
+    def __init__(self, path='', hook=None, slowest=10):
+        self.path = path
+        self.hook = hook
+        self.slowest_count = slowest
+        self.lock = threading.Lock()
+
+        self.stage_seconds = Counter()
+        self.stage_items = Counter()
+        self.parse_latencies = Counter()
+        self.rejected = Counter()
+        self.failed = 0
+        self.slowest = []
+        self.started = time.time()
+
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+
+
+    def add_time(self, stage, seconds, items=1):
+        with self.lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_items[stage] += items
+
+
+    def replay_done(self, item):
+        """records a replay that went through every stage"""
+        timings = item.get('timings', {})
+        total = sum(timings.values())
+
+        event = {
+            'event': 'replay',
+            'path': item['path'],
+            'seconds': {stage: round(seconds, 6) for stage, seconds in timings.items()},
+            'skipped': item.get('done', False) and not item.get('failed', False),
+            'failed': item.get('failed', False),
+            'parsed': item.get('parsed', False),
+            'rejected_by': item.get('rejected_by'),
+            'renamed_to': item.get('newname') if item.get('passed') else None
+        }
+
+        with self.lock:
+            if item.get('parsed'):
+                self.parse_latencies[bucket(timings.get('parse', 0) * 1000)] += 1
+
+            if item.get('rejected_by'):
+                self.rejected[item['rejected_by']] += 1
+
+            if item.get('failed'):
+                self.failed += 1
+
+            # a min-heap of the slowest replays seen so far
+            entry = (total, item['path'])
+            if len(self.slowest) < self.slowest_count:
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+
+        self.emit(event)
+
+
+    def summary(self):
+        with self.lock:
+            return {
+                'event': 'summary',
+                'seconds': round(time.time() - self.started, 6),
+                'stages': {stage: {'seconds': round(self.stage_seconds[stage], 6), 'items': self.stage_items[stage]} for stage in self.stage_seconds},
+                'parse_latency_ms': {label: self.parse_latencies[label] for label in bucket_labels() if self.parse_latencies[label]},
+                'rejected': dict(self.rejected),
+                'failed': self.failed,
+                'slowest': [{'path': path, 'seconds': round(seconds, 6)} for seconds, path in sorted(self.slowest, reverse=True)]
+            }
+
+
+    def emit(self, event):
+        if self.hook:
+            self.hook(event)
+
+        if self.file:
+            line = json.dumps(event)
+            with self.lock:
+                self.file.write(line + '\n')
+
+
+    def close(self):
+        """emits the summary of the run"""
+        summary = self.summary()
+        self.emit(summary)
+
+        stages = ', '.join(f'{stage} {values["seconds"]:.2f}s' for stage, values in summary['stages'].items())
+        logger.info('run took %.2fs (%s)', summary['seconds'], stages, extra={'metrics': summary})
+
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def bucket(milliseconds):
+    """label of the histogram bucket that a parse latency falls in"""
+    for bound in _latency_buckets:
+        if milliseconds <= bound:
+            return f'<={bound}'
+
+    return f'>{_latency_buckets[-1]}'
+
+
+def bucket_labels():
+    return [f'<={bound}' for bound in _latency_buckets] + [f'>{_latency_buckets[-1]}']
@@ -0,0 +1,196 @@
+import queue
+import threading
+
+
+# marks the end of the items flowing through a stage
+_end = object()
+
+
+class Pipeline:
+    """Runs items through a chain of stages, each one a pool of threads reading from a bounded queue.
+
+    Every item goes through every stage (a stage that has nothing to do with an item just
+    passes it on), and at most in_flight items are inside the pipeline at any time, so
+    memory stays flat no matter how many items there are. A stage marked as ordered gets
+    its items in the order they were fed in, whatever order the stages before it finished
+    them in.
+    """
+
+    def __init__(self, queue_size=64):
+        self.queue_size = queue_size
+        self.stages = []
+        self.error = None
+
+
+    def add_stage(self, name, work, workers=1, ordered=False):
+        """work(item) is called for every item and returns the item that is handed to the next stage"""
+        self.stages.append(Stage(self, name, work, max(1, workers), self.queue_size, ordered))
+
+
+    def run(self, items):
+        """feeds every item through the stages, returns once the last stage is done with all of them"""
+        in_flight = sum(stage.input.maxsize + stage.workers for stage in self.stages)
+        self.window = threading.Semaphore(in_flight)
+
+        for stage, next_stage in zip(self.stages, self.stages[1:] + [None]):
+            stage.start(next_stage)
+
+        count = 0
+        try:
+            for count, item in enumerate(items, start=1):
+                self.wait(lambda timeout: self.window.acquire(timeout=timeout) or None)
+                self.stages[0].put((count - 1, item))
+
+        except BaseException as e:
+            self.error = self.error or e
+
+        # the end marker is numbered after the last item, so ordered stages see it last
+        if self.error is None:
+            self.stages[0].put((count, _end))
+
+        for stage in self.stages:
+            stage.join()
+
+        if self.error is not None:
+            raise self.error
+
+
+    def wait(self, block):
+        """calls block(timeout) until it returns something, giving up if any stage failed"""
+        while True:
+            result = block(0.1)
+            if result is not None:
+                return result
+
+            if self.error is not None:
+                raise _Stopped()
+
+
+    def queue_depths(self):
+        """how many items are waiting in front of each stage right now"""
+        return {stage.name: stage.input.qsize() for stage in self.stages}
+
+
+    def stats(self):
+        """the size of the queue in front of each stage, and how full it got"""
+        return {stage.name: {
+            'workers': stage.workers,
+            'queue_size': stage.input.maxsize,
+            'max_depth': stage.max_depth,
+            'mean_depth': stage.depth_total / stage.depth_samples if stage.depth_samples else 0
+        } for stage in self.stages}
+
+
+class Stage:
+
+    def __init__(self, pipeline, name, work, workers, queue_size, ordered):
+        self.pipeline = pipeline
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.ordered = ordered
+        self.input = queue.Queue(maxsize=queue_size)
+
+        self.lock = threading.Lock()
+        self.running = workers
+        self.threads = []
+
+        # items that arrived early, waiting for their turn in an ordered stage
+        self.waiting = {}
+        self.next_seq = 0
+
+        self.max_depth = 0
+        self.depth_total = 0
+        self.depth_samples = 0
+
+
+    def start(self, next_stage):
+        self.next_stage = next_stage
+        self.threads = [threading.Thread(target=self.loop, name=f'{self.name}-{i}', daemon=True) for i in range(self.workers)]
+
+        for thread in self.threads:
+            thread.start()
+
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+    def put(self, entry):
+        depth = self.input.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        self.depth_total += depth
+        self.depth_samples += 1
+
+        self.pipeline.wait(lambda timeout: _put(self.input, entry, timeout))
+
+
+    def get(self):
+        if not self.ordered:
+            return self.pipeline.wait(lambda timeout: _get(self.input, timeout))
+
+        with self.lock:
+            while self.next_seq not in self.waiting:
+                seq, item = self.pipeline.wait(lambda timeout: _get(self.input, timeout))
+                self.waiting[seq] = item
+
+            # the end marker is left in place for the other workers of this stage
+            item = self.waiting[self.next_seq]
+            if item is _end:
+                return self.next_seq, item
+
+            del self.waiting[self.next_seq]
+            self.next_seq += 1
+            return self.next_seq - 1, item
+
+
+    def loop(self):
+        try:
+            while True:
+                seq, item = self.get()
+
+                if item is _end:
+                    # let the other workers of this stage see the end as well
+                    if not self.ordered:
+                        self.input.put((seq, item))
+                    break
+
+                item = self.work(item)
+
+                if self.next_stage:
+                    self.next_stage.put((seq, item))
+                else:
+                    self.pipeline.window.release()
+
+            with self.lock:
+                self.running -= 1
+                last_worker = self.running == 0
+
+            if last_worker and self.next_stage:
+                self.next_stage.put((seq, _end))
+
+        except _Stopped:
+            pass
+
+        except BaseException as e:
+            self.pipeline.error = self.pipeline.error or e
+
+
+class _Stopped(Exception):
+    """raised in the threads that were waiting when another stage failed"""
+
+
+def _get(q, timeout):
+    try:
+        return q.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+def _put(q, entry, timeout):
+    try:
+        q.put(entry, timeout=timeout)
+        return True
+    except queue.Full:
+        return None
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+
+from src.batch.SqliteStore import SqliteStore
+from src.structures.record import ReplayRecord
+
+
+# bump this whenever the layout of the records changes
+_record_format = '2'
+
+
+class ReplayCache(SqliteStore):
+    """Keeps the records of parsed replays on disk, so that unchanged files are never parsed twice.
+
+    Records are keyed by the path of the replay and are only used while its size and
+    modification time still match. The whole cache is dropped when the sc2reader version
+    (or the record format, or the Python version, since records are stored as marshal
+    bytes) changes, and the least recently used records are evicted once there are more
+    than max_entries of them.
+    """
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+        'CREATE TABLE IF NOT EXISTS records (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, last_used REAL, data BLOB)',
+        'CREATE INDEX IF NOT EXISTS records_last_used ON records (last_used)'
+    )
+    insert = 'INSERT OR REPLACE INTO records (path, size, mtime, last_used, data) VALUES (?, ?, ?, ?, ?)'
+    touch = 'UPDATE records SET last_used = ? WHERE path = ?'
+    evict = 'DELETE FROM records WHERE path IN (SELECT path FROM records ORDER BY last_used DESC LIMIT -1 OFFSET ?)'
+
+    def __init__(self, path, max_entries):
+        super().__init__(path, max_entries)
+        self.check_version(f'{sc2reader_version()}/{_record_format}/{sys.version_info[0]}.{sys.version_info[1]}')
+
+
+    def check_version(self, version):
+        """drops every record if they were made by another version of sc2reader"""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+
+        if row is None or row[0] != version:
+            with self.connection:
+                self.connection.execute('DELETE FROM records')
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+
+
+    def get(self, path, stat):
+        """returns the record of path if the file has not changed since it was cached, None otherwise"""
+        with self.lock:
+            row = self.connection.execute('SELECT size, mtime, data FROM records WHERE path = ?', (cache_key(path),)).fetchone()
+
+            if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+                return None
+
+            self.use(cache_key(path))
+
+        return ReplayRecord.loads(row[2], path)
+
+
+    def put(self, path, stat, record):
+        """stores the record of path"""
+        self.add((cache_key(path), stat.st_size, stat.st_mtime_ns, time.time(), record.dumps()))
+
+
+def cache_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def sc2reader_version():
+    """version of the installed sc2reader, read from the package metadata so sc2reader does not have to be imported"""
+    try:
+        from importlib.metadata import version
+        return version('sc2reader')
+
+    except Exception:
+        import sc2reader
+        return getattr(sc2reader, '__version__', 'unknown')
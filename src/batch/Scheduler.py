@@ -0,0 +1,122 @@
+import heapq
+import itertools
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+# the replays the watcher just saw, the newest replays of a run, and the rest of it
+LIVE, RECENT, BACKLOG = 0, 1, 2
+
+_chunk_size = 250
+
+
+class Scheduler:
+    """Runs the renaming jobs of the watcher and of batch runs one at a time in its own thread, the most urgent first.
+
+    A job is queued with a priority (LIVE, RECENT or BACKLOG) and runs once no job with a
+    more urgent priority is waiting, jobs with the same priority running in the order they
+    came in. A job is not interrupted once it started, so a batch run is queued as chunks
+    of its replays (see chunks()): a replay the watcher hands over only waits for the
+    chunk that is running, not for the whole backlog. submit() returns a Future of the
+    result of the job.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = None
+
+
+    def start(self):
+        self.stopping = False
+        self.thread = threading.Thread(target=self.loop, name='scheduler', daemon=True)
+        self.thread.start()
+
+
+    def stop(self, cancel=False):
+        """stops once the queued jobs are done, or once the running one is if the others are cancelled"""
+        with self.condition:
+            if cancel:
+                for _, _, future, _, _ in self.heap:
+                    future.cancel()
+                self.heap.clear()
+
+            self.stopping = True
+            self.condition.notify()
+
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+
+    def submit(self, priority, work, *args):
+        future = Future()
+
+        with self.condition:
+            heapq.heappush(self.heap, (priority, next(self.order), future, work, args))
+            self.condition.notify()
+
+        return future
+
+
+    def pending(self):
+        """how many jobs of each priority are waiting"""
+        with self.condition:
+            return Counter(priority for priority, _, _, _, _ in self.heap)
+
+
+    def loop(self):
+        while True:
+            with self.condition:
+                while not self.heap and not self.stopping:
+                    self.condition.wait()
+
+                if not self.heap:
+                    return
+
+                _, _, future, work, args = heapq.heappop(self.heap)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(work(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+
+def chunks(paths, chunk_size=_chunk_size):
+    """splits the replays of a run (newest first) into (priority, paths) jobs, the newest chunk being RECENT"""
+    # an empty run still gets its one job, which finishes what an interrupted run left in the journal
+    return [(RECENT if start == 0 else BACKLOG, paths[start:start + chunk_size]) for start in range(0, max(len(paths), 1), chunk_size)]
+
+
+def rename_chunk(renamer, paths, incremental=True):
+    """renames a chunk of a run with the renamer, returning its summary"""
+    renamer.rename_files(paths, incremental=incremental)
+    return renamer.summary()
+
+
+def merge(summaries):
+    """the summary of a run from the summaries of its chunks"""
+    total = {
+        'dry_run': any(summary['dry_run'] for summary in summaries),
+        'rejected': {stage: sum(summary['rejected'][stage] for summary in summaries) for stage in ('header', 'full')},
+        'rules': sum((Counter(dict(summary['rules'])) for summary in summaries), Counter()).most_common(),
+        'stages': {},
+        'plan': [rename for summary in summaries for rename in summary['plan']]
+    }
+
+    for key in ('renamed', 'collisions', 'skipped', 'duplicates', 'resumed', 'failed', 'bytes_copied', 'bytes_avoided'):
+        total[key] = sum(summary[key] for summary in summaries)
+
+    # how full the queues got over the whole run
+    for summary in summaries:
+        for stage, stats in summary['stages'].items():
+            merged = total['stages'].setdefault(stage, {**stats, 'mean_depth': 0})
+            merged['max_depth'] = max(merged['max_depth'], stats['max_depth'])
+            merged['mean_depth'] += stats['mean_depth'] / len(summaries)
+
+    return total
@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+import time
+
+
+# rows that are written to disk in one transaction
+_batch_size = 500
+
+
+class SqliteStore:
+    """Base of the sqlite files that runs keep next to the settings (cache, manifest, dedup index, library).
+
+    A subclass gives its table in schema and the statement that stores a row in insert.
+    Rows handed to add() are kept in memory and written _batch_size at a time, so a run
+    does not pay a transaction per replay. A store that evicts the least recently used
+    rows also gives touch (which sets last_used of the rows that use() marked) and evict
+    (which drops all but max_entries rows on close). One lock guards the connection and
+    the pending rows, so a store can be shared between threads.
+    """
+
+    schema = ()
+    insert = ''
+    touch = ''
+    evict = ''
+
+    def __init__(self, path, max_entries=0):
+        self.max_entries = max_entries
+        self.pending = []
+        self.used = set()
+        self.lock = threading.RLock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        for statement in self.schema:
+            self.connection.execute(statement)
+
+
+    def add(self, row):
+        with self.lock:
+            self.pending.append(row)
+
+            if len(self.pending) >= _batch_size:
+                self.flush()
+
+
+    def use(self, key):
+        with self.lock:
+            self.used.add(key)
+
+
+    def flush(self):
+        now = time.time()
+
+        with self.lock, self.connection:
+            self.connection.executemany(self.insert, self.pending)
+            if self.touch:
+                self.connection.executemany(self.touch, [(now, key) for key in self.used])
+
+            self.pending = []
+            self.used = set()
+
+
+    def close(self):
+        """writes everything that is pending, evicting the least recently used rows if the store does"""
+        self.flush()
+
+        if self.evict:
+            with self.lock, self.connection:
+                self.connection.execute(self.evict, (self.max_entries,))
+
+        self.connection.close()
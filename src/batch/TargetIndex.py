@@ -0,0 +1,98 @@
+import os
+
+from src.batch.hashing import file_digest
+
+
+class TargetIndex:
+    """The names taken in the destination folder, so that no two replays are renamed to the same file.
+
+    A name is taken when another replay of this run was planned under it, or when a file
+    with that name is already in the destination folder. Taken names get a deterministic
+    suffix ('name (2).SC2Replay', 'name (3).SC2Replay', ...) in the order the replays are
+    planned, unless the file under the name has the same contents as the replay, in which
+    case there is nothing left to do for it. Names may lie in subfolders of the destination
+    (see CompiledTemplate). With list_existing every folder is listed once, the first time
+    a name in it is claimed, otherwise every name is checked on disk (for single replays).
+
+    The names in leaving belong to replays of the destination that the run moves away (see
+    retemplate_destination), so they are free for the other replays, even when replays
+    trade names. BatchRenamer.execute moves a replay only once its name was vacated.
+    """
+
+    def __init__(self, target_dir, list_existing=True, leaving=()):
+        self.target_dir = target_dir
+        self.planned = {}
+        self.collisions = 0
+        self.existing = {} if list_existing else None
+        self.leaving = {os.path.normcase(name) for name in leaving}
+
+
+    def claim(self, newname, path, digest):
+        """the free name that the replay at path gets, None if an identical replay already has its name"""
+        stem, extension = os.path.splitext(newname)
+        candidate = newname
+        number = 1
+        # relpath cannot relate a replay on another drive, which does not leave the destination anyway
+        own = os.path.normcase(os.path.relpath(path, self.target_dir)) if self.leaving else None
+
+        while True:
+            key = os.path.normcase(candidate)
+
+            if key in self.planned:
+                if self.planned[key] == digest:
+                    # the replay stays where it is after all
+                    self.leaving.discard(own)
+                    return None
+
+            elif self.exists(key) and (key == own or key not in self.leaving):
+                if self.same_contents(candidate, path, digest):
+                    self.planned[key] = digest
+                    self.leaving.discard(own)
+                    return None
+
+            else:
+                self.planned[key] = digest
+                if number > 1:
+                    self.collisions += 1
+                return candidate
+
+            number += 1
+            candidate = f'{stem} ({number}){extension}'
+
+
+    def exists(self, key):
+        if self.existing is None:
+            return os.path.exists(os.path.join(self.target_dir, key))
+
+        folder, name = os.path.split(key)
+        if folder not in self.existing:
+            self.existing[folder] = list_folder(os.path.join(self.target_dir, folder))
+
+        return name in self.existing[folder]
+
+
+    def same_contents(self, name, path, digest):
+        """whether the file already under name in the destination folder is the replay itself"""
+        existing = os.path.join(self.target_dir, name)
+
+        try:
+            if os.path.samefile(existing, path):
+                return True
+
+            if os.path.getsize(existing) != os.path.getsize(path):
+                return False
+
+        except OSError:
+            return False
+
+        return file_digest(existing) == digest
+
+
+def list_folder(folder):
+    """the names in the folder, normcased, none if it does not exist (yet)"""
+    try:
+        with os.scandir(folder) as entries:
+            return {os.path.normcase(entry.name) for entry in entries}
+
+    except OSError:
+        return set()
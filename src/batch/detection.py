@@ -0,0 +1,82 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from src.batch.scanner import newest_first, scan_replays
+
+
+# control value of human players in replay.details
+_human = 2
+
+
+def detect_players(source_path, excludes=[], sample=150, workers=1, pool=None):
+    """returns the (name, toon_id) of the players in the newest replays, the most frequent one first
+
+    Only the replay details (load_level=1) are read, newest replays first, and the
+    sampling stops as soon as one player is clearly in most of them. With more than one
+    worker the replays are read by a pool of processes, a batch at a time. A pool that
+    is passed in (with that many workers) is used instead of starting one.
+    """
+    paths = [path for path, _ in islice(newest_first(scan_replays(source_path, excludes)), sample)]
+
+    counts = Counter()
+    names = {}
+    parsed = 0
+
+    batch_size = workers * 4 if workers > 1 else 1
+    own_pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and pool is None else None
+    pool = pool or own_pool
+
+    try:
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start:start + batch_size]
+            found = pool.map(read_players, batch) if pool else map(read_players, batch)
+
+            for players in found:
+                parsed += 1
+                for name, toon_id in players:
+                    counts[toon_id] += 1
+
+                    # the newest name is kept, since the replays are read newest first
+                    names.setdefault(toon_id, name)
+
+            if is_dominant(counts, parsed):
+                break
+
+    finally:
+        if own_pool:
+            own_pool.shutdown()
+
+    return [(names[toon_id], toon_id) for toon_id, _ in counts.most_common()]
+
+
+def read_players(path):
+    """(name, toon_id) of every human player, straight from the replay details"""
+    import sc2reader
+
+    replay = sc2reader.load_replay(path, load_level=1, load_maps=False)
+    players = replay.raw_data['replay.details']['players']
+
+    return [(player_name(player), player['bnet']['uid']) for player in players if player['control'] == _human]
+
+
+def player_name(player):
+    """the name in the details, without the clan tag in front of it"""
+    name = player['name']
+    if isinstance(name, bytes):
+        name = name.decode('utf-8', 'replace')
+
+    return name.split('<sp/>')[-1]
+
+
+def is_dominant(counts, parsed, min_replays=10):
+    """whether one player shows up in so many replays that reading more would not change who comes first"""
+    if parsed < min_replays or not counts:
+        return False
+
+    top = counts.most_common(2)
+    leader = top[0][1]
+    runner_up = top[1][1] if len(top) > 1 else 0
+
+    # in more than half of the replays, and at least three times as often as anyone else
+    return leader > parsed / 2 and leader >= 3 * runner_up
@@ -0,0 +1,109 @@
+import errno
+import os
+import shutil
+import sys
+
+import src.structures.defaults as defaults
+
+
+# Every operation returns (bytes copied, bytes that did not have to be copied), so that a
+# run can report how much data it actually moved around.
+
+def copy_file(src, dst):
+    """a copy (with its modification time) that only shows up under dst once it is complete, so a crash cannot leave half a replay there"""
+    replace_with(dst, lambda tmp: shutil.copy2(src, tmp))
+    return os.path.getsize(dst), 0
+
+
+def move_file(src, dst):
+    """a plain rename when both are on the same volume, a copy and delete otherwise"""
+    size = os.path.getsize(src)
+
+    if same_volume(src, dst):
+        os.replace(src, dst)
+        return 0, size
+
+    copy_file(src, dst)
+    os.remove(src)
+    return size, 0
+
+
+def hardlink_file(src, dst):
+    """a second name for the same data, copying it if the volume does not support hard links"""
+    try:
+        replace_with(dst, lambda tmp: os.link(src, tmp))
+        return 0, os.path.getsize(src)
+
+    except OSError as e:
+        if not is_unsupported(e):
+            raise
+
+    return copy_file(src, dst)
+
+
+def reflink_file(src, dst):
+    """a copy-on-write clone (Btrfs, XFS, APFS), copying the data if the file system cannot clone"""
+    try:
+        replace_with(dst, lambda tmp: clone(src, tmp))
+        return 0, os.path.getsize(src)
+
+    except OSError as e:
+        if not is_unsupported(e):
+            raise
+
+    return copy_file(src, dst)
+
+
+def clone(src, dst):
+    if sys.platform.startswith('linux'):
+        import fcntl
+
+        # FICLONE from linux/fs.h
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            try:
+                fcntl.ioctl(target.fileno(), 0x40049409, source.fileno())
+            except OSError:
+                target.close()
+                os.remove(dst)
+                raise
+
+    elif sys.platform == 'darwin':
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), dst)
+
+    else:
+        raise OSError(errno.EOPNOTSUPP, 'Cloning files is not supported on this platform', dst)
+
+
+def replace_with(dst, create):
+    """create(tmp) makes a new file next to dst, which then takes the place of dst like a copy would"""
+    tmp = dst + '.renaming'
+    create(tmp)
+
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        os.remove(tmp)
+        raise
+
+
+def same_volume(src, dst):
+    return os.stat(src).st_dev == os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+
+
+def is_unsupported(e):
+    """whether the error means the file system cannot link or clone, instead of something actually being wrong"""
+    unsupported = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOTTY, errno.EMLINK}
+    return e.errno in unsupported or getattr(e, 'winerror', None) in (1, 17, 50)
+
+
+operations = {
+    defaults._copy: copy_file,
+    defaults._move: move_file,
+    defaults._hardlink: hardlink_file,
+    defaults._reflink: reflink_file
+}
@@ -0,0 +1,16 @@
+import hashlib
+
+
+# replays are read in chunks, so hashing a big one does not load it into memory at once
+_chunk_size = 1024 * 1024
+
+
+def file_digest(path):
+    """blake2b hash of the contents of a file, as hex"""
+    digest = hashlib.blake2b(digest_size=20)
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(_chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
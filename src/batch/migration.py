@@ -0,0 +1,102 @@
+import os
+
+import src.structures.defaults as defaults
+from src.batch.BatchRenamer import BatchRenamer
+from src.batch.DedupIndex import DedupIndex
+from src.batch.FilterEngine import FilterEngine
+from src.batch.Library import Library
+from src.batch.Manifest import Manifest
+from src.batch.scanner import scan_replays
+
+
+def migrate_destination(settings, dry_run=False, pool=None):
+    """moves the replays lying directly in the destination folder to their names under the template, returns the renamer that did it
+
+    This is how a flat destination folder is brought into the folders of a sharded
+    template ('$year/$month/...') in one batch. The replays are renamed like in any other
+    run, with the destination folder as the replay folder and move as the file operation,
+    which is a plain rename on the same volume. Replays that the filters reject stay where
+    they are. The next run of the replay folder finds its replays already there under
+    their new names, and does not copy them again. Since the replays are parsed, this also
+    puts a destination that was renamed before the library existed into the library.
+    """
+    target_dir = settings[defaults._target_dir]
+
+    renamer = BatchRenamer(destination_settings(settings), pool=pool)
+    renamer.rename_files([path for path, _ in scan_replays(target_dir, recursive=False)], incremental=False, dry_run=dry_run)
+    return renamer
+
+
+def retemplate_destination(settings, dry_run=False, pool=None):
+    """renames every replay of the destination folder under the template of the settings, from the library alone, returns the renamer that did it
+
+    The replays in the Library are moved to their names under the new template with the
+    records and hashes stored there, so not a single one of them is parsed or hashed.
+    Replays that are not in the library (see migrate_destination) or that the filters
+    reject stay where they are. A replay may take the name of another one that is moved,
+    even when they trade names (see TargetIndex). Afterwards the manifest and the dedup
+    index point at the new names, so the next run of the replay folder skips every replay
+    that was moved, and the folders of the old template that were left empty are removed.
+    """
+    target_dir = settings[defaults._target_dir]
+
+    library = Library(defaults.library_file, target_dir)
+    items = [{'path': os.path.join(target_dir, name), 'digest': digest, 'record': record, 'name': name, 'filename': record.filename} for name, digest, record in library.records()]
+    library.close()
+
+    # every replay the filters let through is moved, so its name is free for another one (see TargetIndex)
+    layout = destination_settings(settings)
+    filters = FilterEngine(layout)
+    leaving = [item['name'] for item in items if filters.check(item['record']) is None]
+
+    renamer = BatchRenamer(layout, pool=pool)
+    renamer.rename_items(items, incremental=False, dry_run=dry_run, leaving=leaving)
+
+    if not dry_run:
+        moved = [item for item in renamer.plan if item['copy']]
+        remember_moves(settings, moved)
+        remove_empty_folders(target_dir, [item['name'] for item in moved])
+
+        library = Library(defaults.library_file, target_dir)
+        library.prune()
+        library.close()
+
+    return renamer
+
+
+def remember_moves(settings, items):
+    """points what the manifest and the dedup index know of the replays at their new names in the destination"""
+    manifest = Manifest(defaults.manifest_file, settings)
+    manifest.retarget([(item['filename'], item['name'], item['newname']) for item in items])
+    manifest.close()
+
+    dedup_size = int(defaults.performance_settings(settings)[defaults._dedup_size])
+    if dedup_size > 0:
+        dedup = DedupIndex(defaults.dedup_file, dedup_size, manifest.fingerprint, target_dir=settings[defaults._target_dir])
+        for item in items:
+            dedup.put(item['digest'], item['newname'])
+        dedup.close()
+
+
+def remove_empty_folders(target_dir, names):
+    """removes the subfolders of the destination that the names were in, and their parents, if nothing is left in them"""
+    folders = set()
+    for name in names:
+        folder = os.path.dirname(name)
+        while folder:
+            folders.add(folder)
+            folder = os.path.dirname(folder)
+
+    # the deepest first, so a parent is empty by the time it is tried
+    for folder in sorted(folders, key=len, reverse=True):
+        try:
+            os.rmdir(os.path.join(target_dir, folder))
+        except OSError:
+            pass
+
+
+def destination_settings(settings):
+    """the settings that rename the replays of the destination folder in place, without the dedup index"""
+    layout = {**settings, defaults._source_dir: settings[defaults._target_dir], defaults._operation: defaults._move}
+    layout[defaults._performance] = {**defaults.performance_settings(settings), defaults._dedup_size: 0}
+    return layout
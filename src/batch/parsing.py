@@ -0,0 +1,44 @@
+from src.structures.record import extract_header, extract_record
+
+
+# sc2reader takes a while to import, so it is only imported once a replay actually has to be parsed
+
+def load_staged(path, filters):
+    """parses a replay in two stages, only loading the players if the details pass the header filters
+
+    Replays rejected by the header filters come back as a header record (load_level 1),
+    everything else comes back as a full record (load_level 2).
+    """
+    import sc2reader
+
+    replay = sc2reader.load_replay(path, load_level=1, load_maps=False)
+    header = extract_header(replay)
+
+    if not filters.passes_header(header):
+        return header
+
+    replay = load_players(replay)
+    return extract_record(replay)
+
+
+def load_players(replay):
+    """brings a replay loaded with load_level=1 up to load_level=2 without reading the archive again
+
+    This repeats what sc2reader's Replay.__init__ does for load_level=2, and falls back
+    to a fresh parse if this version of sc2reader does it differently.
+    """
+    try:
+        replay._read_data('replay.message.events', replay._get_reader('replay.message.events'))
+        replay.load_message_events()
+        replay.load_players()
+        replay.load_level = 2
+        return replay
+
+    except AttributeError:
+        import sc2reader
+        return sc2reader.load_replay(replay.filename, load_level=2, load_maps=False)
+
+
+def is_complete(record, filters):
+    """whether the record holds everything needed to decide on the replay with these filters"""
+    return record.load_level >= 2 or not filters.passes_header(record)
@@ -0,0 +1,36 @@
+import os
+
+
+def scan_replays(source_path, excludes=[], skip=[], recursive=True):
+    """yields (path, stat) of every replay under source_path, as soon as its folder is listed
+
+    Subfolders are followed to any depth, unless recursive is False. Folders named in excludes, and the folders in
+    skip (like a destination folder inside the replay folder), are pruned before they
+    are entered. The stat comes from the directory listing where the OS provides it, so
+    replays are not stat'ed a second time. The replays come out in the order of the
+    listing, see newest_first for the callers that need the newest ones first.
+    """
+    skipped = {os.path.normcase(os.path.abspath(path)) for path in skip if path}
+    directories = [source_path]
+
+    # a plain stack instead of recursion, which keeps the generator overhead out of deep trees
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except OSError:
+            # folders that disappear or cannot be read are left out, like os.walk does
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if recursive and entry.name not in excludes and os.path.normcase(os.path.abspath(entry.path)) not in skipped:
+                        directories.append(entry.path)
+
+                elif entry.name.lower().endswith('.sc2replay') and entry.is_file():
+                    yield entry.path, entry.stat()
+
+
+def newest_first(replays):
+    """the (path, stat) of the replays sorted by their modification time, the newest first, which has to list all of them first"""
+    return sorted(replays, key=lambda replay: replay[1].st_mtime_ns, reverse=True)
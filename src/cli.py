@@ -0,0 +1,266 @@
+"""Renames replays from the command line, without loading the GUI
+
+    python run.py --source <replay folder> --target <destination folder> [options]
+
+Anything that is not given on the command line is taken from the settings file.
+
+    python run.py --migrate         moves the replays in the destination folder into the subfolders of the template
+    python run.py --retemplate      renames the destination folder under a new template, without parsing it again
+
+    python run.py --serve           keeps a renamer daemon running in the background
+    python run.py --daemon [...]    hands the rename to that daemon instead of running it here
+    python run.py --status          shows what the daemon is doing
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+import src.structures.defaults as defaults
+import src.structures.stringmatch as stringmatch
+
+
+def load_settings(path):
+    """settings from the settings file, with the defaults filling in whatever is missing"""
+    settings = copy.deepcopy(defaults.settings)
+
+    if os.path.isfile(path):
+        with open(path, 'r') as file:
+            saved = json.load(file)
+
+        for key, value in saved.items():
+            if isinstance(value, dict) and isinstance(settings.get(key), dict):
+                settings[key].update(value)
+            else:
+                settings[key] = value
+
+    return settings
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='run.py', description='Renames SC2 replays without opening the window. Options that are left out are taken from the settings file.')
+    parser.add_argument('--settings', default=defaults.settings_file, help='settings file to start from (default: %(default)s)')
+    parser.add_argument('--template', help='rename template, e.g. "$map $uniqueID"')
+    parser.add_argument('--source', help='replay folder')
+    parser.add_argument('--target', help='destination folder')
+    parser.add_argument('--player-id', help='your player id, needed by the id variables')
+    parser.add_argument('--operation', choices=[defaults._copy, defaults._move, defaults._hardlink, defaults._reflink])
+    parser.add_argument('--workers', type=int, help='processes used to parse replays, 0 uses every core')
+    parser.add_argument('--dry-run', action='store_true', help='only show what every replay would be renamed to, without touching any file')
+    parser.add_argument('--full', action='store_true', help='go through every replay again, including the ones earlier runs already did')
+    parser.add_argument('--force', action='store_true', help='rename even if the template may give different replays the same name')
+    parser.add_argument('--metrics', help='JSON lines file to append the timings of every replay and a summary of the run to')
+    parser.add_argument('--stats', action='store_true', help='show how busy each stage of the renamer was and how many replays each filter rejected')
+    parser.add_argument('--detect', action='store_true', help='list the players of the newest replays in the source folder, the most frequent one first')
+    parser.add_argument('--retemplate', action='store_true', help='rename the replays in the destination folder under the template from what was stored when they were renamed, without parsing them')
+    parser.add_argument('--migrate', action='store_true', help='move the replays lying directly in the destination folder to their names under the template, like "$year/$month/$map $uniqueID"')
+
+    daemon = parser.add_argument_group('daemon')
+    daemon.add_argument('--serve', action='store_true', help='run a renamer daemon that keeps everything loaded and takes jobs from other runs')
+    daemon.add_argument('--daemon', action='store_true', help='hand the job to the running daemon instead of doing it here')
+    daemon.add_argument('--status', action='store_true', help='show what the running daemon is doing')
+    daemon.add_argument('--stop-daemon', action='store_true', help='stop the running daemon once its jobs are done')
+
+    excludes = parser.add_argument_group('exclusions')
+    excludes.add_argument('--exclude-ai', dest='exclude_ai', action='store_true', default=None)
+    excludes.add_argument('--include-ai', dest='exclude_ai', action='store_false')
+    excludes.add_argument('--exclude-custom', dest='exclude_custom', action='store_true', default=None)
+    excludes.add_argument('--include-custom', dest='exclude_custom', action='store_false')
+    excludes.add_argument('--exclude-matchups', help='matchups to leave alone, separated by commas')
+    excludes.add_argument('--exclude-dirs', help='subfolders to leave alone, separated by commas')
+
+    includes = parser.add_argument_group('inclusions')
+    includes.add_argument('--include-matchups', help='only rename these matchups, separated by commas')
+    includes.add_argument('--min-players', type=int)
+    includes.add_argument('--max-players', type=int)
+    includes.add_argument('--expansions', help='expansions to rename, separated by commas (WoL, HotS, LotV)')
+
+    return parser.parse_args(argv)
+
+
+def apply_args(settings, args):
+    """overrides the settings with everything that was given on the command line"""
+    overrides = [
+        (settings, defaults._template, args.template),
+        (settings, defaults._source_dir, args.source),
+        (settings, defaults._target_dir, args.target),
+        (settings, defaults._player_id, args.player_id),
+        (settings, defaults._operation, args.operation),
+        (settings[defaults._performance], defaults._parse_workers, args.workers),
+        (settings[defaults._performance], defaults._metrics_file, args.metrics),
+        (settings[defaults._excludes], defaults._ai, args.exclude_ai),
+        (settings[defaults._excludes], defaults._custom, args.exclude_custom),
+        (settings[defaults._excludes], defaults._exclude_matchups, args.exclude_matchups),
+        (settings[defaults._excludes], defaults._exclude_dirs, args.exclude_dirs),
+        (settings[defaults._includes], defaults._include_matchups, args.include_matchups),
+        (settings[defaults._includes], defaults._min_players, args.min_players),
+        (settings[defaults._includes], defaults._max_players, args.max_players)
+    ]
+
+    for section, key, value in overrides:
+        if value is not None:
+            section[key] = str(value) if key in (defaults._min_players, defaults._max_players) else value
+
+    if args.expansions is not None:
+        expansions = [expansion.lower() for expansion in stringmatch.split_string(args.expansions)]
+        for expansion in (defaults._wol, defaults._hots, defaults._lotv):
+            settings[defaults._includes][expansion] = expansion.lower() in expansions
+
+    return settings
+
+
+def check_settings(settings, force=False, destination_only=False):
+    """returns what is wrong with the settings, or None if the renamer can run
+
+    With destination_only (--migrate, --retemplate), the replays folder is not looked at,
+    since only the destination folder is renamed.
+    """
+    if stringmatch.template_contains_id_vars(settings[defaults._template]) and not settings[defaults._player_id]:
+        return 'Your template requires a player id (--player-id)'
+
+    if not destination_only and not os.path.isdir(settings[defaults._source_dir]):
+        return 'Your replays folder is invalid!'
+
+    if not os.path.isdir(settings[defaults._target_dir]):
+        return 'Your destination folder does not exist!'
+
+    if stringmatch.may_contain_duplicates(settings[defaults._template]) and not force:
+        return 'Your template may give different replays the same name, and those will be numbered (name (2), name (3), ...). Add $uniqueID to it, or pass --force'
+
+    return None
+
+
+def main(argv):
+    args = parse_args(argv)
+
+    if args.serve or args.status or args.stop_daemon:
+        return daemon_command(args)
+
+    settings = apply_args(load_settings(args.settings), args)
+
+    if args.detect:
+        return detect(settings, args.daemon)
+
+    problem = check_settings(settings, force=args.force, destination_only=args.migrate or args.retemplate)
+    if problem:
+        print(problem, file=sys.stderr)
+        return 1
+
+    start_time = time.time()
+
+    if args.migrate or args.retemplate:
+        from src.batch.migration import migrate_destination, retemplate_destination
+
+        summary = (retemplate_destination if args.retemplate else migrate_destination)(settings, args.dry_run).summary()
+
+    elif args.daemon:
+        from src.daemon.client import request
+
+        answer = request({'job': 'batch', 'settings': settings, 'incremental': not args.full, 'dry_run': args.dry_run, 'wait': True})
+        if 'error' in answer:
+            print(answer['error'], file=sys.stderr)
+            return 1
+
+        summary = answer['result']
+
+    else:
+        # the renamer and everything it pulls in is only imported once the settings are known to be good
+        from src.batch.BatchRenamer import BatchRenamer
+
+        renamer = BatchRenamer(settings)
+        renamer.run(incremental=not args.full, dry_run=args.dry_run)
+        summary = renamer.summary()
+
+    print_summary(summary, settings, time.time() - start_time, args.stats)
+    return 0
+
+
+def print_summary(summary, settings, seconds, stats):
+    for path, newname, copy in summary['plan']:
+        print(f'{path} -> {os.path.join(settings[defaults._target_dir], newname)}{"" if copy else " (already there)"}')
+
+    print(f'{"Would rename" if summary["dry_run"] else "Renamed"} {summary["renamed"]} replays in {seconds:.1f} seconds, {summary["collisions"]} of them under a numbered name because theirs was taken')
+
+    if summary['resumed']:
+        print(f'Redid {summary["resumed"]} file operations that an interrupted run left unfinished')
+
+    if summary['failed']:
+        print(f'Could not read {summary["failed"]} replays, they were left where they are')
+
+    print(f'Skipped {summary["skipped"]} replays that were already done, {summary["duplicates"]} of them copies of replays renamed before')
+    print(f'Filtered out {summary["rejected"]["header"]} replays before parsing their players, and {summary["rejected"]["full"]} after')
+    print(f'Copied {stringmatch.format_size(summary["bytes_copied"])}, avoided copying {stringmatch.format_size(summary["bytes_avoided"])}')
+
+    if stats:
+        for stage, stage_stats in summary['stages'].items():
+            print(f'{stage:<8} workers {stage_stats["workers"]:<4} queue {stage_stats["max_depth"]}/{stage_stats["queue_size"]} at most, {stage_stats["mean_depth"]:.1f} on average')
+
+        for rule, count in summary['rules']:
+            print(f'{rule:<17} rejected {count} replays')
+
+
+def detect(settings, use_daemon):
+    """prints the players of the newest replays, the most frequent one first"""
+    source = settings[defaults._source_dir]
+    excludes = stringmatch.split_string(settings[defaults._excludes][defaults._exclude_dirs])
+
+    if not os.path.isdir(source):
+        print('Your replays folder is invalid!', file=sys.stderr)
+        return 1
+
+    if use_daemon:
+        from src.daemon.client import request
+        answer = request({'job': 'detect', 'source': source, 'excludes': excludes, 'wait': True})
+
+        if 'error' in answer:
+            print(answer['error'], file=sys.stderr)
+            return 1
+
+        players = answer['result']
+
+    else:
+        from src.batch.detection import detect_players
+        players = detect_players(source, excludes)
+
+    for name, toon_id in players:
+        print(f'{toon_id:<12} {name}')
+
+    return 0
+
+
+def daemon_command(args):
+    """starts the daemon, or asks the running one for its status or to stop"""
+    from src.daemon.client import is_running, request
+
+    if args.serve:
+        from src.daemon.RenamerDaemon import RenamerDaemon
+
+        workers = args.workers if args.workers is not None else load_settings(args.settings)[defaults._performance][defaults._parse_workers]
+        RenamerDaemon(workers=int(workers)).serve_forever()
+        return 0
+
+    if not is_running():
+        print('The renamer daemon is not running', file=sys.stderr)
+        return 1
+
+    if args.stop_daemon:
+        request({'job': 'shutdown'})
+        print('The renamer daemon stops once its jobs are done')
+        return 0
+
+    status = request({'job': 'status'})
+    running = status['running']
+
+    print(f'Up for {status["uptime"]:.0f} seconds with {status["workers"]} parse workers, {status["queued"]} jobs queued')
+    print(f'Running: job {running["id"]} ({running["job"]}) for {time.time() - running["started"]:.1f} seconds' if running else 'Running: nothing')
+
+    for job in status['finished']:
+        print(f'Finished: job {job["id"]} ({job["job"]}) in {job["finished"] - job["started"]:.1f} seconds')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,276 @@
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import src.structures.defaults as defaults
+from src.batch.BatchRenamer import BatchRenamer
+from src.batch.detection import detect_players
+from src.batch.scanner import newest_first
+from src.batch.Scheduler import BACKLOG, LIVE, RECENT, Scheduler, chunks, merge, rename_chunk
+from src.daemon.client import address, is_running
+
+
+logger = logging.getLogger(__name__)
+
+
+class RenamerDaemon:
+    """Keeps the renamer loaded in the background and runs the jobs its clients send it.
+
+    The daemon listens on a Unix socket (a named pipe on Windows), and a client has to
+    know the key in daemon_key_file to talk to it. Every request is a dict with a 'job':
+
+        batch        renames a folder, {'settings', 'incremental', 'dry_run'}
+        rename_file  renames a single replay, {'settings', 'path'}
+        detect       finds the players of a folder, {'source', 'excludes'}
+        status       what the daemon is working on, answered right away
+        shutdown     stops the daemon once the jobs it already has are done
+
+    Jobs from every client go through one Scheduler and run one after the other on a
+    single pool of parse processes, which is started (with sc2reader imported in every
+    process) when the daemon starts, so no job pays for that again. A single replay goes
+    first, then detection, and a batch is split into chunks of its replays, the newest
+    first, so a replay that was just saved does not wait for a whole folder to be renamed.
+    The renamers of the last few settings are kept, so their compiled template and
+    filters are reused too. A request with 'wait' set gets the result of its job as the
+    answer, otherwise it gets the id of the job right away.
+    """
+
+    def __init__(self, workers=0, history=20, renamers=8):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.scheduler = Scheduler()
+        self.queued = []
+        self.running = None
+        self.finished = deque(maxlen=history)
+        self.renamers = OrderedDict()
+        self.renamer_count = renamers
+        self.ids = itertools.count(1)
+        self.started = time.time()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+
+    def serve_forever(self):
+        """listens for clients until a shutdown request comes in"""
+        if is_running():
+            raise RuntimeError('Another renamer daemon is already running')
+
+        # a socket file left behind by a daemon that did not stop cleanly
+        if sys.platform != 'win32' and os.path.exists(defaults.daemon_socket):
+            os.remove(defaults.daemon_socket)
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        list(self.pool.map(warm_up, range(self.workers)))
+
+        self.key = create_key()
+        self.listener = Listener(address(), authkey=self.key)
+        self.scheduler.start()
+        logger.info('renamer daemon listening on %s with %d parse workers', address(), self.workers)
+
+        try:
+            while not self.stopping.is_set():
+                try:
+                    connection = self.listener.accept()
+                except (OSError, AuthenticationError):
+                    logger.warning('a client without the key of the daemon was turned away')
+                    continue
+
+                threading.Thread(target=self.serve, args=(connection,), name='daemon-client', daemon=True).start()
+
+        finally:
+            self.listener.close()
+            self.scheduler.stop()
+            self.pool.shutdown()
+            os.remove(defaults.daemon_key_file)
+            logger.info('renamer daemon stopped')
+
+
+    def serve(self, connection):
+        """answers the requests of one client until it disconnects"""
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                connection.send(self.answer(request))
+
+                if request.get('job') == 'shutdown':
+                    self.stop()
+                    return
+
+
+    def answer(self, request):
+        kind = request.get('job')
+
+        if kind == 'status':
+            return self.status()
+
+        if kind == 'shutdown':
+            return {'stopping': True}
+
+        if kind not in _jobs:
+            return {'error': f'Unknown job {kind!r}'}
+
+        # a job is split into the pieces the scheduler runs, (priority, work, *args)
+        try:
+            pieces = _jobs[kind](self, request)
+        except Exception as e:
+            logger.exception('could not start a %s job', kind)
+            return {'error': str(e)}
+
+        job = {'id': next(self.ids), 'job': kind, 'queued': time.time(), 'left': len(pieces)}
+
+        with self.lock:
+            self.queued.append(job)
+
+        futures = [self.scheduler.submit(priority, self.run_piece, job, work, *args) for priority, work, *args in pieces]
+
+        if not request.get('wait'):
+            return {'id': job['id']}
+
+        try:
+            results = [future.result() for future in futures]
+        except Exception as e:
+            return {'id': job['id'], 'error': str(e)}
+
+        return {'id': job['id'], 'result': merge(results) if kind == 'batch' else results[0]}
+
+
+    def stop(self):
+        self.stopping.set()
+
+        # the listener only sees that it has to stop once it accepts another connection
+        try:
+            Client(address(), authkey=self.key).close()
+        except (OSError, EOFError):
+            pass
+
+
+    def run_piece(self, job, work, *args):
+        """runs a piece of the job, keeping track of which job is running and when it finished"""
+        with self.lock:
+            if job in self.queued:
+                self.queued.remove(job)
+                job['started'] = time.time()
+
+            self.running = job
+
+        try:
+            return work(*args)
+
+        except Exception:
+            logger.exception('job %d (%s) failed', job['id'], job['job'])
+            raise
+
+        finally:
+            with self.lock:
+                self.running = None
+                job['left'] -= 1
+
+                if not job['left']:
+                    job['finished'] = time.time()
+                    self.finished.append(job)
+
+
+    def status(self):
+        with self.lock:
+            return {
+                'uptime': time.time() - self.started,
+                'workers': self.workers,
+                'running': describe(self.running) if self.running else None,
+                'queued': len(self.queued),
+                'finished': [describe(job) for job in self.finished]
+            }
+
+
+    def renamer(self, settings):
+        """the renamer for these settings, compiled once and kept for the next jobs that use them, the least recently used one making room"""
+        key = json.dumps(settings, sort_keys=True)
+
+        with self.lock:
+            if key in self.renamers:
+                self.renamers.move_to_end(key)
+                return self.renamers[key]
+
+        # compiling happens outside of the lock, so other clients are not held up by it
+        renamer = BatchRenamer(settings, pool=self.pool)
+
+        with self.lock:
+            renamer = self.renamers.setdefault(key, renamer)
+            self.renamers.move_to_end(key)
+
+            while len(self.renamers) > self.renamer_count:
+                self.renamers.popitem(last=False)
+
+        return renamer
+
+
+    def batch(self, request):
+        """a run in chunks of its replays, or in one piece for a dry run, which has to plan every name at once"""
+        renamer = self.renamer(request['settings'])
+        incremental = request.get('incremental', True)
+
+        if request.get('dry_run', False):
+            return [(BACKLOG, run_batch, renamer, incremental)]
+
+        return [(priority, rename_chunk, renamer, paths, incremental) for priority, paths in chunks([path for path, _ in newest_first(renamer.list_replays())])]
+
+
+    def rename_file(self, request):
+        return [(LIVE, rename_one, self.renamer(request['settings']), request['path'])]
+
+
+    def detect(self, request):
+        return [(RECENT, partial(detect_players, workers=self.workers, pool=self.pool), request['source'], request.get('excludes', []))]
+
+
+_jobs = {
+    'batch': RenamerDaemon.batch,
+    'rename_file': RenamerDaemon.rename_file,
+    'detect': RenamerDaemon.detect
+}
+
+
+def run_batch(renamer, incremental):
+    renamer.run(incremental=incremental, dry_run=True)
+    return renamer.summary()
+
+
+def rename_one(renamer, path):
+    return {'renamed': renamer.rename_file(path), 'skipped': renamer.skipped > 0}
+
+
+def describe(job):
+    """a job as it is shown in the status, without its result"""
+    return {key: job[key] for key in ('id', 'job', 'queued', 'started', 'finished') if key in job}
+
+
+def warm_up(_):
+    """imports sc2reader in a parse process, so the first job does not wait for it"""
+    import sc2reader
+
+
+def create_key():
+    """a new secret for this daemon, readable by the user that started it only"""
+    key = os.urandom(32)
+
+    # the permissions only apply to a file that is created, not to one that is overwritten
+    if os.path.exists(defaults.daemon_key_file):
+        os.remove(defaults.daemon_key_file)
+
+    descriptor = os.open(defaults.daemon_key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(key)
+
+    return key
@@ -0,0 +1,45 @@
+"""Talks to a running renamer daemon (see RenamerDaemon), for the GUI, the command line and scripts
+
+    from src.daemon.client import request
+    request({'job': 'batch', 'settings': settings, 'wait': True})
+"""
+import os
+import sys
+from multiprocessing.connection import Client
+
+import src.structures.defaults as defaults
+
+
+def address():
+    return defaults.daemon_pipe if sys.platform == 'win32' else defaults.daemon_socket
+
+
+def read_key():
+    with open(defaults.daemon_key_file, 'rb') as file:
+        return file.read()
+
+
+def request(message):
+    """sends one request to the daemon and returns its answer, raises ConnectionError if no daemon is running"""
+    if not is_running():
+        raise ConnectionError('The renamer daemon is not running')
+
+    with Client(address(), authkey=read_key()) as connection:
+        connection.send(message)
+        return connection.recv()
+
+
+def is_running():
+    """whether a daemon is listening, without bothering it with a request"""
+    if not os.path.isfile(defaults.daemon_key_file):
+        return False
+
+    if sys.platform != 'win32' and not os.path.exists(defaults.daemon_socket):
+        return False
+
+    try:
+        Client(address(), authkey=read_key()).close()
+        return True
+
+    except Exception:
+        return False
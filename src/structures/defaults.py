@@ -6,6 +6,8 @@ _player_id = 'player_id'
 _operation = 'operation'
 _copy = 'copy'
 _move = 'move'
+_hardlink = 'hardlink'
+_reflink = 'reflink'
 _excludes = 'excludes'
 _ai = 'AI'
 _custom = 'Custom'
@@ -19,7 +21,29 @@ _wol = 'WoL'
 _hots = 'HotS'
 _lotv = 'LotV'
 _tray = 'tray'
+_performance = 'performance'
+_scan_workers = 'Scan_Workers'
+_parse_workers = 'Parse_Workers'
+_filter_workers = 'Filter_Workers'
+_render_workers = 'Render_Workers'
+_file_workers = 'File_Workers'
+_queue_size = 'Queue_Size'
+_cache_size = 'Cache_Size'
+_dedup_size = 'Dedup_Size'
+_metrics_file = 'Metrics_File'
+_journal_sync = 'Journal_Sync'
+_watch_queue = 'Watch_Queue'
+_watch_mode = 'Watch_Mode'
 settings_file = 'settings.json'
+cache_file = 'replay_cache.sqlite3'
+manifest_file = 'replay_manifest.sqlite3'
+dedup_file = 'replay_hashes.sqlite3'
+library_file = 'replay_library.sqlite3'
+journal_file = 'rename_journal.jsonl'
+watermark_file = 'watch_mark.json'
+daemon_socket = 'renamer_daemon.sock'           # the daemon listens here on Linux and macOS
+daemon_pipe = r'\\.\pipe\sc2-replay-renamer'    # and on this named pipe on Windows
+daemon_key_file = 'renamer_daemon.key'          # secret that clients need to talk to the daemon
 
 
 # default settings
@@ -43,7 +67,21 @@ settings = {
         _hots: False,
         _lotv: True
     },
-    _tray: False
+    _tray: False,
+    _performance: {
+        _scan_workers: 1,
+        _parse_workers: 0,    # 0 uses every core
+        _filter_workers: 1,
+        _render_workers: 1,
+        _file_workers: 1,
+        _queue_size: 64,      # replays waiting in front of each stage
+        _cache_size: 200000,  # records of parsed replays kept on disk, 0 turns the cache off
+        _dedup_size: 200000,  # hashes of renamed replays kept on disk, 0 turns duplicate detection off
+        _metrics_file: '',    # JSON lines file that the timings of every replay are appended to, '' for none
+        _journal_sync: 256,   # finished file operations marked in the journal between two syncs to disk
+        _watch_queue: 2,      # bursts of new replays waiting for the watcher's renamer before the watcher holds on to them
+        _watch_mode: 'auto'   # 'native' file system events, 'poll' the folder, or 'auto' to poll network folders only
+    }
 }
 
 gui_readable_defaults = {
@@ -53,6 +91,8 @@ gui_readable_defaults = {
     _player_id: settings[_player_id],
     _copy: True if settings[_operation] == _copy else False,
     _move: True if settings[_operation] == _move else False,
+    _hardlink: True if settings[_operation] == _hardlink else False,
+    _reflink: True if settings[_operation] == _reflink else False,
     _ai: settings[_excludes][_ai],
     _custom: settings[_excludes][_custom],
     _exclude_matchups: settings[_excludes][_exclude_matchups],
@@ -64,4 +104,9 @@ gui_readable_defaults = {
     _hots: settings[_includes][_hots],
     _lotv: settings[_includes][_lotv],
     _tray: settings[_tray]
-}
\ No newline at end of file
+}
+
+
+def performance_settings(saved):
+    """the performance settings of saved, with the defaults for the ones it does not have (say, from an older version)"""
+    return {**settings[_performance], **saved.get(_performance, {})}
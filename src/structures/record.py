@@ -0,0 +1,126 @@
+import json
+import marshal
+
+
+# Replays are reduced to these records right after parsing, so that only a handful of
+# strings and numbers (instead of whole sc2reader objects) travel between processes
+
+# control value of computer players in replay.details
+_computer = 3
+
+
+class ReplayRecord:
+    """The fields of a replay that the filters and the template use, and nothing else.
+
+    A header record (load_level 1) only has the fields that are known before the players
+    are loaded, the others keep their defaults. teams is a tuple of (lineup, players) and
+    every player is a tuple of (name, toon id, mmr). Records are plain tuples underneath,
+    so they pickle small on their way back from a parse process and dumps() / loads() turn
+    them into marshal bytes for the cache. to_json() / from_json() do the same for the
+    library, which has to outlive the Python version that wrote it.
+    """
+
+    __slots__ = ('filename', 'load_level', 'player_count', 'has_computers', 'is_ladder', 'expansion',
+                 'teams', 'winner', 'map', 'game_length', 'unix_timestamp', 'real_type')
+
+    def __init__(self, filename, load_level, player_count, has_computers, is_ladder, expansion,
+                 teams=(), winner=-1, map='', game_length=0, unix_timestamp=0, real_type=''):
+        self.filename = filename
+        self.load_level = load_level
+        self.player_count = player_count
+        self.has_computers = has_computers
+        self.is_ladder = is_ladder
+        self.expansion = expansion
+        self.teams = teams
+        self.winner = winner
+        self.map = map
+        self.game_length = game_length
+        self.unix_timestamp = unix_timestamp
+        self.real_type = real_type
+
+
+    def fields(self):
+        return tuple([getattr(self, name) for name in self.__slots__])
+
+
+    def dumps(self):
+        """the record as bytes, without the file name, which is wherever the replay is now"""
+        return marshal.dumps(self.fields()[1:])
+
+
+    @classmethod
+    def loads(cls, data, filename):
+        return cls(filename, *marshal.loads(data))
+
+
+    def to_json(self):
+        return json.dumps(self.fields()[1:])
+
+
+    @classmethod
+    def from_json(cls, data, filename):
+        fields = json.loads(data)
+
+        # JSON turned the teams and players into lists
+        fields[5] = tuple([(lineup, tuple([tuple(player) for player in players])) for lineup, players in fields[5]])
+        return cls(filename, *fields)
+
+
+    def __reduce__(self):
+        return ReplayRecord, self.fields()
+
+
+    def __eq__(self, other):
+        return isinstance(other, ReplayRecord) and self.fields() == other.fields()
+
+
+    def __repr__(self):
+        return f'ReplayRecord({", ".join(f"{name}={value!r}" for name, value in zip(self.__slots__, self.fields()))})'
+
+
+def extract_header(replay):
+    """pulls out the fields that are known before the players are loaded (load_level=1)"""
+    players = replay.raw_data['replay.details']['players']
+
+    return ReplayRecord(
+        filename=replay.filename,
+        load_level=1,
+        player_count=len(players),
+        has_computers=any(player['control'] == _computer for player in players),
+        is_ladder=replay.is_ladder,
+        expansion=replay.expansion
+    )
+
+
+def extract_record(replay):
+    """pulls out the fields that the filters and the template need from a loaded replay"""
+    teams = []
+    winner = -1
+
+    for index, team in enumerate(replay.teams):
+        players = tuple([(player.name, player.toon_id, scaled_rating(player)) for player in team.players])
+        teams.append((team.lineup, players))
+
+        if replay.winner == team:
+            winner = index
+
+    return ReplayRecord(
+        filename=replay.filename,
+        load_level=2,
+        player_count=len(replay.players),
+        has_computers=bool(replay.computers),
+        is_ladder=replay.is_ladder,
+        expansion=replay.expansion,
+        teams=tuple(teams),
+        winner=winner,
+        map=replay.map_name,
+        game_length=replay.game_length.seconds,
+        unix_timestamp=replay.unix_timestamp,
+        real_type=replay.real_type
+    )
+
+
+def scaled_rating(player):
+    """mmr of the player, computers do not have any init_data"""
+    init_data = getattr(player, 'init_data', None) or {}
+    return init_data.get('scaled_rating', 0)
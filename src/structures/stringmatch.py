@@ -1,6 +1,6 @@
 id_variables = [
     'myteam',
-    'myteamwithmmr'
+    'myteamwithmmr',
     'oppteams',
     'myraces',
     'oppraces',
@@ -36,4 +36,56 @@ non_id_variables = [
     'uniqueID'
 ]
 
-all_variables = id_variables + non_id_variables
\ No newline at end of file
+all_variables = id_variables + non_id_variables
+
+# what each id variable turns into once your team has been moved to the front
+id_forwarding = {
+    'myteamwithmmr': 't1withmmr',
+    'myteam': 'team1',
+    'oppteams': 'team2',
+    'myraces': 't1races',
+    'oppraces': 't2races',
+    'mymmr': 't1mmr',
+    'oppmmr': 't2mmr',
+    'oppwithmmr': 't2withmmr'
+}
+
+
+def split_string(s):
+    return [elem.strip() for elem in s.split(',')] if s else []
+
+
+def add_leading_zero(s):
+    s = str(s)
+    return '0' + s if len(s) == 1 else s
+
+
+def template_contains_id_vars(template):
+    """returns whether the template contains a variable that requires the player id"""
+    for var in id_variables:
+        if var in template:
+            return True
+    return False
+
+
+def may_contain_duplicates(template):
+    """returns whether different replays could end up with the same name"""
+    template = str(template)
+    if '$unique' in template or '$currentname' in template:
+        return False
+
+    hour = '$hour' in template
+    minute = '$min' in template
+    sec = '$sec' in template
+
+    return not (hour and minute and sec)
+
+
+def format_size(size):
+    """human readable number of bytes"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+    return f'{size:.1f} TB'
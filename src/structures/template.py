@@ -0,0 +1,151 @@
+import ntpath
+import re
+from datetime import datetime
+
+import src.structures.stringmatch as stringmatch
+
+
+class CompiledTemplate:
+    """A rename template that is parsed once per run instead of once per replay.
+
+    The template is split into literal text and variables, always matching the longest
+    variable name ($t1withmmr before $t1mmr, $myteamwithmmr before $myteam). Id variables
+    are forwarded to their team 1 / team 2 counterparts up front, and only the variables
+    that appear in the template are ever computed for a replay.
+
+    A / (or \\) in the template puts the replay in a subfolder, like '$year/$month/$map'.
+    Only the template can make folders: slashes in the values of the variables are
+    replaced by dashes.
+    """
+
+    def __init__(self, template, my_id=''):
+        self.template = template
+        self.my_id = my_id
+        self.has_id = stringmatch.template_contains_id_vars(template)
+
+        # id variables are left as they are when the template does not use any of them
+        names = stringmatch.all_variables if self.has_id else stringmatch.non_id_variables
+        pattern = re.compile(r'\$(' + '|'.join(sorted(names, key=len, reverse=True)) + ')')
+
+        # the template becomes a format string, with the parts of the date in the first
+        # fields and then a field for every other variable, so each one is computed once
+        variables = []
+        pieces = []
+        position = 0
+        self.needs_date = False
+
+        for match in pattern.finditer(template):
+            pieces.append(_literal(template[position:match.start()]))
+
+            name = stringmatch.id_forwarding.get(match.group(1), match.group(1))
+            if name in _date_fields:
+                pieces.append(_date_fields[name])
+                self.needs_date = True
+            else:
+                if name not in variables:
+                    variables.append(name)
+                pieces.append('{%d}' % (_date_parts + variables.index(name)))
+
+            position = match.end()
+
+        pieces.append(_literal(template[position:]))
+
+        self.format = ''.join(pieces).format
+        self.resolvers = [_variables[name] for name in variables]
+        self.needs_teams = not _team_variables.isdisjoint(variables)
+
+
+    def render(self, record):
+        """fills in the template with the values of the replay"""
+        teams = _teams(record.teams, self.my_id, self.has_id) if self.needs_teams else None
+
+        # the ISO format of the date ('YYYY-MM-DDTHH:MM:SS') has the leading zeros already
+        date = datetime.fromtimestamp(record.unix_timestamp).isoformat() if self.needs_date else ''
+
+        return self.format(date[:4], date[5:7], date[8:10], date[11:13], date[14:16], date[17:19], *[resolve(record, teams) for resolve in self.resolvers])
+
+
+def _literal(text):
+    """text of the template as it goes into the format string"""
+    return text.replace('\\', '/').replace('{', '{{').replace('}', '}}')
+
+
+def _teams(all_teams, my_id, has_id):
+    """(index, team) of the first team (the one you were on, if you have an id) and the other teams"""
+    first = 0
+
+    if has_id:
+        for index, (_, players) in enumerate(all_teams):
+            if my_id in [player[1] for player in players]:
+                first = index
+                break
+
+    # the first team trades places with the team you were on
+    others = list(all_teams[1:])
+    if first:
+        others[first - 1] = all_teams[0]
+
+    return first, all_teams[first], others
+
+
+def _no_folders(value):
+    return value.replace('/', '-').replace('\\', '-')
+
+
+def _team_names(players):
+    return _no_folders('+'.join([player[0] for player in players]))
+
+
+def _t1mmr(record, teams):
+    return str(max(0, teams[1][1][0][2])) if record.is_ladder else '0'
+
+
+def _t2withmmr(record, teams):
+    is_ladder = record.is_ladder
+    return 'v'.join([_team_names(players) + '(' + (str(max(0, players[0][2])) if is_ladder else '0') + ')' for _, players in teams[2]])
+
+
+def _t2mmr(record, teams):
+    has_computers = record.has_computers
+    return 'v'.join([str(players[0][2]) if not has_computers else '0' for _, players in teams[2]])
+
+
+def _WL(record, teams):
+    return 'W' if record.winner == teams[0] else 'L'
+
+
+# how to compute every other non id variable from (record, teams), teams being None unless
+# the template needs them; the values that come from the replay lose their slashes here
+_variables = {
+    'team1': lambda record, teams: _team_names(teams[1][1]),
+    't1races': lambda record, teams: _no_folders(teams[1][0]),
+    't1mmr': _t1mmr,
+    't1withmmr': lambda record, teams: f'{_team_names(teams[1][1])}({_t1mmr(record, teams)})',
+    'wl': lambda record, teams: _WL(record, teams).lower(),
+    'WL': _WL,
+    'team2': lambda record, teams: 'v'.join([_team_names(players) for _, players in teams[2]]),
+    't2withmmr': _t2withmmr,
+    't2races': lambda record, teams: _no_folders('v'.join([lineup for lineup, _ in teams[2]])),
+    't2mmr': _t2mmr,
+    'map': lambda record, teams: _no_folders(record.map),
+    'durationhours': lambda record, teams: str(int(record.game_length / 3600)),
+    'durationmins': lambda record, teams: str(int((record.game_length / 60) % 60)),
+    'durationsecs': lambda record, teams: str(int(record.game_length % 60)),
+    'gametype': lambda record, teams: _no_folders(record.real_type),
+    'expansion': lambda record, teams: _no_folders(record.expansion),
+    'currentname': lambda record, teams: ntpath.split(record.filename)[1].replace('.SC2Replay', '')
+}
+
+# the variables that are a part of the date of the replay, in the first _date_parts fields (see render)
+_date_parts = 6
+_date_fields = {
+    'year': '{0}',
+    'month': '{1}',
+    'day': '{2}',
+    'hour': '{3}',
+    'min': '{4}',
+    'sec': '{5}',
+    'uniqueID': '{2}{1}{0}{3}{4}{5}'
+}
+
+_team_variables = {'team1', 't1races', 't1mmr', 't1withmmr', 'wl', 'WL', 'team2', 't2withmmr', 't2races', 't2mmr'}
@@ -1,19 +1,49 @@
+import logging
+import os
+import threading
 import time
 from watchdog.observers import Observer
+from src.batch.scanner import newest_first, scan_replays
+from src.batch.Scheduler import Scheduler, chunks, rename_chunk
 from src.tray.ReplayCreatedHandler import ReplayCreatedHandler
+from src.tray.RenameWorker import RenameWorker
+from src.tray.SnapshotPoller import SnapshotPoller, is_network_folder
+from src.tray.Watermark import Watermark
 from src.structures import defaults
+from src.structures.stringmatch import split_string
+
+logger = logging.getLogger(__name__)
 
 class AutoRenamerThread:
-    
+    """Watches the replay folder and renames the new replays, catching up on the ones saved while it was not running
+
+    Once the observer runs, the replays in the folder that are newer than the watermark
+    (the newest replay renamed the last time, or the oldest one that failed) but older
+    than the start of the observer are handed to the handler, and everything after that is left to the live events.
+    The first time the watcher runs on a folder it only sets the watermark.
+
+    Network and synced folders are watched by a SnapshotPoller instead of the native
+    observer, which misses their events (see Watch_Mode in the performance settings).
+
+    Renames run on a Scheduler, the replays of the live events first. With backlog set,
+    every other replay of the folder is renamed behind them, the newest first, and
+    whatever is left of it when the watcher stops is left to the next run.
+    """
+
     has_running_thread = False
     name = 0
 
-    def __init__(self, settings):
+    def __init__(self, settings, backlog=False):
         self.continue_running = False
         AutoRenamerThread.name += 1
 
-        self.event_handler = ReplayCreatedHandler(settings)
-        self.observer = Observer()
+        self.settings = settings
+        self.backlog = backlog
+        self.scheduler = Scheduler()
+        self.watermark = Watermark(defaults.watermark_file, settings[defaults._source_dir])
+        self.worker = RenameWorker(settings, self.watermark, self.scheduler)
+        self.event_handler = ReplayCreatedHandler(settings, self.worker)
+        self.observer = make_observer(settings)
         self.observer.schedule(self.event_handler, path=settings[defaults._source_dir], recursive=False)
         
         self.name = AutoRenamerThread.name
@@ -22,12 +52,19 @@ class AutoRenamerThread:
     def start(self):
         if not AutoRenamerThread.has_running_thread:
             self.continue_running = True
+            self.scheduler.start()
+            self.worker.start()
+            self.event_handler.start()
             self.observer.start()
-            print(self, "has been started")
+
+            # taken once the observer runs, so every replay that changes later has live events
+            started = time.time_ns()
+            threading.Thread(target=self.catch_up, args=(started,), name='catch-up', daemon=True).start()
+            logger.info("%s has been started", self)
             AutoRenamerThread.has_running_thread = True
         
         else:
-            print("Only one instance of AutoRenamerThread can be run at a time")
+            logger.warning("Only one instance of AutoRenamerThread can be run at a time")
 
     
     def stop(self):
@@ -35,12 +72,77 @@ class AutoRenamerThread:
             self.continue_running = False
             self.observer.stop()
             self.observer.join()
-            print(self, "has been stopped")
+            self.event_handler.stop()
+            self.worker.stop()
+            self.scheduler.stop(cancel=True)
+            logger.info("%s has been stopped", self)
             AutoRenamerThread.has_running_thread = False
         
         else:
-            print(self, "has not been started")
+            logger.warning("%s has not been started", self)
     
     
+    def catch_up(self, started):
+        mark = self.watermark.get()
+
+        if mark is None:
+            self.watermark.advance((started, ''))
+        else:
+            self.catch_up_since(started)
+
+        if self.backlog:
+            self.rename_backlog()
+
+
+    def catch_up_since(self, started):
+        source = self.settings[defaults._source_dir]
+        excludes = split_string(self.settings[defaults._excludes][defaults._exclude_dirs])
+
+        # the observer does not look into subfolders, so neither does the catch-up, which hands the newest over first
+        replays = newest_first((path, stat) for path, stat in scan_replays(source, excludes, skip=[self.settings[defaults._target_dir]], recursive=False)
+                               if self.watermark.pending((stat.st_mtime_ns, os.path.normcase(os.path.abspath(path)))) and stat.st_mtime_ns < started)
+
+        if replays:
+            logger.info('catching up on %d replays saved while the watcher was not running', len(replays))
+            self.event_handler.catch_up(replays, started)
+
+
+    def rename_backlog(self):
+        """queues every replay of the folder on the scheduler in chunks, the newest first"""
+        from src.batch.BatchRenamer import BatchRenamer
+
+        renamer = BatchRenamer(self.settings)
+        jobs = chunks([path for path, _ in newest_first(renamer.list_replays())])
+        logger.info('renaming the replays in %s in %d chunks, behind the new ones', self.settings[defaults._source_dir], len(jobs))
+
+        for priority, paths in jobs:
+            self.scheduler.submit(priority, rename_chunk, renamer, paths).add_done_callback(backlog_done)
+
+
     def __str__(self):
-        return 'auto_renamer instance ' + str(self.name)
\ No newline at end of file
+        return 'auto_renamer instance ' + str(self.name)
+
+
+def backlog_done(job):
+    if job.cancelled():
+        return
+
+    if job.exception():
+        logger.error('could not rename a chunk of the backlog: %s', job.exception())
+        return
+
+    summary = job.result()
+    logger.info('renamed %d replays of the backlog (%d already renamed)', summary['renamed'], summary['skipped'],
+                extra={'renamed': summary['renamed'], 'skipped': summary['skipped']})
+
+
+def make_observer(settings):
+    """the native watchdog observer, or a poller where native events cannot be trusted"""
+    performance = defaults.performance_settings(settings)
+    mode = performance[defaults._watch_mode]
+
+    if mode == 'poll' or (mode == 'auto' and is_network_folder(settings[defaults._source_dir])):
+        logger.info('polling %s for new replays', settings[defaults._source_dir])
+        return SnapshotPoller()
+
+    return Observer()
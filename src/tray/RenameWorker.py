@@ -0,0 +1,164 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import src.structures.defaults as defaults
+from src.batch.Scheduler import LIVE
+from src.tray.Watermark import marks_of
+
+
+logger = logging.getLogger(__name__)
+
+
+class RenameWorker:
+    """Renames the bursts of replays it is handed in its own thread, with the current settings
+
+    At most Watch_Queue bursts (from the performance settings) wait for the worker. Once
+    that many are waiting, submit() blocks and offer() turns the burst down, so that the
+    handler holds on to it and adds the next replays to it. Whatever queued up while the
+    worker was busy is renamed as one job, so a big drop of replays goes through the
+    pipeline of the BatchRenamer instead of one replay at a time. Every replay is timed
+    from the moment it started being saved until its rename is done, and the latest
+    timings are kept in self.latencies. After every job, the watermark (if there is one)
+    moves forward to the newest replay of the job, and keeps the replays that could not
+    be renamed for the next catch-up (see Watermark.record).
+
+    With a scheduler, the jobs run on it as LIVE jobs, ahead of the backlog it works on.
+    """
+
+    def __init__(self, settings, watermark=None, scheduler=None):
+        self.settings = settings
+        self.watermark = watermark
+        self.scheduler = scheduler
+        performance = defaults.performance_settings(settings)
+        self.queue = queue.Queue(maxsize=int(performance[defaults._watch_queue]))
+        self.latencies = deque(maxlen=100)
+        self.thread = None
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop, name='rename-worker', daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        """renames the replays that are still queued, then stops"""
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+
+    def submit(self, burst):
+        """queues replays that are done being written as (file, saved), saved being when each started being saved"""
+        self.queue.put(self.stamp(burst))
+
+
+    def offer(self, burst):
+        """queues the replays like submit, unless the queue is full, returns whether they were queued"""
+        try:
+            self.queue.put_nowait(self.stamp(burst))
+            return True
+
+        except queue.Full:
+            return False
+
+
+    def stamp(self, burst):
+        written = time.time()
+        return [(file, saved, written) for file, saved in burst]
+
+
+    def loop(self):
+        while True:
+            burst = self.queue.get()
+            if burst is None:
+                break
+
+            # everything that queued up while the last job ran goes into this one
+            stopping = False
+            while not stopping:
+                try:
+                    more = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if more is None:
+                    stopping = True
+                else:
+                    burst.extend(more)
+
+            # read before the rename, which may move the replays away
+            marks = marks_of([file for file, _, _ in burst]) if self.watermark else {}
+
+            if len(burst) == 1:
+                failed = self.rename_one(*burst[0])
+            else:
+                failed = self.rename_burst(burst)
+
+            if self.watermark:
+                self.watermark.record(marks, failed)
+
+            if stopping:
+                break
+
+
+    def run(self, work, *args):
+        """runs the job on the scheduler if there is one, waiting for it to be done"""
+        if self.scheduler:
+            return self.scheduler.submit(LIVE, work, *args).result()
+
+        return work(*args)
+
+
+    def rename_one(self, file, saved, written):
+        """renames a single replay, returns the replays that could not be renamed"""
+        from src.batch.BatchRenamer import BatchRenamer
+
+        renamer = BatchRenamer(self.settings)
+
+        try:
+            renamed = self.run(renamer.rename_file, file)
+        except Exception:
+            logger.exception('could not rename %s', os.path.split(file)[1], extra={'replay': file})
+            return [file]
+
+        if renamer.failed:
+            return renamer.failed
+
+        if renamer.skipped:
+            logger.info('%s has already been renamed', os.path.split(file)[1], extra={'replay': file})
+            return []
+
+        latency = time.time() - saved
+        self.latencies.append(latency)
+
+        logger.info('%s %s %.2f seconds after it was saved (%.2f seconds waiting for it to be written)',
+                    'renamed' if renamed else 'filtered out', os.path.split(file)[1], latency, written - saved,
+                    extra={'replay': file, 'renamed': renamed, 'latency': latency, 'write_wait': written - saved})
+        return []
+
+
+    def rename_burst(self, burst):
+        """renames the replays of the burst as one job, returns the ones that could not be renamed"""
+        from src.batch.BatchRenamer import BatchRenamer
+
+        renamer = BatchRenamer(self.settings)
+
+        try:
+            renamed = self.run(renamer.rename_files, [file for file, _, _ in burst])
+        except Exception:
+            logger.exception('could not rename a burst of %d replays', len(burst))
+            return [file for file, _, _ in burst]
+
+        now = time.time()
+        latencies = [now - saved for _, saved, _ in burst]
+        self.latencies.extend(latencies)
+
+        logger.info('renamed %d of a burst of %d replays (%d already renamed) at most %.2f seconds after they were saved',
+                    renamed, len(burst), renamer.skipped, max(latencies),
+                    extra={'burst': len(burst), 'renamed': renamed, 'skipped': renamer.skipped, 'latency': max(latencies)})
+        return renamer.failed
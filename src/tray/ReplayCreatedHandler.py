@@ -1,10 +1,17 @@
 from watchdog.events import FileSystemEventHandler
-import hashlib
-import time
-from datetime import datetime
-import sc2reader
 import os
-from src.structures import defaults
+import threading
+import time
+
+_replay_extension = '.SC2Replay'
+_backup_extension = '.writeCacheBackup'
+
+# how long the size and modification time of a replay have to stay the same before it
+# counts as written, for replays whose save sequence is not seen in full
+_stable_seconds = 0.5
+
+# how often the replays that are done being written are gathered up and handed over, as one burst
+_debounce_seconds = 0.2
 
 class ReplayCreatedHandler(FileSystemEventHandler):
     """Used to handle the renaming once the replay file is generated
@@ -15,46 +22,159 @@ class ReplayCreatedHandler(FileSystemEventHandler):
     Modify Ephemeron LE (4).SC2Replay
     Delete Ephemeron LE (4).SC2Replay.writeCacheBackup
     Modify Ephemeron LE (4).SC2Replay
+
+    A replay is done on the modify that follows the deletion of its backup. Replays that
+    show up any other way (copied or moved into the folder) are done once their size and
+    modification time stop changing. Events only update the state of their replay in
+    self.pending, so any number of events for the same replay cost next to nothing, and
+    the observer thread never waits. Every _debounce_seconds, a single thread hands the
+    replays that are done to the worker in one go, so a replay pack that lands all at
+    once is renamed as one job. If the worker is behind, the burst grows until the worker
+    has room for it.
     """
 
-    def __init__(self, settings):
+    def __init__(self, settings, worker):
         self.settings = settings
-        self.hashes = set()
+        self.worker = worker
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
         FileSystemEventHandler.__init__(self)
 
 
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.loop, name='replay-debounce', daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        """stops handing over replays, the ones that are still being written are left alone"""
+        if self.thread:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+
     def on_created(self, event):
         """Called when a file or directory is created"""
-        
+        if event.is_directory:
+            return
+
+        file = event.src_path
+
+        if file.endswith(_replay_extension):
+            self.track(file)
+
+        elif file.endswith(_replay_extension + _backup_extension):
+            self.update(file[:-len(_backup_extension)], 'backup_created')
+
+
+    def on_deleted(self, event):
+        file = event.src_path
+
+        if file.endswith(_replay_extension + _backup_extension):
+            self.update(file[:-len(_backup_extension)], 'backup_deleted')
+
+        elif file.endswith(_replay_extension):
+            with self.lock:
+                self.pending.pop(file, None)
+
+
+    def on_modified(self, event):
         file = event.src_path
-        
-        if os.path.isfile(file) and os.path.splitext(file)[1] == '.SC2Replay':
-
-            # sleeps for 1 second to make sure all the cache data is written to the replay file before we operate on it
-            time.sleep(1)
-            
-            file_hash = self.get_hash(file)
-            
-            if file_hash in self.hashes:
-                print(f'{os.path.split(file)[1]} has already been hashed')
-                return None
-            
-            else:
-                self.hashes.add(file_hash)
-                print(f'event type: {event.event_type} at {datetime.now().strftime("%H:%M:%S")}')
-                print(f'path: {event.src_path}')
-                print(f'{self.hashes}', end='\n\n')
-
-
-    def get_hash(self, file):
-        """ Gets the md5 hash of the file """
-
-        md5 = hashlib.md5()
-        with open(file, 'rb') as f:
-            while True:
-                data = f.read(1024)
-                if not data:
-                    break
-                md5.update(data)
-
-        return md5.hexdigest()
+
+        # the last step of the save sequence
+        if file.endswith(_replay_extension):
+            with self.lock:
+                state = self.pending.get(file)
+
+                if state and state['backup_deleted']:
+                    state['done'] = True
+
+
+    def on_moved(self, event):
+        if event.dest_path.endswith(_replay_extension):
+            self.track(event.dest_path)
+
+
+    def track(self, file):
+        """starts following the save sequence of a new replay"""
+        with self.lock:
+            if file not in self.pending:
+                self.pending[file] = new_state()
+
+
+    def catch_up(self, replays, started):
+        """hands over (path, stat) of replays that were saved while the watcher was not running
+
+        A replay that changed after the observer started (at started, in ns) belongs to
+        its live events, and so does one that is already pending, so no replay is handed
+        over twice.
+        """
+        for file, stat in replays:
+            try:
+                if os.stat(file).st_mtime_ns >= started:
+                    continue
+            except OSError:
+                continue
+
+            with self.lock:
+                if file not in self.pending:
+                    self.pending[file] = new_state(done=True)
+
+
+    def update(self, file, step):
+        with self.lock:
+            if file in self.pending:
+                self.pending[file][step] = True
+
+
+    def loop(self):
+        burst = []
+
+        while not self.stopping.wait(_debounce_seconds):
+            burst.extend(self.collect())
+
+            # while the worker is behind, the burst keeps growing instead of queueing up behind it
+            if burst and self.worker.offer(burst):
+                burst = []
+
+        if burst:
+            self.worker.submit(burst)
+
+
+    def collect(self):
+        """takes the replays that are done being written out of self.pending, as (file, saved)"""
+        with self.lock:
+            states = list(self.pending.items())
+
+        now = time.time()
+        done = [file for file, state in states if state['done'] or self.is_stable(file, state, now)]
+
+        with self.lock:
+            return [(file, self.pending.pop(file)['saved']) for file in done if file in self.pending]
+
+
+    def is_stable(self, file, state, now):
+        """whether the replay stopped changing, dropping it if it is gone"""
+        try:
+            stat = os.stat(file)
+        except OSError:
+            with self.lock:
+                self.pending.pop(file, None)
+            return False
+
+        current = (stat.st_size, stat.st_mtime_ns)
+        if current != state['last']:
+            state['last'] = current
+            state['since'] = now
+            return False
+
+        writing = state['backup_created'] and not state['backup_deleted']
+        return stat.st_size > 0 and not writing and now - state['since'] >= _stable_seconds
+
+
+def new_state(done=False):
+    return {'saved': time.time(), 'backup_created': False, 'backup_deleted': False, 'done': done, 'last': None, 'since': 0}
@@ -0,0 +1,203 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent
+
+
+logger = logging.getLogger(__name__)
+
+# file systems whose changes native observers do not (reliably) hear about
+_network_file_systems = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afpfs', 'fuse.sshfs', 'fuse.rclone', '9p', 'davfs'}
+
+
+class SnapshotPoller:
+    """A drop-in for the watchdog Observer on folders where native events get lost (SMB, NFS, synced folders).
+
+    It keeps an index of every watched folder: its modification time and the (size,
+    modification time, inode) of the files in it. A poll only stats the folders, and lists
+    just the folders whose modification time changed, comparing what is in them now with
+    the index to fire created, deleted, modified and moved (same inode under a new name)
+    events at the handler. Writes into a file that already existed do not change its
+    folder, so every recheck seconds the files modified up to recent seconds before the
+    newest one (the replays that may still be written to) are stat'ed again. Older files
+    and unchanged folders are never listed again.
+
+    The poll interval starts at min_interval, and grows by half after every quiet poll up
+    to max_interval, dropping back as soon as something changes.
+    """
+
+    def __init__(self, min_interval=1.0, max_interval=4.0, recheck=60.0, recent=300.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.recheck = recheck
+        self.recent = recent
+        self.interval = min_interval
+        self.watches = []
+        self.stopping = threading.Event()
+        self.thread = None
+
+
+    def schedule(self, handler, path, recursive=False):
+        self.watches.append({'handler': handler, 'path': path, 'recursive': recursive, 'folders': {}, 'newest': 0})
+
+
+    def start(self):
+        # the first snapshot is taken right away, so nothing that happens after start() is missed
+        for watch in self.watches:
+            self.index(watch, watch['path'])
+
+        self.last_recheck = time.monotonic()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.loop, name='snapshot-poller', daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.stopping.set()
+
+
+    def join(self):
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+
+    def loop(self):
+        while not self.stopping.wait(self.interval):
+            recheck = time.monotonic() - self.last_recheck >= self.recheck
+            if recheck:
+                self.last_recheck = time.monotonic()
+
+            changed = False
+            for watch in self.watches:
+                try:
+                    changed = self.poll(watch, recheck) or changed
+                except Exception:
+                    logger.exception('could not poll %s', watch['path'])
+
+            self.interval = self.min_interval if changed else min(self.max_interval, self.interval * 1.5)
+
+
+    def poll(self, watch, recheck=False):
+        """fires the events of every folder that changed since the last poll (and of the recent files on a recheck), returns whether any did"""
+        events = self.modified_recently(watch) if recheck else []
+
+        for folder in list(watch['folders']):
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                # the folder is gone, and so is everything in it
+                events.extend(FileDeletedEvent(path) for path in watch['folders'].pop(folder)['files'])
+                continue
+
+            if mtime != watch['folders'][folder]['mtime']:
+                events.extend(self.diff(watch, folder))
+
+        for event in events:
+            watch['handler'].dispatch(event)
+
+        return bool(events)
+
+
+    def modified_recently(self, watch):
+        """stats the files of the index that are at most recent seconds older than the newest one, returning the events of those that were written to"""
+        oldest = watch['newest'] - int(self.recent * 10**9)
+        events = []
+
+        for folder in watch['folders'].values():
+            for path, (size, mtime, inode) in folder['files'].items():
+                if mtime < oldest:
+                    continue
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # a file that is gone changed its folder too, the listing of the folder has it
+                    continue
+
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                    folder['files'][path] = (stat.st_size, stat.st_mtime_ns, inode)
+                    watch['newest'] = max(watch['newest'], stat.st_mtime_ns)
+                    events.append(FileModifiedEvent(path))
+
+        return events
+
+
+    def diff(self, watch, folder):
+        """lists the folder again, returning the events between the index and what is there now"""
+        old = watch['folders'][folder]['files']
+        known = set(watch['folders'])
+        self.index(watch, folder)
+        new = watch['folders'][folder]['files'] if folder in watch['folders'] else {}
+
+        # the files of subfolders that were created since the last poll are new as well
+        current = dict(new)
+        for subfolder in set(watch['folders']) - known:
+            current.update(watch['folders'][subfolder]['files'])
+
+        created = [path for path in current if path not in old]
+        deleted = [path for path in old if path not in new]
+        modified = [path for path in new if path in old and new[path] != old[path]]
+
+        # a file that disappeared and one that showed up with the same inode were renamed
+        deleted_inodes = {old[path][2]: path for path in deleted if old[path][2]}
+        moved = [(deleted_inodes[current[path][2]], path) for path in created if current[path][2] in deleted_inodes]
+        moved_from = {src for src, _ in moved}
+        moved_to = {dest for _, dest in moved}
+
+        # in the order a writer makes them: new files first, so a save sequence reads the same as with native events
+        return ([FileCreatedEvent(path) for path in created if path not in moved_to]
+                + [FileMovedEvent(src, dest) for src, dest in moved]
+                + [FileDeletedEvent(path) for path in deleted if path not in moved_from]
+                + [FileModifiedEvent(path) for path in modified])
+
+
+    def index(self, watch, folder):
+        """takes a snapshot of the files in the folder, and of the subfolders when the watch is recursive"""
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+            entries = list(os.scandir(folder))
+        except OSError:
+            watch['folders'].pop(folder, None)
+            return
+
+        files = {}
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_size, stat.st_mtime_ns, entry.inode())
+
+                elif entry.is_dir() and watch['recursive'] and entry.path not in watch['folders']:
+                    self.index(watch, entry.path)
+
+            except OSError:
+                continue
+
+        watch['folders'][folder] = {'mtime': mtime, 'files': files}
+        watch['newest'] = max([watch['newest']] + [modified for _, modified, _ in files.values()])
+
+
+def is_network_folder(path):
+    """whether the folder is on a network share, where native file system events cannot be trusted"""
+    path = os.path.abspath(path)
+
+    if sys.platform == 'win32':
+        import ctypes
+
+        # DRIVE_REMOTE from GetDriveTypeW, and UNC paths (\\server\share) that have no drive letter
+        drive = os.path.splitdrive(path)[0]
+        return drive.startswith('\\\\') or ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == 4
+
+    try:
+        with open('/proc/mounts', 'r') as file:
+            mounts = [line.split()[1:3] for line in file]
+    except OSError:
+        return False
+
+    # the mount point that is the longest prefix of the path is the one the folder is on
+    mount = max(((point, kind) for point, kind in mounts if path == point or path.startswith(point.rstrip('/') + '/')), key=lambda mount: len(mount[0]), default=None)
+    return mount is not None and mount[1] in _network_file_systems
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+
+
+class Watermark:
+    """The newest replay the watcher has handled in a replay folder, kept on disk between starts.
+
+    The mark is the (modification time, path) of that replay, so replays saved in the same
+    instant are still told apart. It only ever moves forward, and is written to disk
+    (replacing the old file in one step) every time it changes, so when the watcher starts
+    again it can catch up on the replays that are newer than the mark. Next to it the
+    replays that could not be renamed are kept, whichever job they failed in, until a
+    later job renames them, so the catch-up goes through them again.
+    """
+
+    def __init__(self, path, source_dir):
+        self.path = path
+        self.key = os.path.normcase(os.path.abspath(source_dir))
+        self.lock = threading.Lock()
+        self.marks = self.load()
+
+
+    def load(self):
+        """the marks of every replay folder, {} if there are none yet or the file is unreadable"""
+        try:
+            with open(self.path, 'r') as file:
+                marks = json.load(file)
+
+        except (OSError, ValueError):
+            return {}
+
+        # a file from before the failures were kept has the mark of every folder only
+        return {key: value if isinstance(value, dict) else {'mark': value, 'failures': []} for key, value in marks.items()}
+
+
+    def get(self):
+        """(mtime_ns, path) of the newest replay handled, None if the watcher never ran on this folder"""
+        mark = self.marks.get(self.key, {}).get('mark')
+        return tuple(mark) if mark else None
+
+
+    def failures(self):
+        """(mtime_ns, path) of the replays that could not be renamed, and were not renamed since"""
+        return {tuple(failure) for failure in self.marks.get(self.key, {}).get('failures', [])}
+
+
+    def pending(self, mark):
+        """whether the catch-up has to go through the replay with this mark"""
+        return self.get() < mark or mark in self.failures()
+
+
+    def advance(self, mark):
+        """moves the mark forward to (mtime_ns, path), if that is newer"""
+        self.record({None: tuple(mark)}, [])
+
+
+    def record(self, marks, failed):
+        """moves the mark forward to the newest replay of a job, keeping the replays of the job that failed
+
+        marks are the {file: (mtime_ns, path)} of the replays of the job (see marks_of), and
+        failed the files that could not be renamed. Failures of earlier jobs that this one
+        renamed are dropped.
+        """
+        handled = {mark for file, mark in marks.items() if file not in failed}
+
+        with self.lock:
+            mark, failures = self.get(), self.failures()
+
+            new_mark = max(handled | {mark} if mark else handled, default=None)
+            new_failures = (failures - handled) | {marks[file] for file in failed if file in marks}
+
+            if (new_mark, new_failures) == (mark, failures):
+                return
+
+            self.marks[self.key] = {'mark': list(new_mark) if new_mark else None, 'failures': sorted(list(failure) for failure in new_failures)}
+
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as file:
+                json.dump(self.marks, file)
+
+            os.replace(tmp, self.path)
+
+
+def marks_of(files):
+    """{file: (mtime_ns, path)} of the files that are still there"""
+    marks = {}
+
+    for file in files:
+        try:
+            marks[file] = (os.stat(file).st_mtime_ns, os.path.normcase(os.path.abspath(file)))
+        except OSError:
+            continue
+
+    return marks
@@ -0,0 +1,40 @@
+import copy
+import os
+import sys
+
+import pytest
+
+# the repository, and the fake sc2reader in front of a real one
+tests = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(tests))
+sys.path.insert(0, os.path.join(tests, 'fakes'))
+
+import src.structures.defaults as defaults
+from replays import my_id, write_replays
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    """runs every test in a folder of its own, since runs keep their cache, manifest and journal in the working directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def replay_dir(tmp_path):
+    folder = str(tmp_path / 'replays')
+    write_replays(folder, 60)
+    return folder
+
+
+@pytest.fixture
+def settings(tmp_path, replay_dir):
+    """the default settings, renaming the replays of replay_dir into an empty destination with the cache and dedup index on"""
+    settings = copy.deepcopy(defaults.settings)
+    settings[defaults._source_dir] = replay_dir
+    settings[defaults._target_dir] = str(tmp_path / 'renamed')
+    settings[defaults._player_id] = str(my_id)
+    settings[defaults._template] = '$myteam v $oppteams $map $uniqueID'
+    settings[defaults._performance][defaults._parse_workers] = 1
+    os.makedirs(settings[defaults._target_dir])
+    return settings
@@ -0,0 +1,104 @@
+"""A stand-in for sc2reader that reads the JSON replays written by tests/replays.py
+
+Only what the renamer touches is there: load_replay with its load levels, the replay
+details that load_level=1 exposes, and the private steps that parsing.load_players uses
+to go from load_level 1 to 2.
+"""
+import json
+from datetime import timedelta
+
+__version__ = '0-fake'
+
+# control value of humans and computers in replay.details
+_human = 2
+_computer = 3
+
+
+class Length(timedelta):
+
+    @property
+    def hours(self):
+        return int(self.seconds / 3600)
+
+    @property
+    def mins(self):
+        return int((self.seconds / 60) % 60)
+
+    @property
+    def secs(self):
+        return int(self.seconds % 60)
+
+
+class Player:
+
+    def __init__(self, data):
+        self.name = data['name']
+        self.toon_id = data['toon_id']
+        self.play_race = data['race']
+        self.is_human = not data.get('ai')
+
+        # computers have no init_data, like in sc2reader
+        if self.is_human:
+            self.init_data = {'scaled_rating': data.get('mmr', 0)}
+
+
+class Team:
+
+    def __init__(self, number, players):
+        self.number = number
+        self.players = players
+        self.lineup = ''.join(sorted(player.play_race[0].upper() for player in players))
+
+    def __iter__(self):
+        return iter(self.players)
+
+
+class Replay:
+
+    def __init__(self, filename, load_level=4):
+        with open(filename, 'r') as file:
+            self.data = json.load(file)
+
+        self.filename = filename
+        self.load_level = load_level
+        self.expansion = self.data['expansion']
+        self.is_ladder = self.data['ladder']
+        self.map_name = self.data['map']
+        self.unix_timestamp = self.data['ts']
+        self.real_type = self.data['type']
+        self.game_length = Length(seconds=self.data['length'])
+        self.raw_data = {'replay.details': {'players': [
+            {'name': player['name'], 'bnet': {'uid': player['toon_id']}, 'control': _computer if player.get('ai') else _human}
+            for team in self.data['teams'] for player in team
+        ]}}
+
+        self.players = []
+        self.computers = []
+        self.teams = []
+        self.winner = None
+
+        if load_level >= 2:
+            self.load_players()
+
+    def _get_reader(self, name):
+        return name
+
+    def _read_data(self, name, reader):
+        pass
+
+    def load_message_events(self):
+        pass
+
+    def load_players(self):
+        for number, team in enumerate(self.data['teams']):
+            players = [Player(player) for player in team]
+            self.players += players
+            self.computers += [player for player in players if not player.is_human]
+            self.teams.append(Team(number + 1, players))
+
+        if self.data['winner'] is not None:
+            self.winner = self.teams[self.data['winner']]
+
+
+def load_replay(filename, load_level=4, **options):
+    return Replay(filename, load_level=load_level)
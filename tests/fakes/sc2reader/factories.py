@@ -0,0 +1,25 @@
+import os
+
+from sc2reader import load_replay
+
+
+class SC2Factory:
+    """loads every replay under a folder, like the factory the original renamer used"""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def load_replays(self, source, **options):
+        options = {**self.options, **options}
+        depth = options.get('depth', -1)
+
+        for root, directories, filenames in os.walk(source, followlinks=options.get('followlinks', False)):
+            for directory in list(directories):
+                if directory in options.get('exclude', []) or depth == 0:
+                    directories.remove(directory)
+
+            for filename in filenames:
+                if filename.lower().endswith('.sc2replay'):
+                    yield load_replay(os.path.join(root, filename), load_level=options.get('load_level', 4))
+
+            depth -= 1
@@ -0,0 +1,5 @@
+"""A stand-in for watchdog with the events and the observer the watcher uses, so the tray can be tested without it
+
+Events are only handed to a handler by the tests (or by a SnapshotPoller), the observer
+never fires any.
+"""
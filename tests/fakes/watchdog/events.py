@@ -0,0 +1,49 @@
+class FileSystemEvent:
+
+    def __init__(self, event_type, src_path, dest_path=''):
+        self.event_type = event_type
+        self.src_path = src_path
+        self.dest_path = dest_path
+        self.is_directory = False
+
+
+    def __repr__(self):
+        return f'<{self.event_type} {self.src_path!r}{" -> " + repr(self.dest_path) if self.dest_path else ""}>'
+
+
+class FileSystemEventHandler:
+
+    def dispatch(self, event):
+        getattr(self, 'on_' + event.event_type)(event)
+
+
+    def on_created(self, event):
+        pass
+
+
+    def on_deleted(self, event):
+        pass
+
+
+    def on_modified(self, event):
+        pass
+
+
+    def on_moved(self, event):
+        pass
+
+
+def FileCreatedEvent(src_path):
+    return FileSystemEvent('created', src_path)
+
+
+def FileDeletedEvent(src_path):
+    return FileSystemEvent('deleted', src_path)
+
+
+def FileModifiedEvent(src_path):
+    return FileSystemEvent('modified', src_path)
+
+
+def FileMovedEvent(src_path, dest_path):
+    return FileSystemEvent('moved', src_path, dest_path)
@@ -0,0 +1,21 @@
+class Observer:
+    """keeps what it is asked to watch, the tests dispatch the events themselves"""
+
+    def __init__(self):
+        self.watches = []
+
+
+    def schedule(self, handler, path, recursive=False):
+        self.watches.append((handler, path, recursive))
+
+
+    def start(self):
+        pass
+
+
+    def stop(self):
+        pass
+
+
+    def join(self):
+        pass
@@ -0,0 +1,120 @@
+"""The renaming of the original single-threaded renamer (ReplayRenamer.run_renamer before the batch package), as the reference that BatchRenamer has to match"""
+import ntpath
+from datetime import datetime
+from os.path import join
+
+from sc2reader.factories import SC2Factory
+
+import src.structures.defaults as defaults
+import src.structures.stringmatch as stringmatch
+from src.structures.stringmatch import add_leading_zero, split_string
+
+
+def reference_names(settings):
+    """(orig_location, new_location) of every replay that the original renamer renamed with the settings"""
+    my_id = int(settings[defaults._player_id]) if settings[defaults._player_id] else ''
+    template = settings[defaults._template]
+    has_id = stringmatch.template_contains_id_vars(template)
+    excluded_directories = split_string(settings[defaults._excludes][defaults._exclude_dirs])
+
+    sc2 = SC2Factory(directory=settings[defaults._source_dir], exclude=excluded_directories, depth=1, followlinks=True)
+    renames = []
+
+    for replay in sc2.load_replays(settings[defaults._source_dir], load_level=2, load_maps=False, exclude=excluded_directories):
+        if settings[defaults._excludes][defaults._ai] and replay.computers:
+            continue
+
+        if settings[defaults._excludes][defaults._custom] and not replay.is_ladder:
+            continue
+
+        min_players = int(settings[defaults._includes][defaults._min_players])
+        max_players = int(settings[defaults._includes][defaults._max_players])
+        if not min_players <= len(replay.players) <= max_players:
+            continue
+
+        if replay.expansion in (defaults._wol, defaults._hots, defaults._lotv) and not settings[defaults._includes][replay.expansion]:
+            continue
+
+        exclude_matchups = split_string(settings[defaults._excludes][defaults._exclude_matchups])
+        include_matchups = split_string(settings[defaults._includes][defaults._include_matchups])
+
+        if has_matching(replay, exclude_matchups, my_id if has_id else None):
+            continue
+
+        if include_matchups and not has_matching(replay, include_matchups, my_id if has_id else None):
+            continue
+
+        newname = template
+        teams = replay.teams[:]
+
+        if has_id:
+            my_team_list = [team for team in teams if my_id in [player.toon_id for player in team.players]]
+
+            # the first team is the team of the player
+            if my_team_list and teams[0] != my_team_list[0]:
+                my_team_index = teams.index(my_team_list[0])
+                teams[0], teams[my_team_index] = teams[my_team_index], teams[0]
+
+            for id_var, var in (('$myteamwithmmr', '$t1withmmr'), ('$myteam', '$team1'), ('$oppteams', '$team2'), ('$myraces', '$t1races'),
+                                ('$oppraces', '$t2races'), ('$mymmr', '$t1mmr'), ('$oppmmr', '$t2mmr'), ('$oppwithmmr', '$t2withmmr')):
+                newname = newname.replace(id_var, var)
+
+        first_team = teams[0]
+        teams.remove(first_team)
+        team1 = '+'.join([player.name for player in first_team])
+        t1mmr = str(max(0, first_team.players[0].init_data['scaled_rating'])) if replay.is_ladder else '0'
+        WL = 'W' if replay.winner == first_team else 'L'
+        date = datetime.fromtimestamp(replay.unix_timestamp)
+
+        template_vars = {
+            'team1': team1,
+            't1races': first_team.lineup,
+            't1mmr': t1mmr,
+            't1withmmr': f'{team1}({t1mmr})',
+            'wl': WL.lower(),
+            'WL': WL,
+            'team2': 'v'.join(['+'.join([player.name for player in team.players]) for team in teams]),
+            't2withmmr': 'v'.join(['+'.join([player.name for player in team.players]) + '(' + (str(max(0, team.players[0].init_data['scaled_rating'])) if replay.is_ladder else '0') + ')' for team in teams]),
+            't2races': 'v'.join([team.lineup for team in teams]),
+            't2mmr': 'v'.join([str(team.players[0].init_data['scaled_rating']) if not replay.computers else '0' for team in teams]),
+            'map': replay.map_name,
+            'durationhours': str(replay.game_length.hours),
+            'durationmins': str(replay.game_length.mins),
+            'durationsecs': str(replay.game_length.secs),
+            'month': add_leading_zero(date.month),
+            'year': add_leading_zero(date.year),
+            'day': add_leading_zero(date.day),
+            'hour': add_leading_zero(date.hour),
+            'min': add_leading_zero(date.minute),
+            'sec': add_leading_zero(date.second),
+            'gametype': replay.real_type,
+            'expansion': replay.expansion,
+            'currentname': ntpath.split(replay.filename)[1].replace('.SC2Replay', ''),
+            'uniqueID': ''.join(add_leading_zero(value) for value in (date.day, date.month, date.year, date.hour, date.minute, date.second))
+        }
+
+        for var in stringmatch.non_id_variables:
+            newname = newname.replace(f'${var}', template_vars[var])
+
+        renames.append((replay.filename, join(settings[defaults._target_dir], newname + '.SC2Replay')))
+
+    return renames
+
+
+def has_matching(replay, matchups, my_id=None):
+    """whether the lineups of the replay (the team of my_id first, if there is one) are one of the matchups"""
+    teams = replay.teams[:]
+
+    if my_id is not None:
+        my_team = [team for team in teams if my_id in [player.toon_id for player in team.players]]
+        my_team_races = ''
+
+        if my_team:
+            my_team_races = my_team[0].lineup
+            teams.remove(my_team[0])
+
+        lineups = (my_team_races + ''.join('v' + team.lineup for team in teams)).lower().split('v')
+    else:
+        lineups = [team.lineup.lower() for team in teams]
+
+    return any(matchup.lower().split('v') == lineups for matchup in matchups)
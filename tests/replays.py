@@ -0,0 +1,60 @@
+import json
+import os
+import random
+
+
+# toon_id of the player whose replays these are
+my_id = 1234
+
+_races = ('Protoss', 'Terran', 'Zerg')
+
+
+def write_replays(folder, count, seed=1):
+    """writes count random replays as JSON (see tests/fakes/sc2reader) into folder, returns their paths
+
+    They cover what the filters and the template look at: ladder and custom games, 1v1 up
+    to 4 teams of 2, computers, every expansion, missing and negative mmr, draws, and
+    games of 0 to 2 hours.
+    """
+    rnd = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+
+    for index in range(count):
+        ladder = rnd.random() < 0.7
+        team_count = rnd.choice((2, 2, 2, 2, 3, 4))
+        team_size = rnd.choice((1, 1, 1, 2))
+
+        teams = []
+        for number in range(team_count):
+            team = []
+            for slot in range(team_size):
+                me = number == 0 and slot == 0 and rnd.random() < 0.8
+                team.append({
+                    'name': 'Me' if me else f'P{rnd.randint(0, 50)}',
+                    'toon_id': my_id if me else rnd.randint(1, 9999),
+                    'race': rnd.choice(_races),
+                    'mmr': rnd.choice((-36400, 3000, 4500, 0)),
+                    'ai': rnd.random() < 0.1 and not me and not ladder
+                })
+            teams.append(team)
+
+        rnd.shuffle(teams)
+        replay = {
+            'teams': teams,
+            'winner': rnd.choice([None] + list(range(team_count))),
+            'expansion': rnd.choice(('WoL', 'HotS', 'LotV', 'LotV')),
+            'ladder': ladder,
+            'length': rnd.randint(30, 8000),
+            'map': f'Map {rnd.randint(1, 9)} LE',
+            'ts': 1500000000 + rnd.randint(0, 10**8),
+            'type': f'{team_size}v{team_size}' if team_count == 2 else 'FFA'
+        }
+
+        path = os.path.join(folder, f'replay {index}.SC2Replay')
+        with open(path, 'w') as file:
+            json.dump(replay, file)
+
+        paths.append(path)
+
+    return paths
@@ -0,0 +1,238 @@
+import filecmp
+import json
+import os
+import shutil
+
+import pytest
+
+import src.batch.BatchRenamer as BatchRenamerModule
+import src.batch.detection as detection
+import src.structures.defaults as defaults
+from src.batch.BatchRenamer import BatchRenamer
+from reference import reference_names
+from replays import my_id
+
+
+def renamed_files(settings):
+    target_dir = settings[defaults._target_dir]
+    return sorted(os.path.relpath(os.path.join(folder, name), target_dir) for folder, _, names in os.walk(target_dir) for name in names)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """counts the replays that get parsed"""
+    count = [0]
+    load_staged = BatchRenamerModule.load_staged
+
+    def counting(*args):
+        count[0] += 1
+        return load_staged(*args)
+
+    monkeypatch.setattr(BatchRenamerModule, 'load_staged', counting)
+    return count
+
+
+def test_dry_run_only_plans(settings):
+    renamer = BatchRenamer(settings)
+    count = renamer.run(dry_run=True)
+    plan = renamer.summary()['plan']
+
+    assert count == len(plan) > 0
+    assert sorted(os.path.join(settings[defaults._target_dir], name) for _, name, _ in plan) == sorted(new for _, new in reference_names(settings))
+    assert renamed_files(settings) == []
+    assert len(os.listdir(settings[defaults._source_dir])) == 60
+
+
+def test_copies_every_replay_that_passes(settings):
+    count = BatchRenamer(settings).run()
+
+    expected = reference_names(settings)
+    assert count == len(expected)
+    assert renamed_files(settings) == sorted(os.path.basename(new) for _, new in expected)
+
+    for orig, new in expected:
+        assert filecmp.cmp(orig, new, shallow=False)
+
+
+def test_move_leaves_nothing_behind(settings):
+    settings[defaults._operation] = defaults._move
+    expected = reference_names(settings)
+
+    BatchRenamer(settings).run()
+
+    assert renamed_files(settings) == sorted(os.path.basename(new) for _, new in expected)
+    assert len(os.listdir(settings[defaults._source_dir])) == 60 - len(expected)
+
+
+def test_move_does_not_leave_duplicates_behind(settings):
+    settings[defaults._operation] = defaults._move
+    BatchRenamer(settings).run()
+    renamed = renamed_files(settings)
+    left = sorted(os.listdir(settings[defaults._source_dir]))
+
+    # a copy of a replay that was moved shows up in the replay folder again, under another name
+    again = os.path.join(settings[defaults._source_dir], 'again.SC2Replay')
+    shutil.copy2(os.path.join(settings[defaults._target_dir], renamed[0]), again)
+
+    renamer = BatchRenamer(settings)
+    assert renamer.run() == 0
+    assert renamer.duplicates == 1
+    assert sorted(os.listdir(settings[defaults._source_dir])) == left
+    assert renamed_files(settings) == renamed
+
+
+def test_second_run_skips_what_the_first_did(settings, parses):
+    BatchRenamer(settings).run()
+    parsed = parses[0]
+
+    renamer = BatchRenamer(settings)
+    assert renamer.run() == 0
+    assert renamer.skipped == 60
+    assert parses[0] == parsed
+
+
+def test_resumes_an_interrupted_run(settings, parses):
+    copies = []
+
+    def crashing_copy(orig, new):
+        copies.append(orig)
+        if len(copies) == 5:
+            # what a copy that was not written in one piece would leave behind
+            with open(new, 'wb') as file:
+                file.write(b'half')
+            raise KeyboardInterrupt
+        BatchRenamerModule.fileops.copy_file(orig, new)
+
+    with pytest.raises(KeyboardInterrupt):
+        BatchRenamer(settings).run(crashing_copy)
+
+    parsed = parses[0]
+    renamer = BatchRenamer(settings)
+    renamer.run()
+
+    expected = reference_names(settings)
+    assert renamer.resumed == len(expected) - 4
+    assert parses[0] == parsed
+    assert renamed_files(settings) == sorted(os.path.basename(new) for _, new in expected)
+    assert all(filecmp.cmp(orig, new, shallow=False) for orig, new in expected)
+    assert [name for name in os.listdir('.') if name.startswith('rename_journal')] == []
+
+
+def test_resumes_the_deletes_of_a_move(settings, monkeypatch):
+    BatchRenamer(settings).run()
+    settings[defaults._operation] = defaults._move
+    expected = reference_names(settings)
+    journals = set()
+
+    # interrupted before the first replay that is already in the destination is deleted
+    def crashing_operation(renamer, item):
+        journals.update(name for name in os.listdir('.') if name.startswith('rename_journal'))
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(BatchRenamer, 'file_operation', crashing_operation)
+        BatchRenamer(settings).run()
+
+    [journal] = journals
+    with open(journal) as file:
+        entries = [json.loads(line) for line in file][1:]
+    assert len(entries) == len(expected)
+    assert all(entry['operation'] == defaults._move and entry['delete'] and not entry['copy'] for entry in entries)
+
+    renamer = BatchRenamer(settings)
+    renamer.run()
+
+    assert renamer.resumed == len(expected)
+    assert len(os.listdir(settings[defaults._source_dir])) == 60 - len(expected)
+    assert renamed_files(settings) == sorted(os.path.basename(new) for _, new in expected)
+
+
+def test_only_hashes_what_passes_the_filters(settings, monkeypatch):
+    hashed = []
+    file_digest = BatchRenamerModule.file_digest
+    monkeypatch.setattr(BatchRenamerModule, 'file_digest', lambda path: hashed.append(path) or file_digest(path))
+
+    renamer = BatchRenamer(settings)
+    count = renamer.run()
+
+    assert sum(renamer.rejected.values()) > 0
+    assert len(hashed) == count == len(reference_names(settings))
+
+
+def test_unreadable_replay_fails_alone(settings):
+    expected = reference_names(settings)
+
+    broken = os.path.join(settings[defaults._source_dir], 'broken.SC2Replay')
+    with open(broken, 'w') as file:
+        file.write('not a replay')
+
+    renamer = BatchRenamer(settings)
+    count = renamer.run()
+
+    assert renamer.failed == [broken]
+    assert count == len(expected)
+
+
+def test_filters(settings):
+    settings[defaults._excludes][defaults._ai] = False
+    settings[defaults._includes].update({defaults._min_players: '1', defaults._max_players: '8', defaults._wol: True, defaults._hots: True})
+    everything = BatchRenamer(settings).run(dry_run=True)
+
+    settings[defaults._excludes][defaults._custom] = True
+    settings[defaults._includes][defaults._include_matchups] = 'PvT, TvZ, ZvP'
+    renamer = BatchRenamer(settings)
+    count = renamer.run(dry_run=True)
+
+    assert count == len(reference_names(settings)) < everything
+    assert count + sum(renamer.rejected.values()) == 60
+    assert dict(renamer.summary()['rules']).keys() <= {defaults._custom, defaults._include_matchups}
+
+
+def test_template_folders(settings):
+    settings[defaults._template] = '$year/$month/$myteam v $oppteams $map $uniqueID'
+    BatchRenamer(settings).run()
+
+    names = renamed_files(settings)
+    expected = reference_names(settings)
+    assert sorted(name.replace(os.sep, '/') for name in names) == sorted(os.path.relpath(new, settings[defaults._target_dir]) for _, new in expected)
+    assert all(len(name.split(os.sep)) == 3 for name in names)
+
+
+def test_template_values_do_not_make_folders(settings, replay_dir):
+    settings[defaults._template] = '$map'
+    settings[defaults._excludes][defaults._ai] = False
+    settings[defaults._includes].update({defaults._min_players: '1', defaults._max_players: '8', defaults._wol: True, defaults._hots: True})
+
+    # a map name with a slash in it
+    path = os.path.join(replay_dir, 'replay 0.SC2Replay')
+    with open(path) as file:
+        replay = file.read()
+    with open(path, 'w') as file:
+        file.write(replay.replace('"map": "', '"map": "Odd/'))
+
+    BatchRenamer(settings).run()
+
+    assert all(os.sep not in name for name in renamed_files(settings))
+    assert any(name.startswith('Odd-') for name in renamed_files(settings))
+
+
+def test_detects_the_player_in_most_of_the_newest_replays(replay_dir, monkeypatch):
+    read = []
+    read_players = detection.read_players
+
+    def recorded(path):
+        read.append(path)
+        return read_players(path)
+
+    monkeypatch.setattr(detection, 'read_players', recorded)
+
+    # saved one second apart, in the reverse order of their numbers
+    paths = [os.path.join(replay_dir, f'replay {number}.SC2Replay') for number in range(60)]
+    for number, path in enumerate(paths):
+        os.utime(path, ns=((100 - number) * 10**9, (100 - number) * 10**9))
+
+    players = detection.detect_players(replay_dir)
+
+    assert players[0] == ('Me', my_id)
+    assert 10 <= len(read) < 60
+    assert read == paths[:len(read)]
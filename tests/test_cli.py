@@ -0,0 +1,21 @@
+import src.structures.defaults as defaults
+from src.cli import main
+
+
+def arguments(settings, *extra):
+    return ['--source', settings[defaults._source_dir], '--target', settings[defaults._target_dir], '--player-id', settings[defaults._player_id],
+            '--template', settings[defaults._template], '--settings', 'none.json', *extra]
+
+
+def test_needs_a_replays_folder(settings, capsys):
+    settings[defaults._source_dir] = 'not a folder'
+
+    assert main(arguments(settings, '--dry-run')) == 1
+    assert 'replays folder' in capsys.readouterr().err
+
+
+def test_migrate_and_retemplate_only_need_the_destination(settings):
+    settings[defaults._source_dir] = 'not a folder'
+
+    assert main(arguments(settings, '--migrate', '--dry-run')) == 0
+    assert main(arguments(settings, '--retemplate', '--dry-run')) == 0
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+import src.structures.defaults as defaults
+from src.daemon.client import is_running, request
+from src.daemon.RenamerDaemon import RenamerDaemon
+from reference import reference_names
+from replays import my_id
+
+
+@pytest.fixture
+def daemon():
+    """a daemon that answers in this process, parsing in the threads of its jobs instead of a pool"""
+    daemon = RenamerDaemon(workers=1, renamers=1)
+    daemon.pool = None
+    daemon.scheduler.start()
+    yield daemon
+    daemon.scheduler.stop()
+
+
+def test_answers_a_batch_job(daemon, settings):
+    answer = daemon.answer({'job': 'batch', 'settings': settings, 'wait': True})
+
+    assert answer['id'] == 1
+    assert answer['result']['renamed'] == len(reference_names(settings))
+
+    status = daemon.status()
+    assert status['running'] is None and status['queued'] == 0
+    assert [job['id'] for job in status['finished']] == [1]
+
+
+def test_answers_right_away_without_wait(daemon, settings):
+    release = threading.Event()
+    daemon.scheduler.submit(0, release.wait, 5)
+
+    answer = daemon.answer({'job': 'rename_file', 'settings': settings, 'path': reference_names(settings)[0][0]})
+
+    assert answer == {'id': 1}
+    assert daemon.status()['queued'] == 1
+
+    release.set()
+    deadline = time.time() + 5
+    while not daemon.status()['finished'] and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert [job['id'] for job in daemon.status()['finished']] == [1]
+
+
+def test_answers_detection_and_errors(daemon, settings):
+    answer = daemon.answer({'job': 'detect', 'source': settings[defaults._source_dir], 'wait': True})
+    assert answer['result'][0][1] == my_id
+
+    assert daemon.answer({'job': 'nothing'}) == {'error': "Unknown job 'nothing'"}
+    assert 'error' in daemon.answer({'job': 'rename_file', 'settings': {}, 'path': ''})
+
+
+def test_keeps_the_renamers_of_the_latest_settings(daemon, settings):
+    renamer = daemon.renamer(settings)
+    assert daemon.renamer(settings) is renamer
+
+    daemon.renamer({**settings, defaults._template: '$map'})
+    assert daemon.renamer(settings) is not renamer
+    assert len(daemon.renamers) == 1
+
+
+def test_request_and_response_over_the_socket(settings):
+    daemon = RenamerDaemon(workers=1)
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+
+    deadline = time.time() + 30
+    while not is_running() and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert request({'job': 'status'})['workers'] == 1
+    assert request({'job': 'batch', 'settings': settings, 'wait': True})['result']['renamed'] == len(reference_names(settings))
+    assert request({'job': 'shutdown'}) == {'stopping': True}
+
+    thread.join(30)
+    assert not thread.is_alive()
+    assert not is_running()
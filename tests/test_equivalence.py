@@ -0,0 +1,82 @@
+"""BatchRenamer renames the same replays to the same names as the original renamer (tests/reference.py)"""
+import copy
+import itertools
+import re
+
+import pytest
+
+import src.structures.defaults as defaults
+import src.structures.stringmatch as stringmatch
+from src.batch.BatchRenamer import BatchRenamer
+from reference import reference_names
+from replays import my_id, write_replays
+
+
+templates = [
+    '$t1withmmrs$secs$mi$min$durationminsx$WLwl$myteamwithmmr$myteam $oppteams$$map',
+    '$oppteams only $team12',
+    defaults.settings[defaults._template],
+    '$team1 v $team2 $t1withmmr $t2withmmr $t1mmr $t2mmr $t2races $WL $wl $durationhours-$durationmins-$durationsecs $gametype $expansion $currentname $uniqueID',
+    '$myteam $oppteams $mymmr $oppmmr $oppwithmmr $myraces $oppraces $myteamwithmmr $map'
+]
+
+
+def combinations():
+    """(template, player id, exclusions, inclusions) of every combination of the settings that change what is renamed"""
+    for template, player_id, ai, custom, exclude, include, min_players, max_players, expansions in itertools.product(
+            templates, ['', str(my_id)], [True, False], [True, False], ['', 'PvT, zvz'], ['', 'TvP,PvP'], ['1', '2'], ['2', '8'],
+            [(False, False, True), (True, True, True)]):
+
+        # the window does not let these through
+        if not player_id and stringmatch.template_contains_id_vars(template):
+            continue
+
+        excludes = {defaults._ai: ai, defaults._custom: custom, defaults._exclude_matchups: exclude, defaults._exclude_dirs: ''}
+        includes = {defaults._include_matchups: include, defaults._min_players: min_players, defaults._max_players: max_players,
+                    defaults._wol: expansions[0], defaults._hots: expansions[1], defaults._lotv: expansions[2]}
+        yield template, player_id, excludes, includes
+
+
+# every 7th of the 768 combinations still goes through every value of every setting, in a fraction of the time
+cases = list(combinations())[::7]
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    folder = str(tmp_path_factory.mktemp('corpus'))
+    write_replays(folder, 300)
+    return folder
+
+
+def make_settings(source, target, template, player_id, excludes, includes, parse_workers=1):
+    settings = copy.deepcopy(defaults.settings)
+    settings.update({defaults._source_dir: source, defaults._target_dir: target, defaults._template: template, defaults._player_id: player_id})
+    settings[defaults._excludes].update(excludes)
+    settings[defaults._includes].update(includes)
+    settings[defaults._performance][defaults._parse_workers] = parse_workers
+    return settings
+
+
+def check_same_names(settings):
+    expected = reference_names(settings)
+
+    renames = []
+    renamer = BatchRenamer(settings)
+    count = renamer.run(lambda orig, new: renames.append((orig, new)), incremental=False)
+
+    # the original overwrote a replay with the one after it that got the same name, the batch renamer numbers them instead
+    assert len({new for _, new in renames}) == len(renames)
+    assert sorted(expected) == sorted((orig, re.sub(r' \(\d+\)(?=\.SC2Replay$)', '', new)) for orig, new in renames)
+
+    assert count == len(renames)
+    assert count + sum(renamer.rejected.values()) == 300
+
+
+@pytest.mark.parametrize('case', cases)
+def test_same_names_as_the_original(corpus, tmp_path, case):
+    check_same_names(make_settings(corpus, str(tmp_path / 'renamed'), *case))
+
+
+@pytest.mark.parametrize('case', cases[:3])
+def test_same_names_with_parse_processes(corpus, tmp_path, case):
+    check_same_names(make_settings(corpus, str(tmp_path / 'renamed'), *case, parse_workers=2))
@@ -0,0 +1,129 @@
+import json
+import os
+
+import pytest
+
+import src.batch.BatchRenamer as BatchRenamerModule
+import src.structures.defaults as defaults
+from src.batch.BatchRenamer import BatchRenamer
+from src.batch.migration import migrate_destination, retemplate_destination
+from reference import reference_names
+
+
+def renamed_files(settings):
+    target_dir = settings[defaults._target_dir]
+    return sorted(os.path.relpath(os.path.join(folder, name), target_dir).replace(os.sep, '/') for folder, _, names in os.walk(target_dir) for name in names)
+
+
+def expected_files(settings):
+    return sorted(os.path.relpath(new, settings[defaults._target_dir]).replace(os.sep, '/') for _, new in reference_names(settings))
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """counts the replays that get parsed or hashed"""
+    count = [0]
+    load_staged, file_digest = BatchRenamerModule.load_staged, BatchRenamerModule.file_digest
+
+    def counting(function):
+        def counted(*args):
+            count[0] += 1
+            return function(*args)
+        return counted
+
+    monkeypatch.setattr(BatchRenamerModule, 'load_staged', counting(load_staged))
+    monkeypatch.setattr(BatchRenamerModule, 'file_digest', counting(file_digest))
+    return count
+
+
+def test_retemplate_round_trip(settings, parses):
+    BatchRenamer(settings).run()
+    flat = renamed_files(settings)
+
+    sharded = {**settings, defaults._template: '$year/$month/' + settings[defaults._template]}
+    parses[0] = 0
+    renamer = retemplate_destination(sharded)
+
+    assert parses[0] == 0
+    assert renamer.summary()['renamed'] == len(flat)
+    assert renamed_files(sharded) == expected_files(sharded)
+
+    # the next run of the replay folder finds every replay already under its new name
+    renamer = BatchRenamer(sharded)
+    assert renamer.run() == 0
+    assert renamer.skipped == len(flat)
+
+    retemplate_destination(settings)
+
+    assert parses[0] == 0
+    assert renamed_files(settings) == flat
+    assert all(os.path.isfile(os.path.join(settings[defaults._target_dir], name)) for name in os.listdir(settings[defaults._target_dir]))
+
+
+@pytest.fixture
+def swapped(settings, tmp_path):
+    """two replays renamed to the name of each other's map, so that renaming them by map makes them trade names, returns their contents by new name"""
+    source = tmp_path / 'swapped'
+    source.mkdir()
+    contents = {}
+
+    for number, (name, other) in enumerate((('Alpha', 'Beta'), ('Beta', 'Alpha'))):
+        with open(os.path.join(settings[defaults._source_dir], f'replay {number}.SC2Replay')) as file:
+            replay = json.load(file)
+
+        replay['map'] = name
+        contents[name] = json.dumps(replay)
+        with open(source / f'{other}.SC2Replay', 'w') as file:
+            file.write(contents[name])
+
+    settings[defaults._source_dir] = str(source)
+    settings[defaults._excludes][defaults._ai] = False
+    settings[defaults._includes].update({defaults._min_players: '1', defaults._max_players: '8', defaults._wol: True, defaults._hots: True})
+    settings[defaults._template] = '$currentname'
+    BatchRenamer(settings).run()
+
+    return contents
+
+
+def read_renamed(settings):
+    contents = {}
+    for name in renamed_files(settings):
+        with open(os.path.join(settings[defaults._target_dir], name)) as file:
+            contents[os.path.splitext(name)[0]] = file.read()
+    return contents
+
+
+def test_retemplate_swaps_names(settings, swapped):
+    """two replays that trade names get them both, instead of one of them a ' (2)'"""
+    renamer = retemplate_destination({**settings, defaults._template: '$map'})
+
+    assert renamer.summary()['collisions'] == 0
+    assert read_renamed(settings) == swapped
+
+
+def test_resumes_an_interrupted_swap(settings, swapped, monkeypatch):
+    # interrupted once one of them stepped aside, before either one got its new name
+    def crashing_move(orig, new):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setitem(BatchRenamerModule.fileops.operations, defaults._move, crashing_move)
+        retemplate_destination({**settings, defaults._template: '$map'})
+
+    assert [name.endswith('.moving') for name in renamed_files(settings)] == [False, True]
+
+    renamer = retemplate_destination({**settings, defaults._template: '$map'})
+
+    assert renamer.resumed == 2
+    assert read_renamed(settings) == swapped
+
+
+def test_migrate_flat_destination(settings):
+    BatchRenamer(settings).run()
+
+    sharded = {**settings, defaults._template: '$year/$month/' + settings[defaults._template]}
+    renamer = migrate_destination(sharded)
+
+    assert renamer.summary()['renamed'] == len(reference_names(settings))
+    assert renamed_files(sharded) == expected_files(sharded)
+    assert [name for name in os.listdir(settings[defaults._target_dir]) if os.path.isfile(os.path.join(settings[defaults._target_dir], name))] == []
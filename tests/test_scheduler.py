@@ -0,0 +1,78 @@
+import threading
+
+from src.batch.Scheduler import BACKLOG, LIVE, RECENT, Scheduler, chunks
+
+
+def test_runs_the_most_urgent_job_first():
+    scheduler = Scheduler()
+    ran = []
+
+    # queued before the scheduler starts, so they all wait at once
+    futures = [scheduler.submit(priority, ran.append, name) for priority, name in
+               ((BACKLOG, 'backlog 1'), (RECENT, 'recent'), (BACKLOG, 'backlog 2'), (LIVE, 'live 1'), (LIVE, 'live 2'))]
+
+    scheduler.start()
+    scheduler.stop()
+
+    assert ran == ['live 1', 'live 2', 'recent', 'backlog 1', 'backlog 2']
+    assert all(future.done() for future in futures)
+
+
+def test_live_replay_only_waits_for_the_running_chunk():
+    scheduler = Scheduler()
+    ran = []
+    running = threading.Event()
+    go_on = threading.Event()
+
+    def first_chunk():
+        running.set()
+        go_on.wait(5)
+        ran.append('chunk 1')
+
+    scheduler.start()
+    scheduler.submit(BACKLOG, first_chunk)
+    running.wait(5)
+
+    for number in range(2, 5):
+        scheduler.submit(BACKLOG, ran.append, f'chunk {number}')
+    live = scheduler.submit(LIVE, lambda: ran.append('live') or 'renamed')
+
+    assert scheduler.pending() == {BACKLOG: 3, LIVE: 1}
+
+    go_on.set()
+    assert live.result(5) == 'renamed'
+    scheduler.stop()
+
+    assert ran == ['chunk 1', 'live', 'chunk 2', 'chunk 3', 'chunk 4']
+
+
+def test_failed_job_does_not_stop_the_others():
+    scheduler = Scheduler()
+    failed = scheduler.submit(RECENT, lambda: 1 / 0)
+    after = scheduler.submit(BACKLOG, lambda: 'done')
+
+    scheduler.start()
+    scheduler.stop()
+
+    assert isinstance(failed.exception(), ZeroDivisionError)
+    assert after.result() == 'done'
+
+
+def test_stop_can_cancel_the_backlog():
+    scheduler = Scheduler()
+    backlog = [scheduler.submit(BACKLOG, lambda: None) for _ in range(3)]
+
+    scheduler.stop(cancel=True)
+    scheduler.start()
+    scheduler.stop()
+
+    assert all(future.cancelled() for future in backlog)
+
+
+def test_chunks_put_the_newest_first():
+    paths = [f'replay {number}' for number in range(7)]
+
+    assert chunks(paths, chunk_size=3) == [(RECENT, paths[:3]), (BACKLOG, paths[3:6]), (BACKLOG, paths[6:])]
+
+    # an empty run still finishes the journal of an interrupted one
+    assert chunks([]) == [(RECENT, [])]
@@ -0,0 +1,270 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileSystemEventHandler
+
+import src.structures.defaults as defaults
+import src.tray.ReplayCreatedHandler as ReplayCreatedHandlerModule
+from src.batch.BatchRenamer import BatchRenamer
+from src.batch.Scheduler import LIVE, Scheduler
+from src.tray.ReplayCreatedHandler import ReplayCreatedHandler
+from src.tray.RenameWorker import RenameWorker
+from src.tray.SnapshotPoller import SnapshotPoller
+from src.tray.Watermark import Watermark, marks_of
+
+
+def saved_at(paths):
+    """gives the replays modification times one second apart, in the order of paths"""
+    for second, path in enumerate(paths, 1):
+        os.utime(path, ns=(second * 10**9, second * 10**9))
+    return paths
+
+
+def replays(settings):
+    source = settings[defaults._source_dir]
+    return saved_at(sorted((os.path.join(source, name) for name in os.listdir(source)), key=lambda name: int(name.split()[-1].split('.')[0])))
+
+
+def test_watermark_keeps_a_failure_of_an_earlier_job(settings):
+    paths = replays(settings)
+    marks = marks_of(paths)
+    watermark = Watermark(defaults.watermark_file, settings[defaults._source_dir])
+
+    watermark.record({path: marks[path] for path in paths[:10]}, [paths[4]])
+    watermark.record({path: marks[path] for path in paths[10:20]}, [])
+
+    # the next start reads it from disk
+    watermark = Watermark(defaults.watermark_file, settings[defaults._source_dir])
+    assert watermark.get() == marks[paths[19]]
+    assert watermark.failures() == {marks[paths[4]]}
+    assert [path for path in paths if watermark.pending(marks[path])] == [paths[4]] + paths[20:]
+
+    # a failure is kept until a job renames it
+    watermark.record({path: marks[path] for path in paths[20:25]}, [paths[22]])
+    watermark.record({paths[4]: marks[paths[4]]}, [])
+
+    assert watermark.failures() == {marks[paths[22]]}
+    assert [path for path in paths if watermark.pending(marks[path])] == [paths[22]] + paths[25:]
+
+
+def test_watermark_reads_the_marks_of_older_files(settings):
+    with open(defaults.watermark_file, 'w') as file:
+        json.dump({os.path.normcase(os.path.abspath(settings[defaults._source_dir])): [5, 'replay']}, file)
+
+    watermark = Watermark(defaults.watermark_file, settings[defaults._source_dir])
+
+    assert watermark.get() == (5, 'replay')
+    assert watermark.failures() == set()
+
+
+def test_worker_remembers_an_unreadable_replay_for_the_catch_up(settings):
+    paths = replays(settings)
+    with open(paths[3], 'w') as file:
+        file.write('not a replay')
+    saved_at(paths)
+
+    watermark = Watermark(defaults.watermark_file, settings[defaults._source_dir])
+    worker = RenameWorker(settings, watermark)
+    worker.start()
+    worker.submit([(path, time.time()) for path in paths[:6]])
+    worker.stop()
+
+    worker = RenameWorker(settings, watermark)
+    worker.start()
+    worker.submit([(path, time.time()) for path in paths[6:]])
+    worker.stop()
+
+    marks = marks_of(paths)
+    assert watermark.get() == marks[paths[-1]]
+    assert watermark.failures() == {marks[paths[3]]}
+
+
+class Recorder(FileSystemEventHandler):
+    """keeps the events it is handed as (type, name of the file)"""
+
+    def __init__(self):
+        self.events = []
+
+
+    def dispatch(self, event):
+        self.events.append((event.event_type, os.path.basename(event.src_path)))
+
+
+def write(path, text, seconds):
+    with open(path, 'w') as file:
+        file.write(text)
+    os.utime(path, ns=(seconds * 10**9, seconds * 10**9))
+
+
+@pytest.fixture
+def polled(tmp_path):
+    """a poller on a folder with an old and a recent replay, and the events it fired"""
+    folder = tmp_path / 'polled'
+    folder.mkdir()
+    write(folder / 'old.SC2Replay', 'old', 1000)
+    write(folder / 'recent.SC2Replay', 'recent', 5000)
+
+    poller = SnapshotPoller(recent=300)
+    recorder = Recorder()
+    poller.schedule(recorder, str(folder))
+    poller.index(poller.watches[0], str(folder))
+    return poller, recorder, folder
+
+
+def test_poller_lists_only_the_folders_that_changed(polled, monkeypatch):
+    poller, recorder, folder = polled
+    listed = []
+    scandir = os.scandir
+
+    def listing(path):
+        listed.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', listing)
+
+    assert not poller.poll(poller.watches[0], recheck=True)
+    assert listed == []
+
+    write(folder / 'new.SC2Replay', 'new', 5100)
+    os.utime(folder, ns=(7000 * 10**9, 7000 * 10**9))
+
+    assert poller.poll(poller.watches[0])
+    assert listed == [str(folder)]
+    assert recorder.events == [('created', 'new.SC2Replay')]
+
+
+def test_poller_rechecks_the_recent_replays_only(polled):
+    poller, recorder, folder = polled
+    folder_mtime = os.stat(folder).st_mtime_ns
+
+    # writes into files that were there already, which leave their folder as it was
+    write(folder / 'old.SC2Replay', 'old, written to', 1000)
+    write(folder / 'recent.SC2Replay', 'recent, written to', 5000)
+    os.utime(folder, ns=(folder_mtime, folder_mtime))
+
+    assert not poller.poll(poller.watches[0])
+    assert poller.poll(poller.watches[0], recheck=True)
+    assert recorder.events == [('modified', 'recent.SC2Replay')]
+
+
+def saved(handler, path):
+    """hands the handler the events of the game saving a replay, as in the docstring of ReplayCreatedHandler"""
+    backup = path + '.writeCacheBackup'
+    handler.dispatch(FileCreatedEvent(path))
+    handler.dispatch(FileCreatedEvent(backup))
+    handler.dispatch(FileModifiedEvent(path))
+    handler.dispatch(FileDeletedEvent(backup))
+
+
+def test_replay_is_done_once_its_save_sequence_is(settings):
+    handler = ReplayCreatedHandler(settings, worker=None)
+    path = replays(settings)[0]
+
+    saved(handler, path)
+    assert handler.collect() == []
+
+    # any number of events of a replay leave one entry behind
+    for _ in range(5):
+        handler.dispatch(FileModifiedEvent(path))
+
+    assert [file for file, _ in handler.collect()] == [path]
+    assert handler.collect() == []
+
+
+def test_copied_replay_is_done_once_it_stops_changing(settings, monkeypatch):
+    monkeypatch.setattr(ReplayCreatedHandlerModule, '_stable_seconds', 0)
+    handler = ReplayCreatedHandler(settings, worker=None)
+    path = replays(settings)[0]
+
+    handler.dispatch(FileCreatedEvent(path))
+
+    # the first look at it only notes its size and modification time
+    assert handler.collect() == []
+    assert [file for file, _ in handler.collect()] == [path]
+
+
+class Worker:
+    """turns down the bursts it is offered until it is told to take them"""
+
+    def __init__(self):
+        self.bursts = []
+        self.offered = 0
+        self.taking = False
+
+
+    def offer(self, burst):
+        self.offered += 1
+        if self.taking:
+            self.bursts.append([file for file, _ in burst])
+        return self.taking
+
+
+    def submit(self, burst):
+        self.bursts.append([file for file, _ in burst])
+
+
+def wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_replays_wait_in_one_burst_while_the_worker_is_busy(settings, monkeypatch):
+    monkeypatch.setattr(ReplayCreatedHandlerModule, '_debounce_seconds', 0.01)
+    worker = Worker()
+    handler = ReplayCreatedHandler(settings, worker)
+    paths = replays(settings)[:3]
+
+    handler.start()
+    for path in paths:
+        saved(handler, path)
+        handler.dispatch(FileModifiedEvent(path))
+
+        # the second offer from now on is sure to have collected the replay, and was turned down
+        offered = worker.offered
+        wait_for(lambda: worker.offered >= offered + 2)
+
+    worker.taking = True
+    wait_for(lambda: worker.bursts)
+    handler.stop()
+
+    assert worker.bursts == [paths]
+
+
+def test_worker_renames_what_queued_up_as_one_job(settings, monkeypatch):
+    jobs = []
+    rename_files = BatchRenamer.rename_files
+
+    def recorded(renamer, paths, *args, **kwargs):
+        jobs.append(len(paths))
+        return rename_files(renamer, paths, *args, **kwargs)
+
+    monkeypatch.setattr(BatchRenamer, 'rename_files', recorded)
+    paths = replays(settings)[:22]
+
+    # the scheduler is busy with another job until released
+    release = threading.Event()
+    scheduler = Scheduler()
+    scheduler.submit(LIVE, release.wait, 5)
+    scheduler.start()
+
+    worker = RenameWorker(settings, scheduler=scheduler)
+    worker.start()
+    worker.submit([(path, time.time()) for path in paths[:2]])
+
+    wait_for(lambda: scheduler.pending()[LIVE] == 1)
+
+    # Watch_Queue (2) bursts wait for the worker, the next one is turned down
+    assert worker.offer([(path, time.time()) for path in paths[2:12]])
+    assert worker.offer([(path, time.time()) for path in paths[12:22]])
+    assert not worker.offer([(paths[0], time.time())])
+
+    release.set()
+    worker.stop()
+    scheduler.stop()
+
+    assert jobs == [2, 20]